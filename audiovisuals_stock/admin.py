@@ -1,4 +1,57 @@
 from django.contrib import admin
-from .models import CustomUser
+from .models import AvisoVencimiento, CustomUser, KitMaterial, KitMaterialItem, MovimientoStock, ResumenDeuda
 
 admin.site.register(CustomUser)
+
+
+class KitMaterialItemInline(admin.TabularInline):
+    model = KitMaterialItem
+    raw_id_fields = ['material']
+    extra = 1
+
+
+@admin.register(KitMaterial)
+class KitMaterialAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'creadopor', 'fecha_creacion']
+    inlines = [KitMaterialItemInline]
+
+
+@admin.register(ResumenDeuda)
+class ResumenDeudaAdmin(admin.ModelAdmin):
+    # Solo lectura: lo mantiene services.py (o manage.py resumen_deudas --reconstruir)
+    list_display = ['usuario', 'items', 'unidades', 'proximo_vencimiento']
+    list_select_related = ['usuario']
+    ordering = ['proximo_vencimiento']
+    readonly_fields = ['usuario', 'items', 'unidades', 'proximo_vencimiento']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(AvisoVencimiento)
+class AvisoVencimientoAdmin(admin.ModelAdmin):
+    # Solo lectura: lo escribe manage.py avisar_vencidas
+    list_display = ['destinatario', 'deudas', 'unidades', 'fecha_envio']
+    list_select_related = ['usuario']
+    ordering = ['-fecha_envio']
+    readonly_fields = ['usuario', 'destinatario', 'deudas', 'unidades', 'fecha_envio']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    # Solo lectura: el libro es de solo inserción (services.py, manage.py conciliar_stock)
+    list_display = ['fecha', 'material', 'tipo', 'cantidad', 'usuario']
+    list_filter = ['tipo']
+    list_select_related = ['material', 'usuario']
+    raw_id_fields = ['material', 'usuario']
+    ordering = ['-fecha']
+    readonly_fields = ['material', 'tipo', 'cantidad', 'usuario', 'fecha']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class AudiovisualsStockConfig(AppConfig):
+    name = 'audiovisuals_stock'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        # Conecta los receptores de señales de los modelos
+        from . import signals  # noqa: F401
@@ -0,0 +1,230 @@
+# audiovisuals_stock/archivo.py
+import calendar
+import glob
+import gzip
+import heapq
+import json
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .exports import TAMANO_CHUNK, filtrar_por_fechas, inicio_dia
+from .models import MaterialLog, UserActivity
+
+
+class ArchivoOcupado(Exception):
+    """Otro proceso está archivando en el mismo ARCHIVO_DIR."""
+
+
+# ================ ARCHIVO DE REGISTROS ================ #
+# Los registros (logs de extracción, actividad, auditoría) solo crecen. Lo
+# anterior a settings.RETENCION_MESES sale de la base de datos a ficheros
+# JSONL comprimidos, uno por día y lote de id:
+#   ARCHIVO_DIR/<conjunto>/AAAA/MM/AAAA-MM-DD.<primer id>-<último id>.jsonl.gz
+# con todas las columnas de la fila (los ids de las FK, no sus nombres).
+#
+# Cada lote se escribe primero como .pendiente (con fsync), después se
+# borran sus filas en una transacción y por último se renombra. Si el proceso
+# muere entre medias, la siguiente pasada mira si las filas del .pendiente
+# siguen en la tabla: si siguen, el borrado no se confirmó y el fichero sobra;
+# si no, se renombra. Ninguna fila se pierde ni queda dos veces.
+#
+# filas() lee un rango de días de las dos partes a la vez, así que quien
+# consulta no necesita saber qué se ha archivado ya (lo usan las exportaciones);
+# anteriores() pagina hacia atrás lo archivado (lo usa el log de un material
+# cuando se acaban las filas vivas).
+
+ARCHIVABLES = {
+    'logs': (MaterialLog, 'fecha_accion'),
+    'actividad': (UserActivity, 'timestamp'),
+    'auditoria': (LogEntry, 'timestamp'),
+}
+LOTE = 5000
+
+EXTENSION = '.jsonl.gz'
+PENDIENTE = '.pendiente'
+
+
+def corte(meses=None, hoy=None):
+    """Medianoche de hace `meses` meses (settings.RETENCION_MESES): lo anterior se archiva."""
+    meses = settings.RETENCION_MESES if meses is None else meses
+    hoy = hoy or timezone.localdate()
+    indice = hoy.month - 1 - meses
+    anio, mes = hoy.year + indice // 12, indice % 12 + 1
+    return inicio_dia(date(anio, mes, min(hoy.day, calendar.monthrange(anio, mes)[1])))
+
+
+def archivar(conjunto, hasta, lote=LOTE):
+    """
+    Mueve al archivo las filas del conjunto anteriores a `hasta`, por lotes
+    de id, cada lote con su transacción. Devuelve el número de filas movidas.
+    """
+    modelo, campo_fecha = ARCHIVABLES[conjunto]
+    columnas = [campo.attname for campo in modelo._meta.concrete_fields]
+    with _bloqueo():
+        _resolver_pendientes(conjunto)
+        ultimo_id = movidas = 0
+        while True:
+            bloque = list(
+                modelo.objects.filter(**{f'{campo_fecha}__lt': hasta}, id__gt=ultimo_id)
+                .order_by('id').values(*columnas)[:lote]
+            )
+            if not bloque:
+                return movidas
+            ultimo_id = bloque[-1]['id']
+            movidas += _mover(conjunto, modelo, campo_fecha, bloque)
+
+
+def filas(conjunto, desde=None, hasta=None, **filtros):
+    """
+    Filas del conjunto entre dos días (inclusivos), archivadas y vivas, como
+    diccionarios {columna: valor} ordenados por (fecha, id). `filtros` son
+    igualdades sobre columnas, p. ej. material_id=3.
+    """
+    modelo, campo_fecha = ARCHIVABLES[conjunto]
+    columnas = [campo.attname for campo in modelo._meta.concrete_fields]
+    vivas = (
+        filtrar_por_fechas(modelo.objects.filter(**filtros), campo_fecha, desde, hasta)
+        .order_by(campo_fecha, 'id').values(*columnas).iterator(chunk_size=TAMANO_CHUNK)
+    )
+    return heapq.merge(
+        _archivadas(conjunto, modelo, campo_fecha, desde, hasta, filtros), vivas,
+        key=lambda fila: (fila[campo_fecha], fila['id']),
+    )
+
+
+def _mover(conjunto, modelo, campo_fecha, bloque):
+    por_dia = defaultdict(list)
+    for fila in bloque:
+        por_dia[timezone.localdate(fila[campo_fecha])].append(fila)
+    pendientes = [_escribir(conjunto, dia, del_dia) for dia, del_dia in sorted(por_dia.items())]
+    with transaction.atomic():
+        modelo.objects.filter(id__in=[fila['id'] for fila in bloque]).delete()
+    for ruta in pendientes:
+        os.rename(ruta, ruta[:-len(PENDIENTE)])
+    return len(bloque)
+
+
+def _escribir(conjunto, dia, del_dia):
+    directorio = os.path.join(settings.ARCHIVO_DIR, conjunto, f'{dia:%Y}', f'{dia:%m}')
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"{dia.isoformat()}.{del_dia[0]['id']}-{del_dia[-1]['id']}{EXTENSION}{PENDIENTE}")
+    with open(ruta, 'wb') as fichero:
+        with gzip.GzipFile(fileobj=fichero, mode='wb', mtime=0) as comprimido:
+            for fila in del_dia:
+                comprimido.write(linea_jsonl(fila).encode('utf-8'))
+        fichero.flush()
+        os.fsync(fichero.fileno())
+    # El fichero tiene que estar en disco antes de borrar sus filas
+    descriptor = os.open(directorio, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+    return ruta
+
+
+def linea_jsonl(fila):
+    """La fila como línea JSONL, con las fechas en ISO 8601 completas (microsegundos y zona)."""
+    return json.dumps(fila, default=_serializar, ensure_ascii=False) + '\n'
+
+
+def _serializar(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f'{type(valor).__name__} no es serializable')
+
+
+def _resolver_pendientes(conjunto):
+    modelo = ARCHIVABLES[conjunto][0]
+    for ruta in glob.glob(os.path.join(settings.ARCHIVO_DIR, conjunto, '*', '*', f'*{EXTENSION}{PENDIENTE}')):
+        try:
+            ids = [fila['id'] for fila in _leer(ruta)]
+        except (OSError, EOFError, ValueError):
+            ids = None  # Escritura a medias: sus filas no llegaron a borrarse
+        if ids is None or modelo.objects.filter(id__in=ids).exists():
+            os.remove(ruta)
+        else:
+            os.rename(ruta, ruta[:-len(PENDIENTE)])
+
+
+def anteriores(conjunto, antes=None, limite=50, desde=None, hasta=None, **filtros):
+    """
+    Hasta `limite` filas archivadas del conjunto, de la más reciente a la más
+    antigua por (fecha, id), anteriores a `antes` = (fecha, id) si se indica.
+    Recorre los días hacia atrás y para en cuanto tiene bastantes: una página
+    de historia no descomprime todo el archivo.
+    """
+    modelo, campo_fecha = ARCHIVABLES[conjunto]
+    if antes is not None:
+        ultimo_dia = timezone.localdate(antes[0])
+        hasta = ultimo_dia if hasta is None else min(hasta, ultimo_dia)
+    encontradas = []
+    for _, rutas in reversed(_particiones(conjunto, desde, hasta)):
+        for fila in reversed(_del_dia(modelo, campo_fecha, rutas, filtros)):
+            if antes is None or (fila[campo_fecha], fila['id']) < tuple(antes):
+                encontradas.append(fila)
+                if len(encontradas) == limite:
+                    return encontradas
+    return encontradas
+
+
+def _archivadas(conjunto, modelo, campo_fecha, desde, hasta, filtros):
+    for _, rutas in _particiones(conjunto, desde, hasta):
+        yield from _del_dia(modelo, campo_fecha, rutas, filtros)
+
+
+def _del_dia(modelo, campo_fecha, rutas, filtros):
+    # Filas de los ficheros de un día que cumplen los filtros, ordenadas por (fecha, id)
+    campos = {campo.attname: campo for campo in modelo._meta.concrete_fields}
+    filtros = {columna: campos[columna].to_python(valor) for columna, valor in filtros.items()}
+    del_dia = []
+    for ruta in rutas:
+        for fila in _leer(ruta):
+            # Los mismos tipos que values(): fechas con zona, ids enteros
+            fila = {columna: campos[columna].to_python(valor) for columna, valor in fila.items()}
+            if all(fila[columna] == valor for columna, valor in filtros.items()):
+                del_dia.append(fila)
+    # Cada fichero va ordenado por id; un día se ordena entero en memoria
+    del_dia.sort(key=lambda fila: (fila[campo_fecha], fila['id']))
+    return del_dia
+
+
+def _particiones(conjunto, desde, hasta):
+    # [(día, [rutas])] en orden, solo de los días del rango
+    por_dia = defaultdict(list)
+    for ruta in glob.glob(os.path.join(settings.ARCHIVO_DIR, conjunto, '*', '*', f'*{EXTENSION}')):
+        dia = date.fromisoformat(os.path.basename(ruta)[:10])
+        if (desde is None or dia >= desde) and (hasta is None or dia <= hasta):
+            por_dia[dia].append(ruta)
+    return sorted(por_dia.items())
+
+
+def _leer(ruta):
+    with gzip.open(ruta, 'rt', encoding='utf-8') as fichero:
+        return [json.loads(linea) for linea in fichero]
+
+
+@contextmanager
+def _bloqueo():
+    # Una sola pasada de archivado a la vez (p. ej. cron solapado)
+    os.makedirs(settings.ARCHIVO_DIR, exist_ok=True)
+    with open(os.path.join(settings.ARCHIVO_DIR, '.archivando'), 'w') as cerrojo:
+        if fcntl is not None:
+            try:
+                fcntl.flock(cerrojo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ArchivoOcupado('Hay otra pasada de archivado en curso') from None
+        yield
+
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'audiovisuals_stock.settings')
+# Vistas de lectura asíncronas (urls_asgi.py); p. ej. uvicorn audiovisuals_stock.asgi:application
+os.environ.setdefault('VISTAS_ASYNC', '1')
 
 application = get_asgi_application()
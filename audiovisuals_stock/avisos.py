@@ -0,0 +1,152 @@
+# audiovisuals_stock/avisos.py
+import logging
+from collections import defaultdict
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AvisoVencimiento, DeudaMaterial
+
+logger = logging.getLogger('audiovisuals_stock.avisos')
+
+# ================ AVISOS DE DEUDAS VENCIDAS ================ #
+# manage.py avisar_vencidas (programado con cron) recorre las deudas abiertas
+# vencidas y sin aviso por lotes de usuarios, envía un único aviso por usuario
+# y marca las deudas avisadas. Las siguientes ejecuciones solo ven las nuevas.
+#
+# El envío lo hace AVISOS_BACKEND (por defecto, correo con EMAIL_BACKEND): una
+# clase con `abrir()`, `enviar(usuario, deudas)` -> bool y `cerrar()`. Un
+# envío fallido devuelve False: el usuario se cuenta como fallido, sus deudas
+# quedan sin marcar y se reintentan en la siguiente ejecución.
+
+LOTE_USUARIOS = 200
+
+
+class AvisoPorEmail:
+    """Un correo por usuario con la lista de materiales vencidos."""
+
+    asunto = 'Tandem Stock: material pendiente de devolver'
+
+    def abrir(self):
+        # Una sola conexión para todos los correos del lote
+        self.conexion = get_connection()
+        self.conexion.open()
+
+    def enviar(self, usuario, deudas):
+        lineas = [
+            f"- {deuda['cantidad_adeudada']} x {deuda['material__nombre']} ({deuda['material__referencia']}), "
+            f"vencía el {deuda['fecha_vencimiento']:%d/%m/%Y}"
+            for deuda in deudas
+        ]
+        cuerpo = (
+            f"Hola {usuario['nombre'] or usuario['email']},\n\n"
+            'Tienes material prestado cuyo plazo de devolución ya ha pasado:\n\n'
+            + '\n'.join(lineas)
+            + '\n\nPor favor, devuélvelo lo antes posible.\n'
+        )
+        mensaje = EmailMessage(self.asunto, cuerpo, to=[usuario['email']], connection=self.conexion)
+        try:
+            return mensaje.send() == 1
+        except (SMTPException, OSError):
+            logger.exception('No se pudo enviar el aviso a %s', usuario['email'])
+            # La conexión puede haber quedado rota: se cierra y el backend abre otra en el siguiente envío
+            self.conexion.close()
+            return False
+
+    def cerrar(self):
+        self.conexion.close()
+
+
+def backend():
+    return import_string(getattr(settings, 'AVISOS_BACKEND', 'audiovisuals_stock.avisos.AvisoPorEmail'))()
+
+
+def pendientes(hoy):
+    """Deudas abiertas vencidas antes de `hoy` que aún no se han avisado."""
+    return DeudaMaterial.objects.filter(devuelta=False, fecha_aviso__isnull=True, fecha_vencimiento__lt=hoy)
+
+
+def usuarios_pendientes(hoy, ultimo_usuario, lote):
+    """Ids del siguiente lote de usuarios con avisos pendientes, después de `ultimo_usuario`."""
+    return (
+        pendientes(hoy).filter(usuario_id__gt=ultimo_usuario)
+        .order_by('usuario_id').values_list('usuario_id', flat=True).distinct()[:lote]
+    )
+
+
+def deudas_pendientes(hoy, usuarios):
+    """Deudas sin avisar de un lote de usuarios, con el usuario y el material, agrupadas por usuario."""
+    return (
+        pendientes(hoy).filter(usuario_id__in=usuarios)
+        .values('id', 'usuario_id', 'usuario__email', 'usuario__nombre', 'cantidad_adeudada',
+                'fecha_vencimiento', 'material__nombre', 'material__referencia')
+        .order_by('usuario_id', 'fecha_vencimiento', 'id')
+    )
+
+
+def avisar_vencidas(hoy=None, lote=LOTE_USUARIOS, enviador=None, simular=False):
+    """
+    Envía los avisos pendientes y devuelve (usuarios avisados, deudas avisadas,
+    envíos fallidos). Con simular=True no se envía ni se marca nada.
+    """
+    hoy = hoy or timezone.localdate()
+    enviador = enviador or backend()
+    avisados = deudas_avisadas = fallidos = 0
+    ultimo_usuario = 0
+
+    if not simular:
+        enviador.abrir()
+    try:
+        while True:
+            # Keyset por usuario: un usuario con envío fallido no se vuelve a leer en esta ejecución
+            usuarios = list(usuarios_pendientes(hoy, ultimo_usuario, lote))
+            if not usuarios:
+                break
+            ultimo_usuario = usuarios[-1]
+
+            por_usuario = defaultdict(list)
+            datos_usuario = {}
+            for deuda in deudas_pendientes(hoy, usuarios):
+                por_usuario[deuda['usuario_id']].append(deuda)
+                datos_usuario[deuda['usuario_id']] = {'email': deuda['usuario__email'], 'nombre': deuda['usuario__nombre']}
+
+            enviados = []
+            try:
+                for usuario_id, deudas in por_usuario.items():
+                    if simular or enviador.enviar(datos_usuario[usuario_id], deudas):
+                        enviados.append(usuario_id)
+                    else:
+                        fallidos += 1
+            finally:
+                # Lo enviado se marca aunque un envío posterior lance una excepción:
+                # si no, esos avisos se repetirían en la siguiente ejecución
+                avisados += len(enviados)
+                deudas_avisadas += sum(len(por_usuario[usuario_id]) for usuario_id in enviados)
+                if not simular and enviados:
+                    _marcar(enviados, por_usuario, datos_usuario)
+    finally:
+        if not simular:
+            enviador.cerrar()
+    return avisados, deudas_avisadas, fallidos
+
+
+def _marcar(enviados, por_usuario, datos_usuario):
+    # Se marca después de enviar: si el proceso se corta entre medias, el
+    # aviso se repite en la siguiente ejecución en lugar de perderse
+    with transaction.atomic():
+        DeudaMaterial.objects.filter(
+            id__in=[deuda['id'] for usuario_id in enviados for deuda in por_usuario[usuario_id]],
+        ).update(fecha_aviso=timezone.now())
+        AvisoVencimiento.objects.bulk_create([
+            AvisoVencimiento(
+                usuario_id=usuario_id,
+                destinatario=datos_usuario[usuario_id]['email'],
+                deudas=len(por_usuario[usuario_id]),
+                unidades=sum(deuda['cantidad_adeudada'] for deuda in por_usuario[usuario_id]),
+            )
+            for usuario_id in enviados
+        ])
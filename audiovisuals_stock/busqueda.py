@@ -0,0 +1,144 @@
+# audiovisuals_stock/busqueda.py
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Material
+
+
+# ================ ÍNDICE DE BÚSQUEDA (SQLite FTS5) ================ #
+# Dos tablas virtuales con referencia, nombre y número de serie de cada material:
+#   - material_fts: tokens con prefijos indexados, para el "empieza por".
+#   - material_fts_trigram: trigramas, para coincidencias con erratas.
+# Se mantienen con las señales de Material (signals.py) y se reconstruyen con
+# manage.py rebuild_search_index. En otros motores se usa una búsqueda ORM.
+
+TABLA = 'material_fts'
+TABLA_TRIGRAMAS = 'material_fts_trigram'
+COLUMNAS = ['referencia', 'nombre', 'numero_serie']
+
+# Pesos de bm25 por columna: una referencia o un número de serie exactos pesan más
+PESOS = '10.0, 4.0, 10.0'
+
+_PALABRA = re.compile(r'\w+', re.UNICODE)
+
+
+def disponible():
+    return connection.vendor == 'sqlite'
+
+
+def _en_lotes(ids, tamano=500):
+    ids = list(ids)
+    for inicio in range(0, len(ids), tamano):
+        yield ids[inicio:inicio + tamano]
+
+
+def indexar(ids):
+    """(Re)indexa los materiales indicados; los que ya no existen se quitan."""
+    if not disponible():
+        return
+    columnas = ', '.join(COLUMNAS)
+    with connection.cursor() as cursor:
+        for lote in _en_lotes(ids):
+            marcas = ', '.join(['%s'] * len(lote))
+            for tabla in (TABLA, TABLA_TRIGRAMAS):
+                cursor.execute(f'DELETE FROM {tabla} WHERE rowid IN ({marcas})', lote)
+                cursor.execute(
+                    f'INSERT INTO {tabla} (rowid, {columnas}) '
+                    f'SELECT id, {columnas} FROM {Material._meta.db_table} WHERE id IN ({marcas})',
+                    lote,
+                )
+
+
+def eliminar(ids):
+    if not disponible():
+        return
+    with connection.cursor() as cursor:
+        for lote in _en_lotes(ids):
+            marcas = ', '.join(['%s'] * len(lote))
+            for tabla in (TABLA, TABLA_TRIGRAMAS):
+                cursor.execute(f'DELETE FROM {tabla} WHERE rowid IN ({marcas})', lote)
+
+
+def reconstruir():
+    """Vacía y vuelve a llenar el índice a partir de la tabla de materiales."""
+    if not disponible():
+        return 0
+    columnas = ', '.join(COLUMNAS)
+    with connection.cursor() as cursor:
+        for tabla in (TABLA, TABLA_TRIGRAMAS):
+            cursor.execute(f'DELETE FROM {tabla}')
+            cursor.execute(f'INSERT INTO {tabla} (rowid, {columnas}) SELECT id, {columnas} FROM {Material._meta.db_table}')
+            cursor.execute(f"INSERT INTO {tabla} ({tabla}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {TABLA}')
+        return cursor.fetchone()[0]
+
+
+def _consulta_prefijos(palabras):
+    # "cam" "sony" -> todas las palabras, cada una como prefijo
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def _consulta_trigramas(palabras):
+    # Cualquier trigrama de cualquier palabra; bm25 ordena por cuántos coinciden
+    trigramas = {palabra[i:i + 3] for palabra in palabras for i in range(len(palabra) - 2)}
+    return ' OR '.join(f'"{trigrama}"' for trigrama in sorted(trigramas))
+
+
+def _palabras(texto):
+    return [palabra.lower() for palabra in _PALABRA.findall(texto or '')]
+
+
+def _filtro_orm(palabras):
+    # Sin FTS5: cada palabra en alguna de las columnas
+    condicion = Q()
+    for palabra in palabras:
+        condicion &= Q(referencia__icontains=palabra) | Q(nombre__icontains=palabra) | Q(numero_serie__icontains=palabra)
+    return condicion
+
+
+def filtro(texto):
+    """
+    Q de los materiales en los que todas las palabras de `texto` empiezan
+    alguna palabra de sus columnas, resuelta con el índice de prefijos (el
+    buscador del catálogo). None si `texto` no tiene palabras.
+    """
+    palabras = _palabras(texto)
+    if not palabras:
+        return None
+    if not disponible():
+        return _filtro_orm(palabras)
+    return Q(id__in=RawSQL(f'SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s', [_consulta_prefijos(palabras)]))
+
+
+def buscar(texto, limite=10):
+    """Ids de materiales que coinciden con `texto`, de más a menos relevante."""
+    palabras = _palabras(texto)
+    if not palabras:
+        return []
+    if not disponible():
+        return list(Material.objects.filter(_filtro_orm(palabras)).order_by('nombre', 'id').values_list('id', flat=True)[:limite])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s ORDER BY bm25({TABLA}, {PESOS}) LIMIT %s',
+            [_consulta_prefijos(palabras), limite],
+        )
+        ids = [fila[0] for fila in cursor.fetchall()]
+
+        consulta = _consulta_trigramas([palabra for palabra in palabras if len(palabra) >= 3])
+        if len(ids) < limite and consulta:
+            # Pocos resultados exactos: se completa con los parecidos (erratas)
+            cursor.execute(
+                f'SELECT rowid FROM {TABLA_TRIGRAMAS} WHERE {TABLA_TRIGRAMAS} MATCH %s '
+                f'ORDER BY bm25({TABLA_TRIGRAMAS}, {PESOS}) LIMIT %s',
+                [consulta, limite * 2],
+            )
+            vistos = set(ids)
+            for (material_id,) in cursor.fetchall():
+                if material_id not in vistos and len(ids) < limite:
+                    ids.append(material_id)
+                    vistos.add(material_id)
+    return ids
@@ -0,0 +1,124 @@
+# audiovisuals_stock/calendario.py
+from datetime import timedelta
+
+from django.db.models import Case, Count, DateField, Value, When
+from django.urls import reverse
+from django.utils import timezone
+
+from .exports import inicio_dia, filtrar_por_fechas
+from .models import DeudaMaterial
+
+
+# ================ EVENTOS DEL CALENDARIO ================ #
+# Dos tipos de evento por deuda: el préstamo (día de fecha_generacion) y el
+# vencimiento de las deudas abiertas (fecha_vencimiento). Cada uno es un rango
+# sobre una sola columna indexada. Si el rango pedido es largo o tiene más de
+# LIMITE_DETALLE eventos, se devuelve un evento por día con el recuento.
+
+MAX_DIAS = 366
+DIAS_DETALLE = 62
+LIMITE_DETALLE = 300
+
+
+def _vencimientos(usuario):
+    deudas = DeudaMaterial.objects.filter(devuelta=False)
+    return deudas if usuario is None else deudas.filter(usuario=usuario)
+
+
+def _prestamos(usuario):
+    deudas = DeudaMaterial.objects.all()
+    return deudas if usuario is None else deudas.filter(usuario=usuario)
+
+
+def _detalle(usuario, desde, hasta):
+    # Devuelve None si hay demasiados eventos para mostrarlos uno a uno
+    campos = ('id', 'material_id', 'material__nombre', 'usuario__email', 'cantidad_adeudada')
+    vencimientos = list(
+        _vencimientos(usuario).filter(fecha_vencimiento__gte=desde, fecha_vencimiento__lte=hasta)
+        .values('fecha_vencimiento', *campos).order_by('fecha_vencimiento', 'id')[:LIMITE_DETALLE + 1]
+    )
+    prestamos = list(
+        filtrar_por_fechas(_prestamos(usuario), 'fecha_generacion', desde, hasta)
+        .values('fecha_generacion', *campos).order_by('fecha_generacion', 'id')[:LIMITE_DETALLE + 1]
+    )
+    if len(vencimientos) + len(prestamos) > LIMITE_DETALLE:
+        return None
+
+    hoy = timezone.localdate()
+
+    def titulo(deuda):
+        texto = f"{deuda['cantidad_adeudada']} x {deuda['material__nombre']}"
+        return texto if usuario is not None else f"{texto} · {deuda['usuario__email']}"
+
+    eventos = [{
+        'id': f"v{deuda['id']}",
+        'title': titulo(deuda),
+        'start': deuda['fecha_vencimiento'].isoformat(),
+        'allDay': True,
+        'className': 'bg-danger' if deuda['fecha_vencimiento'] < hoy else 'bg-warning',
+        'url': reverse('detalle_material', kwargs={'material_id': deuda['material_id']}),
+    } for deuda in vencimientos]
+    eventos += [{
+        'id': f"p{deuda['id']}",
+        'title': titulo(deuda),
+        'start': timezone.localtime(deuda['fecha_generacion']).date().isoformat(),
+        'allDay': True,
+        'className': 'bg-info',
+        'url': reverse('detalle_material', kwargs={'material_id': deuda['material_id']}),
+    } for deuda in prestamos]
+    return eventos
+
+
+def consultas_por_dia(usuario, desde, hasta):
+    """(vencimientos, préstamos) por día: GROUP BY sobre el índice de cada columna."""
+    vencimientos = (
+        _vencimientos(usuario).filter(fecha_vencimiento__gte=desde, fecha_vencimiento__lte=hasta)
+        .values('fecha_vencimiento').annotate(total=Count('id')).order_by('fecha_vencimiento')
+    )
+    # El día de un préstamo depende de la zona horaria: en lugar de truncar la
+    # columna fila a fila (una función Python por fila en SQLite) se clasifica
+    # con un CASE sobre los límites de cada día, calculados aquí
+    dias = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+    dia = Case(
+        *[When(fecha_generacion__lt=inicio_dia(dia + timedelta(days=1)), then=Value(dia)) for dia in dias],
+        output_field=DateField(),
+    )
+    prestamos = (
+        filtrar_por_fechas(_prestamos(usuario), 'fecha_generacion', desde, hasta)
+        .annotate(dia=dia).values('dia').annotate(total=Count('id')).order_by('dia')
+    )
+    return vencimientos, prestamos
+
+
+def _por_dia(usuario, desde, hasta):
+    vencimientos, prestamos = consultas_por_dia(usuario, desde, hasta)
+    hoy = timezone.localdate()
+    eventos = [{
+        'id': f"v{fila['fecha_vencimiento'].isoformat()}",
+        'title': f"{fila['total']} vencimientos",
+        'start': fila['fecha_vencimiento'].isoformat(),
+        'allDay': True,
+        'className': 'bg-danger' if fila['fecha_vencimiento'] < hoy else 'bg-warning',
+    } for fila in vencimientos]
+    eventos += [{
+        'id': f"p{fila['dia'].isoformat()}",
+        'title': f"{fila['total']} préstamos",
+        'start': fila['dia'].isoformat(),
+        'allDay': True,
+        'className': 'bg-info',
+    } for fila in prestamos]
+    return eventos
+
+
+def eventos(usuario, desde, hasta):
+    """
+    Eventos de FullCalendar entre `desde` y `hasta` (fechas, ambas incluidas).
+    Con usuario=None se incluyen las deudas de todos los usuarios.
+    """
+    if hasta - desde > timedelta(days=MAX_DIAS):
+        raise ValueError(f'El rango no puede superar {MAX_DIAS} días')
+    if hasta - desde <= timedelta(days=DIAS_DETALLE):
+        detalle = _detalle(usuario, desde, hasta)
+        if detalle is not None:
+            return detalle
+    return _por_dia(usuario, desde, hasta)
@@ -0,0 +1,77 @@
+# audiovisuals_stock/catalogos.py
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Proveedor, TipoMaterial
+
+
+# ================ CACHÉ DE TABLAS DE REFERENCIA ================ #
+# Tipos de material y proveedores casi nunca cambian y se leen en cada
+# formulario de material. Se guardan enteros en la caché de Django bajo una
+# clave versionada; guardar o borrar una fila (señales en signals.py) sube la
+# versión al confirmarse la transacción y las entradas anteriores dejan de
+# leerse. Con varios procesos la caché debe ser compartida (CACHE_URL) para que
+# la invalidación llegue a todos.
+
+MODELOS = {'tipos': TipoMaterial, 'proveedores': Proveedor}
+DURACION = 24 * 60 * 60
+
+_contadores = Counter()
+_cerrojo = threading.Lock()
+
+
+def _nombre(modelo):
+    return next(nombre for nombre, clase in MODELOS.items() if clase is modelo)
+
+
+def _version(nombre):
+    # Si la versión no está (expulsada o caché nueva) se empieza por una que no
+    # puede coincidir con la de datos antiguos que sigan en la caché
+    return cache.get_or_set(f'catalogo:{nombre}:version', time.time_ns, None)
+
+
+def _contar(nombre, resultado):
+    with _cerrojo:
+        _contadores[f'{nombre}_{resultado}'] += 1
+
+
+def filas(modelo):
+    """Todas las filas del modelo, ordenadas por nombre, desde la caché si están."""
+    nombre = _nombre(modelo)
+    clave = f'catalogo:{nombre}:v{_version(nombre)}'
+    datos = cache.get(clave)
+    if datos is None:
+        _contar(nombre, 'fallos')
+        datos = list(modelo.objects.order_by('nombre'))
+        cache.set(clave, datos, DURACION)
+    else:
+        _contar(nombre, 'aciertos')
+    return datos
+
+
+def opciones(modelo, vacia='---------'):
+    """Choices para un <select>: la opción vacía y (id, nombre) de cada fila."""
+    return [('', vacia)] + [(fila.pk, fila.nombre) for fila in filas(modelo)]
+
+
+def invalidar(modelo):
+    # Tras el COMMIT, como versiones.subir(): antes, otra petición podría leer
+    # las filas antiguas y guardarlas bajo la versión nueva; con rollback no se sube
+    clave = f'catalogo:{_nombre(modelo)}:version'
+    transaction.on_commit(lambda: _subir_version(clave))
+
+
+def _subir_version(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), None)
+
+
+def estadisticas():
+    with _cerrojo:
+        return dict(_contadores)
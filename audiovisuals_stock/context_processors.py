@@ -0,0 +1,12 @@
+# audiovisuals_stock/context_processors.py
+from django.utils.functional import SimpleLazyObject
+
+from .models import ResumenDeuda
+
+
+def resumen_deuda(request):
+    # Resumen de deudas abiertas del usuario para la cabecera: una lectura por
+    # clave primaria, y solo si la plantilla llega a usarlo
+    if not request.user.is_authenticated:
+        return {}
+    return {'resumen_deuda': SimpleLazyObject(lambda: ResumenDeuda.objects.filter(usuario_id=request.user.id).first())}
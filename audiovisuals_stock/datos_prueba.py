@@ -0,0 +1,149 @@
+# audiovisuals_stock/datos_prueba.py
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import busqueda, catalogos, services, versiones
+from .models import (
+    CustomUser, DeudaMaterial, Material, MaterialLog, MovimientoStock, Proveedor, ResumenDeuda, TipoMaterial, UserProfile,
+)
+
+
+# ================ GENERACIÓN DE DATOS PARA BENCHMARKS ================ #
+# Solo bulk_create: sirve para llenar bases de datos de prueba con cientos de
+# miles de filas en segundos. No usar contra la base de datos de producción.
+
+LOTE = 5000
+
+
+def crear_usuarios(cantidad, prefijo='bench'):
+    """
+    Crea `cantidad` usuarios con su perfil. CustomUser.userprofile y
+    UserProfile.user se apuntan mutuamente; como la FK es diferida, ambos se
+    insertan en la misma transacción con ids de perfil reservados a mano.
+    """
+    with transaction.atomic():
+        siguiente_perfil = (UserProfile.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        usuarios = CustomUser.objects.bulk_create([
+            CustomUser(
+                email=f'{prefijo}-{i}@bench.local', nombre=f'{prefijo} {i}', password='!',
+                userprofile_id=siguiente_perfil + i,
+            )
+            for i in range(cantidad)
+        ], batch_size=LOTE)
+        if not all(usuario.pk for usuario in usuarios):
+            # Motores sin RETURNING en bulk_create: se recuperan los ids por email
+            ids = dict(CustomUser.objects.filter(email__in=[u.email for u in usuarios]).values_list('email', 'id'))
+            for usuario in usuarios:
+                usuario.pk = ids[usuario.email]
+        UserProfile.objects.bulk_create([
+            UserProfile(id=siguiente_perfil + i, user_id=usuario.pk) for i, usuario in enumerate(usuarios)
+        ], batch_size=LOTE)
+    return usuarios
+
+
+def sembrar(usuarios=100, materiales=1000, logs=10000, deudas=2000, semilla=0, salida=None):
+    """Llena la base de datos actual con un inventario sintético pero realista."""
+    aleatorio = random.Random(semilla)
+
+    def informar(mensaje):
+        if salida:
+            salida.write(mensaje)
+
+    lista_usuarios = crear_usuarios(usuarios)
+    ids_usuarios = [usuario.pk for usuario in lista_usuarios]
+    informar(f'{usuarios} usuarios')
+
+    tipos = TipoMaterial.objects.bulk_create([TipoMaterial(nombre=f'Tipo bench {i}') for i in range(20)])
+    proveedores = Proveedor.objects.bulk_create([Proveedor(nombre=f'Proveedor bench {i}') for i in range(10)])
+    ids_tipos = [t.pk for t in tipos] or list(TipoMaterial.objects.values_list('id', flat=True))
+    ids_proveedores = [p.pk for p in proveedores] or list(Proveedor.objects.values_list('id', flat=True))
+    catalogos.invalidar(TipoMaterial)
+    catalogos.invalidar(Proveedor)
+    ids_materiales, stock = [], {}
+    for inicio in range(0, materiales, LOTE):
+        creados = Material.objects.bulk_create([
+            Material(
+                referencia=f'BR{i:07d}', nombre=f'Material bench {i}', cantidad=aleatorio.randint(0, 50),
+                tipo_id=aleatorio.choice(ids_tipos), proveedor_id=aleatorio.choice(ids_proveedores),
+                creadopor_id=aleatorio.choice(ids_usuarios), fecha_compra=date(2020, 1, 1) + timedelta(days=i % 1500),
+                numero_serie=f'BSN{i:08d}',
+            )
+            for i in range(inicio, min(inicio + LOTE, materiales))
+        ])
+        ids_materiales.extend(material.pk for material in creados)
+        stock.update((material.pk, material.cantidad) for material in creados)
+    busqueda.indexar(ids_materiales)
+    versiones.subir('catalogo')
+    informar(f'{materiales} materiales')
+
+    ahora = timezone.now()
+    for inicio in range(0, logs, LOTE):
+        MaterialLog.objects.bulk_create([
+            MaterialLog(
+                material_id=aleatorio.choice(ids_materiales), usuario_id=aleatorio.choice(ids_usuarios),
+                cantidad_extraida=aleatorio.randint(1, 5),
+                fecha_accion=ahora - timedelta(minutes=aleatorio.randint(0, 60 * 24 * 730)),
+            )
+            for _ in range(inicio, min(inicio + LOTE, logs))
+        ])
+    informar(f'{logs} logs')
+
+    # Deudas: la mayoría devueltas; como mucho una abierta por (usuario, material).
+    # Cada una deja en el libro su extracción y, si está devuelta, su devolución
+    abiertas = set()
+    pendientes = []
+    azar_libro = random.Random(semilla + 1)  # Aparte: las deudas no cambian respecto a semillas anteriores
+    for _ in range(deudas):
+        usuario_id, material_id = aleatorio.choice(ids_usuarios), aleatorio.choice(ids_materiales)
+        devuelta = aleatorio.random() < 0.8 or (usuario_id, material_id) in abiertas
+        if not devuelta:
+            abiertas.add((usuario_id, material_id))
+        pendientes.append(DeudaMaterial(
+            usuario_id=usuario_id, material_id=material_id, cantidad_adeudada=aleatorio.randint(1, 5),
+            fecha_vencimiento=(ahora + timedelta(days=aleatorio.randint(-60, 14))).date(), devuelta=devuelta,
+        ))
+        if len(pendientes) >= LOTE:
+            _crear_deudas(pendientes, stock, azar_libro, ahora)
+            pendientes = []
+    _crear_deudas(pendientes, stock, azar_libro, ahora)
+    # La compra inicial cubre el stock de ahora más lo que sigue prestado: el libro cuadra con Material.cantidad
+    for inicio in range(0, len(ids_materiales), LOTE):
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(
+                material_id=material_id, tipo=MovimientoStock.COMPRA, cantidad=stock[material_id],
+                fecha=ahora - timedelta(days=731),
+            )
+            for material_id in ids_materiales[inicio:inicio + LOTE] if stock[material_id]
+        ])
+    nuevos = set(ids_usuarios)
+    ResumenDeuda.objects.bulk_create([
+        ResumenDeuda(usuario_id=usuario_id, items=items, unidades=unidades, proximo_vencimiento=proximo)
+        for usuario_id, (items, unidades, proximo) in services.calcular_resumenes().items()
+        if usuario_id in nuevos
+    ], batch_size=LOTE)
+    informar(f'{deudas} deudas ({len(abiertas)} abiertas)')
+    return ids_usuarios, ids_materiales
+
+
+def _crear_deudas(deudas, stock, aleatorio, ahora):
+    # Inserta las deudas y sus movimientos de préstamo en el último año, en
+    # orden de fecha; `stock` acumula lo que sigue prestado de cada material
+    DeudaMaterial.objects.bulk_create(deudas)
+    movimientos = []
+    for deuda in deudas:
+        extraida = ahora - timedelta(minutes=aleatorio.randint(15 * 24 * 60, 365 * 24 * 60))
+        movimientos.append(MovimientoStock(
+            material_id=deuda.material_id, usuario_id=deuda.usuario_id, tipo=MovimientoStock.EXTRACCION,
+            cantidad=-deuda.cantidad_adeudada, fecha=extraida,
+        ))
+        if deuda.devuelta:
+            movimientos.append(MovimientoStock(
+                material_id=deuda.material_id, usuario_id=deuda.usuario_id, tipo=MovimientoStock.DEVOLUCION,
+                cantidad=deuda.cantidad_adeudada, fecha=extraida + timedelta(minutes=aleatorio.randint(60, 14 * 24 * 60)),
+            ))
+        else:
+            stock[deuda.material_id] += deuda.cantidad_adeudada
+    MovimientoStock.objects.bulk_create(sorted(movimientos, key=lambda movimiento: movimiento.fecha))
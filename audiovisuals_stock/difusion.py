@@ -0,0 +1,125 @@
+# audiovisuals_stock/difusion.py
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Material
+
+
+# ================ DIFUSIÓN DE CAMBIOS DE STOCK ================ #
+# Tras confirmar cada extracción o devolución se publica un evento pequeño con
+# la cantidad nueva de los materiales tocados: [{"id", "cantidad", "ts"}, ...].
+# La vista views_async.eventos_stock lo reenvía por Server-Sent Events y las
+# páginas abiertas (catálogo, detalle) actualizan la cifra sin recargar.
+#
+# El reparto lo hace DIFUSION_BACKEND, una clase con:
+#   - escuchando() -> bool: si hay alguien suscrito (si no, no se lee nada).
+#   - publicar(deltas): reparte a los suscriptores; deltas=None es un hueco
+#     (cambios no publicados): quien lo reciba debe recargar.
+#   - suscribir(desde) -> Suscripcion: eventos posteriores al id `desde`.
+# DifusionMemoria sirve para un solo proceso ASGI; con varios procesos hace
+# falta un backend compartido (p. ej. pub/sub de Redis) con la misma interfaz.
+
+RECARGAR = 'recargar'
+
+
+class Suscripcion:
+    """Cola de eventos de un cliente, en el bucle de eventos de su conexión."""
+
+    def __init__(self, difusion, maximo):
+        self._difusion = difusion
+        self._bucle = asyncio.get_running_loop()
+        self._cola = asyncio.Queue(maxsize=maximo)
+
+    def entregar(self, evento_id, deltas):
+        # Se llama desde cualquier hilo (el que confirmó la transacción)
+        self._bucle.call_soon_threadsafe(self._poner, evento_id, deltas)
+
+    def _poner(self, evento_id, deltas):
+        if self._cola.full():
+            # Cliente demasiado lento: se vacía la cola y se le pide recargar
+            while not self._cola.empty():
+                self._cola.get_nowait()
+            deltas = None
+        self._cola.put_nowait((evento_id, deltas))
+
+    async def siguiente(self, espera):
+        """(id, deltas) del siguiente evento, o None si pasan `espera` segundos sin ninguno."""
+        try:
+            return await asyncio.wait_for(self._cola.get(), espera)
+        except asyncio.TimeoutError:
+            return None
+
+    def cancelar(self):
+        self._difusion.cancelar(self)
+
+
+class DifusionMemoria:
+    """Reparto dentro del proceso, con los últimos eventos para reanudar (Last-Event-ID)."""
+
+    def __init__(self, historial=1000, cola=100):
+        self._cerrojo = threading.Lock()
+        self._suscripciones = set()
+        self._historial = deque(maxlen=historial)
+        self._ultimo_id = 0
+        self._cola = cola
+
+    def escuchando(self):
+        return bool(self._suscripciones)
+
+    def publicar(self, deltas):
+        with self._cerrojo:
+            self._ultimo_id += 1
+            self._historial.append((self._ultimo_id, deltas))
+            evento_id, destinatarios = self._ultimo_id, list(self._suscripciones)
+        for suscripcion in destinatarios:
+            suscripcion.entregar(evento_id, deltas)
+
+    def suscribir(self, desde=None):
+        suscripcion = Suscripcion(self, self._cola)
+        with self._cerrojo:
+            self._suscripciones.add(suscripcion)
+            if desde is not None and desde < self._ultimo_id:
+                pendientes = [(evento_id, deltas) for evento_id, deltas in self._historial if evento_id > desde]
+                if not pendientes or pendientes[0][0] != desde + 1:
+                    # El historial ya no llega hasta `desde`: faltan eventos
+                    pendientes = [(self._ultimo_id, None)]
+                for evento_id, deltas in pendientes:
+                    suscripcion.entregar(evento_id, deltas)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._cerrojo:
+            self._suscripciones.discard(suscripcion)
+
+
+@functools.lru_cache(maxsize=None)
+def canal():
+    return import_string(getattr(settings, 'DIFUSION_BACKEND', 'audiovisuals_stock.difusion.DifusionMemoria'))()
+
+
+def stock_cambiado(material_ids):
+    """
+    Publica al confirmar la transacción la cantidad actual de los materiales.
+    Se llama después del UPDATE de stock y dentro de la misma transacción: la
+    fila sigue bloqueada, así que la cantidad leída es la que deja este cambio
+    y `ts` ordena los eventos de un mismo material.
+    """
+    difusion = canal()
+    if not difusion.escuchando():
+        # Nadie conectado: ni lectura ni evento, solo un hueco para quien se reconecte
+        transaction.on_commit(lambda: difusion.publicar(None))
+        return
+    ts = time.time_ns() // 1000  # Microsegundos: cabe en un número de JavaScript sin perder precisión
+    deltas = [
+        {'id': material_id, 'cantidad': cantidad, 'ts': ts}
+        for material_id, cantidad in Material.objects.filter(id__in=material_ids).values_list('id', 'cantidad')
+    ]
+    if deltas:
+        transaction.on_commit(lambda: difusion.publicar(deltas))
@@ -0,0 +1,215 @@
+# audiovisuals_stock/estaticos.py
+import gzip
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin el paquete Brotli solo se generan las variantes .gz
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:  # Opcional: sin rjsmin los JS se concatenan sin minimizar
+    rjsmin = None
+
+try:
+    import sass
+except ImportError:  # Opcional: sin libsass se usa el CSS ya compilado del repositorio
+    sass = None
+
+
+# ================ PAQUETES ================ #
+# Cada paquete se construye (manage.py build_assets) concatenando y minimizando
+# sus ficheros, que se buscan con los finders de staticfiles (así jQuery sale
+# del admin de Django). Con PAQUETES_ACTIVOS = False (desarrollo) las etiquetas
+# {% paquete_css %} y {% paquete_js %} enlazan los ficheros originales.
+
+DIRECTORIO = 'paquetes'
+
+PAQUETES = {
+    'base.css': [
+        'css/bootstrap.css',
+        'css/icons.css',
+        'css/responsive.bootstrap4.css',
+        'css/app.css',
+    ],
+    # Páginas de acceso (login, registro, 404): mismo orden que tenían
+    'acceso.css': [
+        'css/app.css',
+        'css/bootstrap.css',
+        'css/icons.css',
+    ],
+    'calendario.css': [
+        'css/calendar/core/main.css',
+        'css/calendar/daygrid/main.css',
+        'css/calendar/bootstrap/main.css',
+        'css/calendar/timegrid/main.css',
+    ],
+    'jquery.js': [
+        'admin/js/vendor/jquery/jquery.min.js',
+    ],
+    'comun.js': [
+        'js/waves.min.js',
+        'js/modal.js',
+        'js/simplebar.js',
+        'js/bootstrap.bundle.min.js',
+        'js/busqueda.js',
+        'js/stock_vivo.js',
+    ],
+    'tablas.js': [
+        'js/jquery.dataTables.js',
+        'js/dataTables.bootstrap4.js',
+        'js/dataTables.responsive.js',
+        'js/responsive.bootstrap4.js',
+        'js/datables.init.js',
+    ],
+    # Botones de exportación (Excel/PDF, ~4 MB): solo en las tablas que los usan
+    'exportacion.js': [
+        'js/dataTables.buttons.js',
+        'js/buttons.bootstrap4.js',
+        'js/jszip.js',
+        'js/pdfmake.js',
+        'js/vfs_fonts.js',
+        'js/buttons.html5.js',
+        'js/buttons.print.js',
+        'js/buttons.colVis.js',
+    ],
+    'calendario.js': [
+        'js/calendar/core/main.js',
+        'js/calendar/bootstrap/main.js',
+        'js/calendar/daygrid/main.js',
+        'js/calendar/timegrid/main.js',
+        'js/calendar/interaction/main.js',
+        'js/calendar/calendar.init.js',
+    ],
+}
+
+# CSS que se compila desde SCSS en la construcción si libsass está instalado
+SCSS = {
+    'css/app.css': 'scss/app.scss',
+}
+
+
+def rutas(nombre):
+    """Rutas estáticas que enlaza la plantilla para el paquete `nombre`."""
+    if getattr(settings, 'PAQUETES_ACTIVOS', False):
+        return [f'{DIRECTORIO}/{nombre}']
+    return PAQUETES[nombre]
+
+
+def _leer(ruta):
+    if sass and ruta in SCSS:
+        return sass.compile(filename=finders.find(SCSS[ruta]), output_style='expanded')
+    encontrado = finders.find(ruta)
+    if not encontrado:
+        raise FileNotFoundError(f'No se encuentra el fichero estático {ruta}')
+    with open(encontrado, encoding='utf-8') as fichero:
+        return fichero.read()
+
+
+_URL_CSS = re.compile(r'url\(\s*([\'"]?)(.*?)\1\s*\)')
+_COMENTARIO_CSS = re.compile(r'/\*(?!!).*?\*/', re.S)
+_MAPA_JS = re.compile(r'^\s*//[#@] sourceMappingURL=.*$', re.M)
+
+
+def _reubicar_urls(texto, origen, destino):
+    # Las url() relativas se reescriben para que sigan apuntando al mismo
+    # fichero desde la carpeta del paquete
+    def reubicar(coincidencia):
+        comilla, url = coincidencia.groups()
+        if not url or url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return coincidencia.group(0)
+        absoluta = posixpath.normpath(posixpath.join(posixpath.dirname(origen), url))
+        return f'url({comilla}{posixpath.relpath(absoluta, posixpath.dirname(destino))}{comilla})'
+    return _URL_CSS.sub(reubicar, texto)
+
+
+def minimizar_css(texto):
+    texto = _COMENTARIO_CSS.sub('', texto)
+    texto = re.sub(r'\s+', ' ', texto)
+    texto = re.sub(r'\s*([{};,>])\s*', r'\1', texto)
+    return texto.replace(';}', '}').strip()
+
+
+def minimizar_js(texto):
+    texto = _MAPA_JS.sub('', texto)
+    return rjsmin.jsmin(texto, keep_bang_comments=True) if rjsmin else texto
+
+
+def construir(nombre):
+    """Contenido del paquete `nombre`, listo para escribir en disco."""
+    destino = f'{DIRECTORIO}/{nombre}'
+    if nombre.endswith('.css'):
+        partes = [_reubicar_urls(_leer(ruta), ruta, destino) for ruta in PAQUETES[nombre]]
+        return minimizar_css('\n'.join(partes))
+    # ';' entre ficheros por si alguno no termina la última sentencia
+    return ';\n'.join(minimizar_js(_leer(ruta)) for ruta in PAQUETES[nombre])
+
+
+def directorio_salida():
+    # Dentro de static/ de la aplicación para que AppDirectoriesFinder los recoja
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', DIRECTORIO)
+
+
+# ================ ALMACENAMIENTO CON HASH Y PRECOMPRESIÓN ================ #
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.eot', '.ttf', '.otf')
+TAMANO_MINIMO = 1024
+
+
+class AlmacenEstaticos(ManifestStaticFilesStorage):
+    """
+    collectstatic con nombres con hash del contenido (caché de un año en el
+    servidor) y variantes .gz y .br de cada fichero de texto, para que el
+    servidor no tenga que comprimir en cada petición.
+    """
+
+    # Solo se reescriben url() e @import de los CSS: los mapas de código de los
+    # JS de terceros no se distribuyen y romperían el post-procesado
+    patterns = (
+        ('*.css', (
+            r"""(?P<matched>url\(['"]{0,1}\s*(?P<url>.*?)["']{0,1}\))""",
+            (r"""(?P<matched>@import\s*["']\s*(?P<url>.*?)["'])""", """@import url("%(url)s")"""),
+        )),
+    )
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # url() a ficheros que la plantilla del tema no incluye (imágenes de
+            # ejemplo): se dejan como están en lugar de abortar collectstatic
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        procesados = set()
+        for original, procesado, hecho in super().post_process(paths, dry_run, **options):
+            if procesado and not isinstance(hecho, Exception):
+                procesados.add(procesado)
+            yield original, procesado, hecho
+        if dry_run:
+            return
+        for nombre in procesados:
+            self._comprimir(nombre)
+
+    def _comprimir(self, nombre):
+        if not nombre.endswith(EXTENSIONES_COMPRIMIBLES):
+            return
+        ruta = self.path(nombre)
+        with open(ruta, 'rb') as fichero:
+            datos = fichero.read()
+        if len(datos) < TAMANO_MINIMO:
+            return
+        variantes = [('.gz', gzip.compress(datos, compresslevel=9, mtime=0))]
+        if brotli:
+            variantes.append(('.br', brotli.compress(datos)))
+        for extension, comprimido in variantes:
+            # Solo merece la pena si ahorra al menos un 5 %
+            if len(comprimido) < len(datos) * 0.95:
+                with open(ruta + extension, 'wb') as fichero:
+                    fichero.write(comprimido)
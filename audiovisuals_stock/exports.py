@@ -0,0 +1,144 @@
+# audiovisuals_stock/exports.py
+import csv
+import json
+import zlib
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from .models import Material, DeudaMaterial, MaterialLog
+
+
+# ================ CONJUNTOS EXPORTABLES ================ #
+# Cada conjunto es (modelo, columnas, campo de fecha para filtrar). Las columnas
+# son lookups de values_list, así que los nombres de las FK salen del mismo JOIN.
+CONJUNTOS = {
+    'materiales': (Material, [
+        'id', 'referencia', 'nombre', 'cantidad', 'tipo__nombre', 'fecha_compra',
+        'proveedor__nombre', 'numero_serie', 'creadopor__email',
+    ], 'fecha_compra'),
+    'deudas': (DeudaMaterial, [
+        'id', 'usuario__email', 'material_id', 'material__referencia', 'material__nombre',
+        'cantidad_adeudada', 'fecha_generacion', 'fecha_vencimiento', 'devuelta',
+    ], 'fecha_generacion'),
+    'logs': (MaterialLog, [
+        'id', 'material_id', 'material__referencia', 'material__nombre', 'usuario__email',
+        'cantidad_extraida', 'fecha_accion',
+    ], 'fecha_accion'),
+}
+
+TAMANO_CHUNK = 2000
+TAMANO_BLOQUE = 64 * 1024
+
+
+def inicio_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def filtrar_por_fechas(queryset, campo_fecha, desde=None, hasta=None):
+    """Filtra por un rango de días inclusivo sin funciones sobre la columna (usa su índice)."""
+    fecha_es_datetime = queryset.model._meta.get_field(campo_fecha).get_internal_type() == 'DateTimeField'
+    if desde:
+        queryset = queryset.filter(**{f'{campo_fecha}__gte': inicio_dia(desde) if fecha_es_datetime else desde})
+    if hasta:
+        # `hasta` es inclusivo: se filtra por < día siguiente
+        siguiente = hasta + timedelta(days=1)
+        queryset = queryset.filter(**{f'{campo_fecha}__lt': inicio_dia(siguiente) if fecha_es_datetime else siguiente})
+    return queryset
+
+
+def filas(conjunto, desde=None, hasta=None):
+    """
+    Itera las filas del conjunto (tuplas) por chunks, sin cachear el queryset.
+    Los conjuntos que archivar_registros saca de la base de datos (logs) se
+    leen con archivo.filas(): las filas archivadas y las vivas, por (fecha, id).
+    """
+    from . import archivo  # archivo.py importa de este módulo
+
+    modelo, columnas, campo_fecha = CONJUNTOS[conjunto]
+    if conjunto in archivo.ARCHIVABLES:
+        return _con_relaciones(modelo, columnas, archivo.filas(conjunto, desde, hasta))
+    queryset = filtrar_por_fechas(modelo.objects.all(), campo_fecha, desde, hasta)
+    return queryset.order_by('id').values_list(*columnas).iterator(chunk_size=TAMANO_CHUNK)
+
+
+def _con_relaciones(modelo, columnas, filas):
+    # Filas {columna: valor} a tuplas de `columnas`; las columnas `fk__campo`
+    # se leen por bloques de TAMANO_CHUNK filas, con una consulta por FK
+    relaciones = defaultdict(list)
+    for columna in columnas:
+        if '__' in columna:
+            fk, campo = columna.split('__', 1)
+            relaciones[fk].append(campo)
+    while True:
+        bloque = list(islice(filas, TAMANO_CHUNK))
+        if not bloque:
+            return
+        valores = {}
+        for fk, campos in relaciones.items():
+            relacionado = modelo._meta.get_field(fk).related_model
+            ids = {fila[f'{fk}_id'] for fila in bloque}
+            for id_, *datos in relacionado.objects.filter(id__in=ids).values_list('id', *campos):
+                valores.update({(f'{fk}__{campo}', id_): dato for campo, dato in zip(campos, datos)})
+        for fila in bloque:
+            # Una fila archivada puede apuntar a un material o usuario ya borrado: la columna queda vacía
+            yield tuple(
+                valores.get((columna, fila[columna.split('__')[0] + '_id'])) if '__' in columna else fila[columna]
+                for columna in columnas
+            )
+
+
+def _serializar(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+class _Eco:
+    # Buffer de escritura que devuelve lo escrito (patrón de la documentación de Django)
+    def write(self, valor):
+        return valor
+
+
+def lineas(conjunto, formato='csv', desde=None, hasta=None):
+    """Genera el volcado como trozos de texto (cabecera incluida en CSV)."""
+    columnas = CONJUNTOS[conjunto][1]
+    if formato == 'jsonl':
+        for fila in filas(conjunto, desde, hasta):
+            yield json.dumps(dict(zip(columnas, map(_serializar, fila))), ensure_ascii=False) + '\n'
+    else:
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(columnas)
+        for fila in filas(conjunto, desde, hasta):
+            yield escritor.writerow([_serializar(valor) for valor in fila])
+
+
+def bloques(conjunto, formato='csv', desde=None, hasta=None, comprimir=False):
+    """
+    Agrupa las líneas en bloques de ~64 KB de bytes, comprimidos con gzip al
+    vuelo si se pide. La memoria usada no depende del número de filas.
+    """
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+    pendiente = []
+    tamano = 0
+    for linea in lineas(conjunto, formato, desde, hasta):
+        pendiente.append(linea)
+        tamano += len(linea)
+        if tamano >= TAMANO_BLOQUE:
+            datos = ''.join(pendiente).encode('utf-8')
+            pendiente, tamano = [], 0
+            if compresor:
+                datos = compresor.compress(datos)
+            if datos:
+                yield datos
+    datos = ''.join(pendiente).encode('utf-8')
+    if compresor:
+        datos = compresor.compress(datos) + compresor.flush()
+    if datos:
+        yield datos
+
+
+def nombre_archivo(conjunto, formato='csv', comprimir=False):
+    return f"{conjunto}-{timezone.now():%Y%m%d}.{formato}{'.gz' if comprimir else ''}"
@@ -3,6 +3,7 @@ from django import forms
 from .models import UserProfile  # Asegúrate de importar tu modelo de perfil
 from django.contrib.auth.forms import UserCreationForm
 from .models import CustomUser, Material, TipoMaterial, Proveedor, MaterialLog
+from . import catalogos
 
 
 class UserProfileForm(forms.ModelForm):
@@ -52,6 +53,13 @@ class ProveedorForm(forms.ModelForm):
         fields = ['nombre']
 
 
+def _opciones_desde_cache(form):
+    # Los <select> se pintan con las listas en caché; validar el valor elegido
+    # sigue consultando la base de datos (queryset del ModelChoiceField)
+    form.fields['tipo'].choices = catalogos.opciones(TipoMaterial, form.fields['tipo'].empty_label)
+    form.fields['proveedor'].choices = catalogos.opciones(Proveedor, form.fields['proveedor'].empty_label)
+
+
 class MaterialForm(forms.ModelForm):
     class Meta:
         model = Material
@@ -59,11 +67,19 @@ class MaterialForm(forms.ModelForm):
         tipo = forms.ModelChoiceField(queryset=TipoMaterial.objects.all(), empty_label="Selecciona un Tipo")
         proveedor = forms.ModelChoiceField(queryset=Proveedor.objects.all(), empty_label="Selecciona un Proveedor")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _opciones_desde_cache(self)
+
 class MaterialEditForm(forms.ModelForm):
     class Meta:
         model = Material
         fields = ['referencia', 'nombre', 'cantidad', 'tipo', 'fecha_compra', 'proveedor', 'numero_serie']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _opciones_desde_cache(self)
+
 
 class ExtraccionMaterialForm(forms.ModelForm):
     class Meta:
@@ -76,4 +92,10 @@ class ExtraccionMaterialForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['cantidad_extraida'].widget = forms.NumberInput(attrs={'min': 1})
\ No newline at end of file
+        self.fields['cantidad_extraida'].widget = forms.NumberInput(attrs={'min': 1})
+
+    def clean_cantidad_extraida(self):
+        cantidad = self.cleaned_data['cantidad_extraida']
+        if cantidad < 1:
+            raise forms.ValidationError('La cantidad a extraer debe ser mayor que cero')
+        return cantidad
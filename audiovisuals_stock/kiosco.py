@@ -0,0 +1,103 @@
+# audiovisuals_stock/kiosco.py
+import threading
+from collections import OrderedDict
+
+from .models import Material
+
+
+# ================ RESOLUCIÓN DE CÓDIGOS ESCANEADOS ================ #
+# Un código leído por el escáner es un número de serie o una referencia. Se
+# busca por igualdad en los índices (numero_serie, id) y (referencia, id) y el
+# id resultante se guarda en una caché LRU del proceso.
+#
+# La caché solo guarda ids: quien la usa vuelve a leer el material por clave
+# primaria y comprueba con `coincide` que el código sigue siendo suyo, así que
+# una entrada obsoleta (material editado en otro proceso) nunca hace operar
+# sobre el material equivocado.
+
+TAMANO_CACHE = 4096
+
+
+class CodigoDesconocido(Exception):
+    """Ningún material tiene ese número de serie o referencia."""
+
+
+class CodigoAmbiguo(Exception):
+    """Varios materiales comparten el código; `materiales` son sus ids."""
+
+    def __init__(self, mensaje, materiales=()):
+        super().__init__(mensaje)
+        self.materiales = list(materiales)
+
+
+class _CacheCodigos:
+    def __init__(self, tamano):
+        self._tamano = tamano
+        self._datos = OrderedDict()
+        self._cerrojo = threading.Lock()
+
+    def obtener(self, codigo):
+        with self._cerrojo:
+            material_id = self._datos.get(codigo)
+            if material_id is not None:
+                self._datos.move_to_end(codigo)
+            return material_id
+
+    def guardar(self, codigo, material_id):
+        with self._cerrojo:
+            self._datos[codigo] = material_id
+            self._datos.move_to_end(codigo)
+            while len(self._datos) > self._tamano:
+                self._datos.popitem(last=False)
+
+    def olvidar(self, codigo=None):
+        with self._cerrojo:
+            if codigo is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(codigo, None)
+
+
+cache = _CacheCodigos(TAMANO_CACHE)
+
+
+def normalizar(codigo):
+    return (codigo or '').strip()
+
+
+def coincide(material, codigo):
+    return codigo in (material.numero_serie, material.referencia)
+
+
+def consultas_codigo(codigo):
+    """(ids por número de serie, ids por referencia), hasta 10 de cada y por id, de un código ya normalizado."""
+    # numero_serie no es único en la tabla: se piden varios para detectar duplicados
+    return (
+        Material.objects.filter(numero_serie=codigo).order_by('id').values_list('id', flat=True)[:10],
+        Material.objects.filter(referencia=codigo).order_by('id').values_list('id', flat=True)[:10],
+    )
+
+
+def resolver(codigo):
+    """Id del material con ese número de serie o, si no hay, esa referencia."""
+    codigo = normalizar(codigo)
+    if not codigo:
+        raise CodigoDesconocido('Código vacío')
+    material_id = cache.obtener(codigo)
+    if material_id is not None:
+        return material_id
+
+    # El número de serie identifica una unidad; la referencia puede repetirse
+    por_numero_serie, por_referencia = consultas_codigo(codigo)
+    candidatos = list(por_numero_serie)
+    if len(candidatos) > 1:
+        raise CodigoAmbiguo(f'Varios materiales tienen el número de serie {codigo}; corrígelo en el inventario', candidatos)
+    if not candidatos:
+        candidatos = list(por_referencia)
+        if not candidatos:
+            raise CodigoDesconocido(f'No hay ningún material con el código {codigo}')
+        if len(candidatos) > 1:
+            raise CodigoAmbiguo(f'Varios materiales tienen la referencia {codigo}; escanea el número de serie', candidatos)
+    material_id = candidatos[0]
+    cache.guardar(codigo, material_id)
+    return material_id
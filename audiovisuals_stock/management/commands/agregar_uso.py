@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from audiovisuals_stock import uso
+
+
+class Command(BaseCommand):
+    help = (
+        'Agrega al uso diario por material y tipo los movimientos de préstamo desde la última '
+        'pasada (programar cada pocos minutos); los informes de uso solo leen estos agregados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=uso.LOTE, help='Movimientos por transacción')
+        parser.add_argument('--reconstruir', action='store_true', help='Borra los agregados y recorre el libro desde el principio')
+
+    def handle(self, *args, **opciones):
+        if opciones['reconstruir']:
+            uso.reconstruir()
+        inicio = time.perf_counter()
+        agregados = uso.agregar(opciones['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{agregados} movimientos agregados en {time.perf_counter() - inicio:.1f}s'
+        ))
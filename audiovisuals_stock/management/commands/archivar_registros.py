@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from audiovisuals_stock import archivo
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve los logs, la actividad y la auditoría anteriores a la retención a JSONL '
+        'comprimido por días en ARCHIVO_DIR (programar, p. ej., cada noche)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--conjunto', action='append', choices=sorted(archivo.ARCHIVABLES), help='Repetible; por defecto, todos',
+        )
+        parser.add_argument('--meses', type=int, help='Meses que se quedan en la base de datos (por defecto RETENCION_MESES)')
+        parser.add_argument('--lote', type=int, default=archivo.LOTE, help='Filas por transacción')
+        parser.add_argument('--vacuum', action='store_true', help='En SQLite, VACUUM al terminar para encoger el fichero')
+
+    def handle(self, *args, **opciones):
+        hasta = archivo.corte(opciones['meses'])
+        self.stdout.write(f'Archivando lo anterior a {hasta:%Y-%m-%d} en {settings.ARCHIVO_DIR}')
+        for conjunto in opciones['conjunto'] or sorted(archivo.ARCHIVABLES):
+            inicio = time.perf_counter()
+            try:
+                movidas = archivo.archivar(conjunto, hasta, opciones['lote'])
+            except archivo.ArchivoOcupado as error:
+                raise CommandError(str(error))
+            self.stdout.write(self.style.SUCCESS(
+                f'{conjunto}: {movidas} filas archivadas en {time.perf_counter() - inicio:.1f}s'
+            ))
+
+        if opciones['vacuum']:
+            if connection.vendor != 'sqlite':
+                raise CommandError('--vacuum solo se aplica a SQLite')
+            # SQLite reutiliza las páginas liberadas, pero el fichero (y sus copias) no encoge sin VACUUM
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write(self.style.SUCCESS('VACUUM completado'))
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from audiovisuals_stock import avisos
+
+
+class Command(BaseCommand):
+    help = (
+        'Envía un aviso agrupado a cada usuario con deudas vencidas y sin avisar, y las marca '
+        'como avisadas. Pensado para ejecutarse a diario (cron); repetirlo solo avisa lo nuevo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', type=date.fromisoformat, help='Día de referencia (AAAA-MM-DD); por defecto, hoy')
+        parser.add_argument('--lote', type=int, default=avisos.LOTE_USUARIOS, help='Usuarios por lote')
+        parser.add_argument('--simular', action='store_true', help='Cuenta los avisos sin enviarlos ni marcarlos')
+
+    def handle(self, *args, **opciones):
+        avisados, deudas, fallidos = avisos.avisar_vencidas(
+            hoy=opciones['fecha'], lote=opciones['lote'], simular=opciones['simular'],
+        )
+        prefijo = '[simulación] ' if opciones['simular'] else ''
+        self.stdout.write(f'{prefijo}{avisados} usuarios avisados por {deudas} deudas vencidas')
+        if fallidos:
+            self.stdout.write(self.style.WARNING(f'{fallidos} envíos fallidos; se reintentarán en la próxima ejecución'))
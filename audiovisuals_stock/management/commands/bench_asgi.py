@@ -0,0 +1,209 @@
+import asyncio
+import io
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from audiovisuals_stock.datos_prueba import sembrar
+from audiovisuals_stock.models import CustomUser
+
+# Modo -> URLconf: bajo WSGI las vistas síncronas, bajo ASGI las de views_async.py
+MODOS = {
+    'wsgi': 'audiovisuals_stock.urls',
+    'asgi': 'audiovisuals_stock.urls_asgi',
+}
+RUTAS = ['list_material_json', 'detalle_material', 'log_material', 'view_profile']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el rendimiento de las páginas de lectura servidas por el manejador WSGI '
+        '(vistas síncronas, un hilo por cliente) y por el ASGI (views_async.py, un bucle de '
+        'eventos) con clientes concurrentes, sobre una base de datos de prueba desechable'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=16, help='Clientes concurrentes')
+        parser.add_argument('--peticiones', type=int, default=50, help='Peticiones por cliente y ruta')
+        parser.add_argument('--rutas', nargs='+', choices=RUTAS, default=RUTAS)
+        parser.add_argument('--modos', nargs='+', choices=list(MODOS), default=list(MODOS))
+        parser.add_argument('--usuarios', type=int, default=200)
+        parser.add_argument('--materiales', type=int, default=5000)
+        parser.add_argument('--logs', type=int, default=50000)
+        parser.add_argument('--deudas', type=int, default=5000)
+        parser.add_argument('--salida', help='Fichero JSON con los resultados')
+
+    def handle(self, *args, **opciones):
+        # Base de datos de prueba desechable (la de trabajo no se toca)
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            resultados = self._medir(opciones)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+        if opciones['salida']:
+            with open(opciones['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(resultados, fichero, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Resultados en {opciones['salida']}")
+
+    def _medir(self, opciones):
+        ids_usuarios, ids_materiales = sembrar(
+            opciones['usuarios'], opciones['materiales'], opciones['logs'], opciones['deudas'], salida=self.stdout,
+        )
+        # Sesión iniciada de un usuario con deudas, compartida por todos los clientes
+        cliente = Client()
+        cliente.force_login(CustomUser.objects.get(id=ids_usuarios[0]))
+        cookie = f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        azar = random.Random(0)
+        resultados = []
+        for ruta in opciones['rutas']:
+            caminos = [self._camino(ruta, azar.choice(ids_materiales)) for _ in range(opciones['peticiones'])]
+            for modo in opciones['modos']:
+                with override_settings(ROOT_URLCONF=MODOS[modo], ALLOWED_HOSTS=['testserver']):
+                    medir = self._medir_wsgi if modo == 'wsgi' else self._medir_asgi
+                    latencias, errores, duracion = medir(caminos, cookie, opciones['clientes'])
+                resultado = _resumen(ruta, modo, latencias, errores, duracion, opciones['clientes'])
+                resultados.append(resultado)
+                self.stdout.write(
+                    f"{ruta:<20} {modo}  {resultado['peticiones_s']:>8.1f} pet/s  p50 {resultado['p50_ms']:>7.1f} ms  "
+                    f"p95 {resultado['p95_ms']:>7.1f} ms  p99 {resultado['p99_ms']:>7.1f} ms  errores {errores}"
+                )
+        if any(resultado['errores'] for resultado in resultados):
+            raise CommandError('Hubo respuestas con error; revisa las rutas')
+        return resultados
+
+    def _camino(self, ruta, material_id):
+        if ruta in ('detalle_material', 'log_material'):
+            return reverse(ruta, kwargs={'material_id': material_id})
+        if ruta == 'list_material_json':
+            # Páginas distintas del catálogo, para no medir solo la caché de fragmentos
+            return reverse(ruta) + f'?start={material_id % 200 * 25}&length=25'
+        return reverse(ruta)
+
+    def _medir_wsgi(self, caminos, cookie, clientes):
+        manejador = WSGIHandler()
+        latencias, errores = [], []
+        cerrojo = threading.Lock()
+
+        def cliente():
+            propias, fallos = [], 0
+            try:
+                for camino in caminos:
+                    inicio = time.perf_counter()
+                    estado = _peticion_wsgi(manejador, camino, cookie)
+                    propias.append(time.perf_counter() - inicio)
+                    fallos += estado != 200
+            finally:
+                connection.close()
+            with cerrojo:
+                latencias.extend(propias)
+                errores.append(fallos)
+
+        hilos = [threading.Thread(target=cliente) for _ in range(clientes)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return latencias, sum(errores), time.perf_counter() - inicio
+
+    def _medir_asgi(self, caminos, cookie, clientes):
+        manejador = ASGIHandler()
+
+        async def cliente():
+            propias, fallos = [], 0
+            for camino in caminos:
+                inicio = time.perf_counter()
+                estado = await _peticion_asgi(manejador, camino, cookie)
+                propias.append(time.perf_counter() - inicio)
+                fallos += estado != 200
+            return propias, fallos
+
+        async def todos():
+            inicio = time.perf_counter()
+            medidas = await asyncio.gather(*[cliente() for _ in range(clientes)])
+            return medidas, time.perf_counter() - inicio
+
+        # Hilo propio: el bucle de eventos no puede compartir hilo con el ORM síncrono del comando
+        with ThreadPoolExecutor(max_workers=1) as ejecutor:
+            medidas, duracion = ejecutor.submit(asyncio.run, todos()).result()
+        return [latencia for propias, _ in medidas for latencia in propias], sum(fallos for _, fallos in medidas), duracion
+
+
+def _peticion_wsgi(manejador, camino, cookie):
+    ruta, _, consulta = camino.partition('?')
+    entorno = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta, 'QUERY_STRING': consulta, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    estado = []
+    respuesta = manejador(entorno, lambda status, cabeceras, exc_info=None: estado.append(status))
+    try:
+        for _ in respuesta:
+            pass
+    finally:
+        respuesta.close()
+    return int(estado[0].split()[0])
+
+
+async def _peticion_asgi(manejador, camino, cookie):
+    ruta, _, consulta = camino.partition('?')
+    ambito = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': ruta, 'raw_path': ruta.encode(), 'query_string': consulta.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    recibido = False
+    estado = []
+
+    async def recibir():
+        nonlocal recibido
+        if recibido:
+            # El cliente no se desconecta: se espera hasta que el manejador termine
+            await asyncio.Future()
+        recibido = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def enviar(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            estado.append(mensaje['status'])
+
+    await manejador(ambito, recibir, enviar)
+    return estado[0]
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(int(len(ordenadas) * p / 100), len(ordenadas) - 1)] * 1000 if ordenadas else 0.0
+
+
+def _resumen(ruta, modo, latencias, errores, duracion, clientes):
+    ordenadas = sorted(latencias)
+    return {
+        'ruta': ruta,
+        'modo': modo,
+        'clientes': clientes,
+        'peticiones': len(ordenadas),
+        'errores': errores,
+        'duracion_s': round(duracion, 3),
+        'peticiones_s': round(len(ordenadas) / duracion, 1) if duracion else 0.0,
+        'p50_ms': round(_percentil(ordenadas, 50), 2),
+        'p95_ms': round(_percentil(ordenadas, 95), 2),
+        'p99_ms': round(_percentil(ordenadas, 99), 2),
+    }
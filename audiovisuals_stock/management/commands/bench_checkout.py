@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Count, Sum
+
+from audiovisuals_stock import movimientos, registro, services
+from audiovisuals_stock.datos_prueba import crear_usuarios
+from audiovisuals_stock.models import DeudaMaterial, Material, MaterialLog, Proveedor, TipoMaterial
+
+
+class Command(BaseCommand):
+    help = 'Lanza extracciones concurrentes sobre un material y comprueba que el stock se conserva'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--iteraciones', type=int, default=50, help='Extracciones por worker')
+        parser.add_argument('--usuarios', type=int, default=4)
+        parser.add_argument('--stock', type=int, default=500)
+        parser.add_argument('--cantidad', type=int, default=1, help='Unidades por extracción')
+        parser.add_argument(
+            '--conservar', action='store_true',
+            help='No borrar la base de datos de prueba (p. ej. para pasarle conciliar_stock con DATABASE_URL)',
+        )
+
+    def handle(self, *args, **opciones):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Este benchmark mide la contención de escritura en SQLite')
+        if opciones['cantidad'] < 1:
+            raise CommandError('--cantidad debe ser mayor que cero')
+
+        # Base de datos de prueba en un fichero (cada hilo abre su conexión); la de trabajo no se toca
+        directorio = tempfile.mkdtemp(prefix='bench_checkout_')
+        ruta = os.path.join(directorio, 'bench.sqlite3')
+        connection.settings_dict['TEST']['NAME'] = ruta
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            errores = self._medir(opciones)
+        finally:
+            connections.close_all()
+            if opciones['conservar']:
+                connection.settings_dict['NAME'] = nombre_original
+                self.stdout.write(f'Base de datos de prueba conservada: DATABASE_URL=sqlite:///{ruta}')
+            else:
+                connection.creation.destroy_test_db(nombre_original, verbosity=0)
+                shutil.rmtree(directorio, ignore_errors=True)
+
+        if errores:
+            raise CommandError('; '.join(errores))
+        self.stdout.write(self.style.SUCCESS('Stock conservado'))
+
+    def _medir(self, opciones):
+        usuarios = crear_usuarios(opciones['usuarios'], prefijo='bench-checkout')
+        # Como un alta desde el formulario: las unidades iniciales quedan en el libro como compra
+        material = services.crear_material(Material(
+            referencia='BENCH', nombre='Bench checkout', cantidad=opciones['stock'],
+            tipo=TipoMaterial.objects.create(nombre='bench'), creadopor=usuarios[0], fecha_compra=date.today(),
+            proveedor=Proveedor.objects.create(nombre='bench'), numero_serie='BENCH',
+        ), usuarios[0])
+
+        resultados = {'ok': 0, 'sin_stock': 0, 'bloqueos': 0, 'latencias': [], 'fallos': []}
+        cerrojo = threading.Lock()
+
+        def worker(indice):
+            usuario = usuarios[indice % len(usuarios)]
+            ok = sin_stock = bloqueos = 0
+            latencias = []
+            fallo = None
+            try:
+                for _ in range(opciones['iteraciones']):
+                    inicio = time.perf_counter()
+                    while True:
+                        try:
+                            services.extraer_material(material.id, usuario, opciones['cantidad'])
+                            ok += 1
+                        except services.StockInsuficiente:
+                            sin_stock += 1
+                        except OperationalError:
+                            # SQLite sin WAL: "database is locked"; se reintenta
+                            bloqueos += 1
+                            continue
+                        break
+                    latencias.append(time.perf_counter() - inicio)
+            except Exception as e:
+                fallo = f'worker {indice}: {type(e).__name__}: {e}'  # Se informa al final, no se pierde con el hilo
+            finally:
+                connection.close()
+            with cerrojo:
+                if fallo:
+                    resultados['fallos'].append(fallo)
+                resultados['ok'] += ok
+                resultados['sin_stock'] += sin_stock
+                resultados['bloqueos'] += bloqueos
+                resultados['latencias'].extend(latencias)
+
+        hilos = [threading.Thread(target=worker, args=(i,)) for i in range(opciones['workers'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        registro.vaciar()  # Con REGISTRO_DIFERIDO los logs pueden seguir en el spool
+        material.refresh_from_db()
+        extraido = MaterialLog.objects.filter(material=material).aggregate(total=Sum('cantidad_extraida'))['total'] or 0
+        adeudado = DeudaMaterial.objects.filter(material=material, devuelta=False).aggregate(total=Sum('cantidad_adeudada'))['total'] or 0
+        duplicadas = (
+            DeudaMaterial.objects.filter(material=material, devuelta=False)
+            .values('usuario').annotate(total=Count('id')).filter(total__gt=1).count()
+        )
+
+        latencias = sorted(resultados['latencias'])
+        total = len(latencias)
+        self.stdout.write(f"{total} extracciones en {duracion:.2f}s ({total / duracion:.0f}/s) con {opciones['workers']} workers")
+        self.stdout.write(f"  correctas: {resultados['ok']}  sin stock: {resultados['sin_stock']}  reintentos por bloqueo: {resultados['bloqueos']}")
+        if total:
+            self.stdout.write(
+                f"  latencia p50 {latencias[total // 2] * 1000:.1f} ms  p95 {latencias[int(total * 0.95)] * 1000:.1f} ms  "
+                f"p99 {latencias[min(int(total * 0.99), total - 1)] * 1000:.1f} ms"
+            )
+        self.stdout.write(f"  stock final {material.cantidad} + extraído {extraido} = {material.cantidad + extraido} (inicial {opciones['stock']})")
+
+        errores = list(resultados['fallos'])
+        if total != opciones['workers'] * opciones['iteraciones']:
+            errores.append(f"{total} extracciones de {opciones['workers'] * opciones['iteraciones']} previstas")
+        if material.cantidad + extraido != opciones['stock']:
+            errores.append('el stock no se conserva')
+        if extraido != resultados['ok'] * opciones['cantidad']:
+            errores.append('el log no coincide con las extracciones correctas')
+        if adeudado != extraido:
+            errores.append('las deudas abiertas no suman lo extraído')
+        if duplicadas:
+            errores.append(f'{duplicadas} usuarios con deudas abiertas duplicadas')
+        if list(movimientos.descuadres()):
+            errores.append('el stock no cuadra con el libro de movimientos')
+        return errores
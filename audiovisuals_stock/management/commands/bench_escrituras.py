@@ -0,0 +1,158 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from audiovisuals_stock import services
+from audiovisuals_stock.datos_prueba import sembrar
+from audiovisuals_stock.models import CustomUser, Material
+
+# (nombre, PRAGMAs, timeout de SQLite en segundos, CONN_MAX_AGE); cada una añade un ajuste a la anterior
+VARIANTES = [
+    ('delete, sin espera', {'journal_mode': 'delete', 'synchronous': 'full'}, 0, 0),
+    ('delete + busy_timeout', {'journal_mode': 'delete', 'synchronous': 'full'}, 20, 0),
+    ('wal + busy_timeout', {'journal_mode': 'wal', 'synchronous': 'full'}, 20, 0),
+    ('wal + synchronous=normal', {'journal_mode': 'wal', 'synchronous': 'normal'}, 20, 0),
+    ('wal + normal + CONN_MAX_AGE', {'journal_mode': 'wal', 'synchronous': 'normal'}, 20, 60),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la contención de escritura en SQLite con cada ajuste de settings.DATABASES '
+        '(modo de journal, synchronous, espera ante bloqueos, conexiones persistentes): '
+        'extracciones concurrentes sobre pocos materiales y lecturas del catálogo a la vez'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=8)
+        parser.add_argument('--lectores', type=int, default=4)
+        parser.add_argument('--operaciones', type=int, default=100, help='Extracciones por escritor')
+        parser.add_argument('--materiales', type=int, default=10, help='Materiales sobre los que se compite')
+        parser.add_argument('--salida', help='Fichero JSON con los resultados')
+
+    def handle(self, *args, **opciones):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Este benchmark compara ajustes de SQLite')
+
+        # Base de datos de prueba en un fichero (WAL no existe en memoria); la de trabajo no se toca
+        directorio = tempfile.mkdtemp(prefix='bench_escrituras_')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directorio, 'bench.sqlite3')
+        opciones_originales = dict(connection.settings_dict['OPTIONS'])
+        edad_original = connection.settings_dict['CONN_MAX_AGE']
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            sembrar(opciones['escritores'], opciones['materiales'], 0, 0)
+            Material.objects.update(cantidad=10 ** 9)  # Nunca se agota: solo se mide la contención
+            resultados = [self._variante(opciones, *variante) for variante in VARIANTES]
+        finally:
+            connections.close_all()
+            connection.settings_dict['OPTIONS'] = opciones_originales
+            connection.settings_dict['CONN_MAX_AGE'] = edad_original
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            shutil.rmtree(directorio, ignore_errors=True)
+
+        if opciones['salida']:
+            with open(opciones['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(resultados, fichero, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Resultados en {opciones['salida']}")
+
+    def _variante(self, opciones, nombre, pragmas, espera, edad):
+        connections.close_all()
+        connection.settings_dict['OPTIONS'] = {**connection.settings_dict['OPTIONS'], 'timeout': espera}
+        connection.settings_dict['CONN_MAX_AGE'] = edad
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            # La primera conexión, sin otras abiertas, fija el modo de journal del fichero
+            connection.ensure_connection()
+            usuarios = list(CustomUser.objects.all())
+            ids_materiales = list(Material.objects.values_list('id', flat=True))
+            connection.close()
+            resultado = self._medir(opciones, usuarios, ids_materiales)
+        connections.close_all()
+
+        resultado = {'variante': nombre, **pragmas, 'timeout': espera, 'conn_max_age': edad, **resultado}
+        self.stdout.write(
+            f"{nombre:<30} {resultado['escrituras_s']:>7.1f} escr/s  bloqueos {resultado['bloqueos']:>4}  "
+            f"p50 {resultado['p50_ms']:>6.1f} ms  p99 {resultado['p99_ms']:>7.1f} ms  "
+            f"{resultado['lecturas_s']:>7.1f} lect/s  lecturas fallidas {resultado['lecturas_fallidas']}"
+        )
+        return resultado
+
+    def _medir(self, opciones, usuarios, ids_materiales):
+        latencias, bloqueos, lecturas, lecturas_fallidas = [], [], [], []
+        cerrojo = threading.Lock()
+        terminado = threading.Event()
+
+        def fin_de_peticion():
+            # Lo que hace Django al terminar cada petición: con CONN_MAX_AGE=0 cierra la conexión
+            connection.close_if_unusable_or_obsolete()
+
+        def escritor(indice):
+            azar = random.Random(indice)
+            propias, fallos = [], 0
+            try:
+                for _ in range(opciones['operaciones']):
+                    inicio = time.perf_counter()
+                    try:
+                        services.extraer_material(azar.choice(ids_materiales), usuarios[indice % len(usuarios)], 1)
+                        propias.append(time.perf_counter() - inicio)
+                    except OperationalError:
+                        fallos += 1  # "database is locked": sin reintento, como en una petición real
+                    fin_de_peticion()
+            finally:
+                connection.close()
+            with cerrojo:
+                latencias.extend(propias)
+                bloqueos.append(fallos)
+
+        def lector():
+            hechas = fallos = 0
+            try:
+                while not terminado.is_set():
+                    try:
+                        list(Material.objects.order_by('nombre', 'id')[:25])
+                        hechas += 1
+                    except OperationalError:
+                        fallos += 1
+                    fin_de_peticion()
+            finally:
+                connection.close()
+            with cerrojo:
+                lecturas.append(hechas)
+                lecturas_fallidas.append(fallos)
+
+        escritores = [threading.Thread(target=escritor, args=(i,)) for i in range(opciones['escritores'])]
+        lectores = [threading.Thread(target=lector) for _ in range(opciones['lectores'])]
+        inicio = time.perf_counter()
+        for hilo in escritores + lectores:
+            hilo.start()
+        for hilo in escritores:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        terminado.set()
+        for hilo in lectores:
+            hilo.join()
+
+        ordenadas = sorted(latencias)
+        return {
+            'escrituras': len(ordenadas),
+            'bloqueos': sum(bloqueos),
+            'duracion_s': round(duracion, 3),
+            'escrituras_s': round(len(ordenadas) / duracion, 1),
+            'p50_ms': round(_percentil(ordenadas, 50), 2),
+            'p95_ms': round(_percentil(ordenadas, 95), 2),
+            'p99_ms': round(_percentil(ordenadas, 99), 2),
+            'lecturas_s': round(sum(lecturas) / duracion, 1),
+            'lecturas_fallidas': sum(lecturas_fallidas),
+        }
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(int(len(ordenadas) * p / 100), len(ordenadas) - 1)] * 1000 if ordenadas else 0.0
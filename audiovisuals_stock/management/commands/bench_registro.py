@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from audiovisuals_stock import registro, services
+from audiovisuals_stock.datos_prueba import sembrar
+from audiovisuals_stock.models import CustomUser, Material, MaterialLog
+
+# (nombre, REGISTRO_DIFERIDO)
+VARIANTES = [
+    ('directo', False),
+    ('diferido (spool)', True),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia de las extracciones concurrentes con el log insertado en la '
+        'transacción y con el registro diferido de registro.py (spool y bulk_create en '
+        'un hilo de fondo), y comprueba que no se pierde ningún log'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--operaciones', type=int, default=200, help='Extracciones por worker')
+        parser.add_argument('--materiales', type=int, default=10, help='Materiales sobre los que se compite')
+        parser.add_argument('--sin-fsync', action='store_true', help='Sin fsync tras cada apunte en el spool (REGISTRO_FSYNC=0)')
+        parser.add_argument('--salida', help='Fichero JSON con los resultados')
+
+    def handle(self, *args, **opciones):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Este benchmark mide la contención de escritura en SQLite')
+
+        # Base de datos de prueba en un fichero (el hilo de fondo necesita su propia conexión)
+        directorio = tempfile.mkdtemp(prefix='bench_registro_')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directorio, 'bench.sqlite3')
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            sembrar(opciones['workers'], opciones['materiales'], 0, 0)
+            Material.objects.update(cantidad=10 ** 9)  # Nunca se agota: solo se mide la extracción
+            usuarios = list(CustomUser.objects.all())
+            ids_materiales = list(Material.objects.values_list('id', flat=True))
+            connection.close()
+            ajustes = {'REGISTRO_SPOOL': os.path.join(directorio, 'spool'), 'REGISTRO_FSYNC': not opciones['sin_fsync']}
+            resultados = []
+            for nombre, diferido in VARIANTES:
+                with override_settings(REGISTRO_DIFERIDO=diferido, **ajustes):
+                    resultados.append(self._variante(opciones, nombre, usuarios, ids_materiales))
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            shutil.rmtree(directorio, ignore_errors=True)
+
+        if opciones['salida']:
+            with open(opciones['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(resultados, fichero, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Resultados en {opciones['salida']}")
+
+        errores = [f"{resultado['variante']}: {resultado['logs']} logs de {resultado['extracciones']} extracciones"
+                   for resultado in resultados if resultado['logs'] != resultado['extracciones']]
+        if errores:
+            raise CommandError('; '.join(errores))
+        directo, diferido = resultados
+        if directo['p50_ms']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Ningún log perdido; p50 {directo['p50_ms']:.2f} ms directo, {diferido['p50_ms']:.2f} ms diferido "
+                f"({100 * (diferido['p50_ms'] / directo['p50_ms'] - 1):+.0f}%)"
+            ))
+
+    def _variante(self, opciones, nombre, usuarios, ids_materiales):
+        logs_antes = MaterialLog.objects.count()
+        latencias, bloqueos = [], []
+        cerrojo = threading.Lock()
+
+        def worker(indice):
+            propias, reintentos = [], 0
+            try:
+                for operacion in range(opciones['operaciones']):
+                    material_id = ids_materiales[(indice + operacion) % len(ids_materiales)]
+                    inicio = time.perf_counter()
+                    while True:
+                        try:
+                            services.extraer_material(material_id, usuarios[indice % len(usuarios)], 1)
+                        except OperationalError:
+                            reintentos += 1  # "database is locked"; se reintenta
+                            continue
+                        break
+                    propias.append(time.perf_counter() - inicio)
+            finally:
+                connection.close()
+            with cerrojo:
+                latencias.extend(propias)
+                bloqueos.append(reintentos)
+
+        hilos = [threading.Thread(target=worker, args=(i,)) for i in range(opciones['workers'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        # Lo que aún esté en el spool; en producción lo inserta el hilo de fondo
+        inicio_vaciado = time.perf_counter()
+        registro.vaciar()
+        vaciado = time.perf_counter() - inicio_vaciado
+
+        ordenadas = sorted(latencias)
+        resultado = {
+            'variante': nombre,
+            'extracciones': len(ordenadas),
+            'logs': MaterialLog.objects.count() - logs_antes,
+            'reintentos': sum(bloqueos),
+            'duracion_s': round(duracion, 3),
+            'extracciones_s': round(len(ordenadas) / duracion, 1),
+            'p50_ms': round(_percentil(ordenadas, 50), 2),
+            'p95_ms': round(_percentil(ordenadas, 95), 2),
+            'p99_ms': round(_percentil(ordenadas, 99), 2),
+            'vaciado_final_ms': round(vaciado * 1000, 1),
+        }
+        self.stdout.write(
+            f"{nombre:<18} {resultado['extracciones_s']:>7.1f} extr/s  reintentos {resultado['reintentos']:>4}  "
+            f"p50 {resultado['p50_ms']:>6.2f} ms  p95 {resultado['p95_ms']:>6.2f} ms  p99 {resultado['p99_ms']:>7.2f} ms  "
+            f"vaciado final {resultado['vaciado_final_ms']:>6.1f} ms"
+        )
+        return resultado
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(int(len(ordenadas) * p / 100), len(ordenadas) - 1)] * 1000 if ordenadas else 0.0
@@ -0,0 +1,368 @@
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.middleware.csrf import _get_new_csrf_string
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+
+from audiovisuals_stock import uso
+from audiovisuals_stock.datos_prueba import sembrar
+from audiovisuals_stock.models import CustomUser, DeudaMaterial, KitMaterial, KitMaterialItem, Material
+
+# (usuarios, materiales, logs, deudas)
+ESCALAS = {
+    'pequena': (100, 2000, 10000, 5000),
+    'media': (1000, 20000, 200000, 50000),
+    'grande': (5000, 100000, 2000000, 1000000),
+}
+
+# Rutas con nombre que no se miden: cerrarían la sesión compartida o no son de la aplicación
+EXCLUIDAS = {'logout'}
+
+# Materiales con stock de sobra para las rutas que extraen
+MATERIALES_CALIENTES = 200
+
+_SERVER_TIMING = re.compile(r'sql;dur=([\d.]+);desc="(\d+) consultas"')
+
+
+class _Silencioso(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra una base de datos de prueba con bulk_create y mide cada ruta con nombre de '
+        'urls.py con clientes HTTP concurrentes contra un servidor local: peticiones/s, '
+        'p50/p95/p99 y consultas por petición. Guarda los resultados en JSON y los compara con '
+        'una ejecución anterior'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', choices=list(ESCALAS), default='media')
+        parser.add_argument('--usuarios', type=int)
+        parser.add_argument('--materiales', type=int)
+        parser.add_argument('--logs', type=int)
+        parser.add_argument('--deudas', type=int)
+        parser.add_argument('--clientes', type=int, default=8, help='Clientes concurrentes por ruta')
+        parser.add_argument('--peticiones', type=int, default=25, help='Peticiones por cliente y ruta')
+        parser.add_argument('--rutas', nargs='+', help='Solo estas rutas (por nombre)')
+        parser.add_argument('--base', help='Fichero SQLite sembrado que se conserva y se reutiliza entre ejecuciones')
+        parser.add_argument('--url', help='Servidor ya arrancado (p. ej. http://127.0.0.1:8000) con la base de datos actual')
+        parser.add_argument('--salida', help='Fichero JSON con los resultados')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior: falla si alguna ruta empeora')
+        parser.add_argument('--umbral', type=float, default=0.25, help='Empeoramiento de p95 tolerado (0.25 = 25 %%)')
+
+    def handle(self, *args, **opciones):
+        escala = dict(zip(('usuarios', 'materiales', 'logs', 'deudas'), ESCALAS[opciones['escala']]))
+        escala.update({clave: opciones[clave] for clave in escala if opciones[clave] is not None})
+
+        if opciones['url']:
+            # Servidor externo (gunicorn, uvicorn...) sobre la base de datos configurada
+            resultados = self._ejecutar(opciones, escala, opciones['url'])
+        else:
+            resultados = self._con_servidor_local(opciones, escala)
+
+        if opciones['salida']:
+            with open(opciones['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(resultados, fichero, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Resultados en {opciones['salida']}")
+        if opciones['comparar']:
+            self._comparar(resultados, opciones['comparar'], opciones['umbral'])
+
+    # ---------------- Base de datos y servidor ---------------- #
+    def _con_servidor_local(self, opciones, escala):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Sin --url, el servidor local usa una base de datos SQLite de prueba')
+        directorio = None
+        if opciones['base']:
+            connection.settings_dict['TEST']['NAME'] = os.path.abspath(opciones['base'])
+        else:
+            # Fichero y no memoria: los hilos del servidor abren sus propias conexiones
+            directorio = tempfile.mkdtemp(prefix='bench_rutas_')
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directorio, 'bench.sqlite3')
+        nombre_original = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=bool(opciones['base']),
+        )
+        servidor = None
+        try:
+            # Con INSTRUMENTACION el servidor devuelve las consultas de cada petición en Server-Timing
+            with override_settings(INSTRUMENTACION=True, ALLOWED_HOSTS=['127.0.0.1']):
+                logging.getLogger('audiovisuals_stock.instrumentacion').setLevel(logging.WARNING)
+                logging.getLogger('django.request').setLevel(logging.ERROR)  # Los 409 previstos no se registran
+                servidor = ThreadedWSGIServer(('127.0.0.1', 0), _Silencioso)
+                servidor.set_app(WSGIHandler())
+                threading.Thread(target=servidor.serve_forever, daemon=True).start()
+                return self._ejecutar(opciones, escala, f'http://127.0.0.1:{servidor.server_port}')
+        finally:
+            if servidor:
+                servidor.shutdown()
+                servidor.server_close()
+            connections.close_all()
+            if directorio:
+                connection.creation.destroy_test_db(nombre_original, verbosity=0)
+                shutil.rmtree(directorio, ignore_errors=True)
+            else:
+                connection.settings_dict['NAME'] = nombre_original
+                settings.DATABASES[connection.alias]['NAME'] = nombre_original
+
+    def _sembrar(self, escala):
+        if Material.objects.filter(referencia__startswith='BR').count() >= escala['materiales']:
+            self.stdout.write('Datos ya sembrados: se reutilizan')
+        else:
+            inicio = time.perf_counter()
+            with transaction.atomic():
+                sembrar(escala['usuarios'], escala['materiales'], escala['logs'], escala['deudas'], salida=self.stdout)
+            uso.agregar(corte=timezone.now())  # Los informes de uso leen los agregados de los préstamos sembrados
+            self.stdout.write(f'Sembrado en {time.perf_counter() - inicio:.1f}s')
+
+        calientes = list(Material.objects.filter(referencia__startswith='BR').order_by('id').values_list('id', flat=True)[:MATERIALES_CALIENTES])
+        Material.objects.filter(id__in=calientes, cantidad__lt=10 ** 6).update(cantidad=F('cantidad') + 10 ** 9)
+        kit, _ = KitMaterial.objects.get_or_create(nombre='Kit bench', defaults={'creadopor_id': CustomUser.objects.values_list('id', flat=True).first()})
+        for material_id in calientes[:3]:
+            KitMaterialItem.objects.get_or_create(kit=kit, material_id=material_id, defaults={'cantidad': 1})
+        return calientes, kit.id
+
+    def _sesiones(self, clientes):
+        # Un usuario de personal por cliente (las rutas de staff también se miden)
+        usuarios = list(CustomUser.objects.filter(email__startswith='bench-').order_by('id')[:clientes])
+        if not usuarios:
+            raise CommandError('No hay usuarios de benchmark (bench-*) en la base de datos')
+        CustomUser.objects.filter(id__in=[usuario.id for usuario in usuarios]).update(is_staff=True)
+        sesiones = []
+        for usuario in usuarios:
+            cliente = Client()
+            cliente.force_login(usuario)
+            csrf = _get_new_csrf_string()
+            sesiones.append({
+                'usuario_id': usuario.id,
+                'cookie': f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}; "
+                          f"{settings.CSRF_COOKIE_NAME}={csrf}",
+                'csrf': csrf,
+            })
+        return sesiones
+
+    # ---------------- Escenarios por ruta ---------------- #
+    def _escenarios(self, calientes, kit_id):
+        """nombre de ruta -> función (azar, sesión) -> (método, camino, cuerpo, tipo de contenido)."""
+        materiales = list(Material.objects.values_list('id', 'numero_serie').order_by('?')[:2000])
+        hoy = timezone.localdate()
+        inicio_mes = hoy.replace(day=1)
+
+        def get(nombre, **kwargs):
+            return lambda azar, sesion: ('GET', reverse(nombre, kwargs=kwargs or None), None, None)
+
+        def material(nombre, consulta=''):
+            return lambda azar, sesion: ('GET', reverse(nombre, kwargs={'material_id': azar.choice(materiales)[0]}) + consulta, None, None)
+
+        def formulario(camino, datos):
+            return ('POST', camino, urlencode(datos), 'application/x-www-form-urlencoded')
+
+        def lote(nombre):
+            def escenario(azar, sesion):
+                # Cada cliente devuelve lo que extrajo en extraer_lote (cada sesión es de un solo hilo)
+                prestados = sesion.setdefault('prestados', [])
+                if nombre == 'devolver_lote' and prestados:
+                    material_id = prestados.pop()
+                else:
+                    material_id = azar.choice(calientes)
+                    prestados.append(material_id)
+                cuerpo = json.dumps({'items': [{'material_id': material_id, 'cantidad': 1}]})
+                return 'POST', reverse(nombre), cuerpo, 'application/json'
+            return escenario
+
+        def saldar(azar, sesion):
+            deuda_id = DeudaMaterial.objects.filter(usuario_id=sesion['usuario_id']).values_list('id', flat=True).first()
+            return formulario(reverse('saldar_deuda', kwargs={'deuda_id': deuda_id or 1}), {})
+
+        return {
+            'home': get('home'),
+            'signup': get('signup'),
+            'login': get('login'),
+            'view_profile': get('view_profile'),
+            'edit_profile': get('edit_profile'),
+            'crear_material': get('crear_material'),
+            'list_material': get('list_material'),
+            'list_material_json': lambda azar, sesion: (
+                'GET', reverse('list_material_json') + '?' + urlencode({
+                    'draw': 1, 'start': azar.randrange(0, 2000) * 25, 'length': 25,
+                    'order[0][column]': azar.choice([0, 1, 2, 4, 6]), 'order[0][dir]': azar.choice(['asc', 'desc']),
+                }), None, None,
+            ),
+            'buscar_materiales': lambda azar, sesion: (
+                'GET', reverse('buscar_materiales') + '?' + urlencode({'q': f'bench {azar.randrange(1000)}'}), None, None,
+            ),
+            'detalle_material': material('detalle_material'),
+            'editar_material': material('editar_material'),
+            'extraer_material': lambda azar, sesion: formulario(
+                reverse('extraer_material', kwargs={'material_id': azar.choice(calientes)}), {'cantidad_extraida': 1},
+            ),
+            'log_material': material('log_material'),
+            'log_material_json': material('log_material_json'),
+            'extraer_lote': lote('extraer_lote'),
+            'devolver_lote': lote('devolver_lote'),
+            'kiosco': get('kiosco'),
+            'kiosco_escanear': lambda azar, sesion: formulario(
+                reverse('kiosco_escanear'), {'codigo': f'BSN{azar.randrange(len(calientes)):08d}', 'accion': 'auto'},
+            ),
+            'lista_kits': get('lista_kits'),
+            'extraer_kit': lambda azar, sesion: formulario(reverse('extraer_kit', kwargs={'kit_id': kit_id}), {}),
+            'exportar': lambda azar, sesion: (
+                'GET', reverse('exportar', kwargs={'conjunto': 'logs'}) + '?' + urlencode({'desde': (hoy - timedelta(days=7)).isoformat()}), None, None,
+            ),
+            'agregar_tipo_material': get('agregar_tipo_material'),
+            'agregar_proveedor': get('agregar_proveedor'),
+            'saldar_deuda': saldar,
+            'calendar': get('calendar'),
+            'calendario_eventos': lambda azar, sesion: (
+                'GET', reverse('calendario_eventos') + '?' + urlencode({
+                    'start': inicio_mes.isoformat(), 'end': (inicio_mes + timedelta(days=42)).isoformat(),
+                }), None, None,
+            ),
+            'instrumentacion': get('instrumentacion'),
+            'informe_uso': get('informe_uso'),
+            'informe_uso_json': lambda azar, sesion: (
+                'GET', reverse('informe_uso_json') + '?' + urlencode({
+                    'agrupacion': azar.choice(['material', 'tipo']), 'periodo': azar.choice(['dia', 'semana', 'mes']),
+                }), None, None,
+            ),
+        }
+
+    # ---------------- Medición ---------------- #
+    def _ejecutar(self, opciones, escala, url):
+        calientes, kit_id = self._sembrar(escala)
+        sesiones = self._sesiones(opciones['clientes'])
+        escenarios = self._escenarios(calientes, kit_id)
+
+        nombres = [patron.name for patron in get_resolver().url_patterns if isinstance(patron, URLPattern) and patron.name]
+        sin_escenario = [nombre for nombre in nombres if nombre not in escenarios and nombre not in EXCLUIDAS]
+        if sin_escenario:
+            self.stdout.write(self.style.WARNING(f"Rutas sin escenario (no se miden): {', '.join(sin_escenario)}"))
+        rutas = [nombre for nombre in nombres if nombre in escenarios and (not opciones['rutas'] or nombre in opciones['rutas'])]
+        connections.close_all()
+
+        destino = urlsplit(url)
+        resultados = {
+            'fecha': timezone.now().isoformat(),
+            'url': url,
+            'escala': escala,
+            'clientes': len(sesiones),
+            'peticiones_por_cliente': opciones['peticiones'],
+            'rutas': [],
+        }
+        for ruta in rutas:
+            resultado = self._medir_ruta(ruta, escenarios[ruta], sesiones, destino, opciones['peticiones'])
+            resultados['rutas'].append(resultado)
+            consultas = '-' if resultado['consultas_media'] is None else f"{resultado['consultas_media']:.1f}"
+            self.stdout.write(
+                f"{ruta:<24} {resultado['peticiones_s']:>8.1f} pet/s  p50 {resultado['p50_ms']:>7.1f}  "
+                f"p95 {resultado['p95_ms']:>7.1f}  p99 {resultado['p99_ms']:>7.1f} ms  consultas {consultas:>5}  "
+                f"errores {resultado['errores']}"
+            )
+        return resultados
+
+    def _medir_ruta(self, ruta, escenario, sesiones, destino, peticiones):
+        latencias, consultas, sql_ms, estados = [], [], [], {}
+        cerrojo = threading.Lock()
+
+        def cliente(indice, sesion):
+            azar = random.Random(f'{ruta}-{indice}')
+            conexion = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=60)
+            propias, propias_consultas, propias_sql, propios_estados = [], [], [], {}
+            try:
+                for _ in range(peticiones):
+                    metodo, camino, cuerpo, tipo = escenario(azar, sesion)
+                    cabeceras = {'Cookie': sesion['cookie'], 'X-CSRFToken': sesion['csrf']}
+                    if tipo:
+                        cabeceras['Content-Type'] = tipo
+                    inicio = time.perf_counter()
+                    conexion.request(metodo, camino, body=cuerpo, headers=cabeceras)
+                    respuesta = conexion.getresponse()
+                    respuesta.read()
+                    propias.append(time.perf_counter() - inicio)
+                    propios_estados[respuesta.status] = propios_estados.get(respuesta.status, 0) + 1
+                    medida = _SERVER_TIMING.search(respuesta.getheader('Server-Timing', ''))
+                    if medida:
+                        propias_sql.append(float(medida.group(1)))
+                        propias_consultas.append(int(medida.group(2)))
+            finally:
+                conexion.close()
+                connection.close()
+            with cerrojo:
+                latencias.extend(propias)
+                consultas.extend(propias_consultas)
+                sql_ms.extend(propias_sql)
+                for estado, veces in propios_estados.items():
+                    estados[estado] = estados.get(estado, 0) + veces
+
+        hilos = [threading.Thread(target=cliente, args=(i, sesion)) for i, sesion in enumerate(sesiones)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        ordenadas = sorted(latencias)
+        return {
+            'ruta': ruta,
+            'peticiones': len(ordenadas),
+            # 409 es una respuesta prevista de los lotes y el kiosco (sin stock o sin deuda)
+            'errores': sum(veces for estado, veces in estados.items() if estado >= 400 and estado != 409),
+            'estados': {str(estado): veces for estado, veces in sorted(estados.items())},
+            'duracion_s': round(duracion, 3),
+            'peticiones_s': round(len(ordenadas) / duracion, 1) if duracion else 0.0,
+            'p50_ms': round(_percentil(ordenadas, 50), 2),
+            'p95_ms': round(_percentil(ordenadas, 95), 2),
+            'p99_ms': round(_percentil(ordenadas, 99), 2),
+            'consultas_media': round(sum(consultas) / len(consultas), 2) if consultas else None,
+            'consultas_max': max(consultas) if consultas else None,
+            'sql_ms_media': round(sum(sql_ms) / len(sql_ms), 2) if sql_ms else None,
+        }
+
+    # ---------------- Comparación ---------------- #
+    def _comparar(self, resultados, fichero, umbral):
+        with open(fichero, encoding='utf-8') as entrada:
+            anteriores = {resultado['ruta']: resultado for resultado in json.load(entrada)['rutas']}
+        regresiones = []
+        for resultado in resultados['rutas']:
+            anterior = anteriores.get(resultado['ruta'])
+            if anterior is None:
+                continue
+            motivos = []
+            if anterior['p95_ms'] and resultado['p95_ms'] > anterior['p95_ms'] * (1 + umbral):
+                motivos.append(f"p95 {anterior['p95_ms']} -> {resultado['p95_ms']} ms")
+            # Una consulta más por petición de media (no el máximo, que varía con los datos)
+            if None not in (anterior['consultas_media'], resultado['consultas_media']) and \
+                    resultado['consultas_media'] >= anterior['consultas_media'] + 1:
+                motivos.append(f"consultas {anterior['consultas_media']} -> {resultado['consultas_media']}")
+            if resultado['errores'] > anterior['errores']:
+                motivos.append(f"errores {anterior['errores']} -> {resultado['errores']}")
+            if motivos:
+                regresiones.append(resultado['ruta'])
+                self.stdout.write(self.style.ERROR(f"REGRESIÓN {resultado['ruta']}: {'; '.join(motivos)}"))
+        if regresiones:
+            raise CommandError(f"{len(regresiones)} rutas empeoran respecto a {fichero}")
+        self.stdout.write(self.style.SUCCESS(f'Sin regresiones respecto a {fichero}'))
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(int(len(ordenadas) * p / 100), len(ordenadas) - 1)] * 1000 if ordenadas else 0.0
@@ -0,0 +1,33 @@
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from audiovisuals_stock import estaticos
+
+
+class Command(BaseCommand):
+    help = (
+        'Construye los paquetes CSS/JS (SCSS compilado, concatenado y minimizado) y ejecuta '
+        'collectstatic: nombres con hash y variantes .gz/.br en STATIC_ROOT'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sin-collectstatic', action='store_true', help='Solo escribe los paquetes')
+
+    def handle(self, *args, **opciones):
+        if not estaticos.sass:
+            self.stdout.write(self.style.WARNING('libsass no está instalado: se usa el CSS ya compilado'))
+        if not estaticos.rjsmin:
+            self.stdout.write(self.style.WARNING('rjsmin no está instalado: los JS no se minimizan'))
+
+        salida = estaticos.directorio_salida()
+        os.makedirs(salida, exist_ok=True)
+        for nombre, ficheros in estaticos.PAQUETES.items():
+            contenido = estaticos.construir(nombre).encode('utf-8')
+            with open(os.path.join(salida, nombre), 'wb') as fichero:
+                fichero.write(contenido)
+            self.stdout.write(f'{nombre}: {len(ficheros)} ficheros, {len(contenido) / 1024:.0f} KB')
+
+        if not opciones['sin_collectstatic']:
+            call_command('collectstatic', interactive=False, verbosity=opciones['verbosity'])
@@ -0,0 +1,133 @@
+import re
+from datetime import date, datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from audiovisuals_stock import views
+from audiovisuals_stock.avisos import deudas_pendientes, usuarios_pendientes
+from audiovisuals_stock.calendario import consultas_por_dia
+from audiovisuals_stock.kiosco import consultas_codigo
+from audiovisuals_stock.movimientos import anotar_stock
+from audiovisuals_stock.datos_prueba import sembrar
+from audiovisuals_stock.models import Material, ResumenDeuda, UsoDiarioMaterial
+from audiovisuals_stock.pagination import codificar_cursor, consulta_pagina
+from audiovisuals_stock.services import consulta_deuda_abierta, consulta_proximo_vencimiento
+from audiovisuals_stock.uso import agregar as agregar_uso, consulta_prestado_final, consultas_informe
+
+# Un "SCAN tabla" sin "USING ... INDEX" es un recorrido completo de la tabla
+RECORRIDO_COMPLETO = re.compile(r'^SCAN (TABLE )?\S+( AS \S+)?$')
+# Pasos que tienen que aparecer en el plan. Un LIKE '%...%' recorre un índice
+# entero sin que RECORRIDO_COMPLETO lo vea: el buscador debe usar MATCH en FTS5
+PASOS_REQUERIDOS = {
+    'catálogo filtrado por el buscador (FTS5)': re.compile(r'VIRTUAL TABLE INDEX \d+:M'),
+}
+
+
+def _pagina_catalogo(**parametros):
+    # La consulta de una página del catálogo tal como la construyen las vistas
+    materiales, _, pagina = views._consulta_catalogo(RequestFactory().get('/', parametros))
+    return consulta_pagina(materiales, **pagina)
+
+
+def consultas_criticas(usuario_id, material_id):
+    """
+    (nombre, queryset) de las consultas de las rutas calientes de la aplicación,
+    construidas con las mismas funciones que usan las vistas y los servicios.
+    """
+    vencimientos_por_dia, prestamos_por_dia = consultas_por_dia(None, date(2024, 1, 1), date(2024, 2, 11))
+    uso_por_tipo, prestatarios_por_tipo = consultas_informe('tipo', 'semana', date(2024, 1, 1), date(2024, 3, 31))
+    uso_por_material, _ = consultas_informe('material', 'mes', date(2024, 1, 1), date(2024, 3, 31))
+    por_numero_serie, _ = consultas_codigo('BSN00000005')
+    _, por_referencia = consultas_codigo('BR0000005')
+    log, _, _, pagina_log = views._consulta_log(RequestFactory().get('/'), material_id)
+    columna = views.COLUMNAS_MATERIAL.index
+    return [
+        ('deuda abierta de usuario y material', consulta_deuda_abierta(usuario_id, material_id)),
+        ('deudas abiertas del usuario (perfil)', views._deudas_perfil(usuario_id)),
+        ('próximo vencimiento del usuario (resumen)', consulta_proximo_vencimiento(usuario_id)),
+        ('resumen de deudas del usuario',
+         ResumenDeuda.objects.filter(usuario_id=usuario_id)),
+        ('log de un material', consulta_pagina(log, **pagina_log)),
+        ('código escaneado por número de serie (kiosco)', por_numero_serie),
+        ('código escaneado por referencia (kiosco)', por_referencia),
+        ('vencimientos por día (calendario)', vencimientos_por_dia),
+        ('préstamos por día (calendario)', prestamos_por_dia),
+        ('usuarios con deudas vencidas sin avisar (avisos)', usuarios_pendientes(date(2024, 2, 1), 0, 200)),
+        ('deudas vencidas sin avisar de un lote de usuarios (avisos)', deudas_pendientes(date(2024, 2, 1), [usuario_id])),
+        ('stock de un material en una fecha (libro de movimientos)',
+         anotar_stock(Material.objects.filter(id=material_id), datetime(2024, 1, 1, tzinfo=timezone.utc)).values_list('stock_libro', flat=True)),
+        ('uso por tipo y semana (informe de uso)', uso_por_tipo),
+        ('prestatarios distintos por tipo y semana (informe de uso)', prestatarios_por_tipo),
+        ('uso por material y mes (informe de uso)', uso_por_material),
+        ('último día agregado de un material (agregar_uso)',
+         consulta_prestado_final(UsoDiarioMaterial, 'material', material_id)),
+        ('catálogo ordenado por nombre (keyset)', _pagina_catalogo(**{
+            'order[0][column]': columna('nombre'), 'cursor': codificar_cursor(['Material bench 5', 5]),
+        })),
+        ('catálogo ordenado por fecha de compra (primera página, desc)', _pagina_catalogo(**{
+            'order[0][column]': columna('fecha_compra'), 'order[0][dir]': 'desc',
+        })),
+        ('catálogo filtrado por el buscador (FTS5)', _pagina_catalogo(**{
+            'order[0][column]': columna('nombre'), 'search[value]': 'bench 5',
+        })),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea una base de datos de prueba con datos sintéticos, ejecuta EXPLAIN QUERY PLAN '
+        'sobre las consultas críticas y falla si alguna recorre una tabla entera (solo SQLite)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=500)
+        parser.add_argument('--materiales', type=int, default=20000)
+        parser.add_argument('--logs', type=int, default=200000)
+        parser.add_argument('--deudas', type=int, default=50000)
+
+    def handle(self, *args, **opciones):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN solo está disponible en SQLite')
+
+        # Base de datos de prueba desechable (la de trabajo no se toca)
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            fallos = self._comprobar(opciones)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+        if fallos:
+            raise CommandError(f"{len(fallos)} consultas recorren tablas enteras o no usan su índice: {', '.join(fallos)}")
+        self.stdout.write(self.style.SUCCESS('Todas las consultas críticas usan índices'))
+
+    def _comprobar(self, opciones):
+        ids_usuarios, ids_materiales = sembrar(
+            opciones['usuarios'], opciones['materiales'], opciones['logs'], opciones['deudas'],
+            salida=self.stdout,
+        )
+        agregar_uso()  # Agregados de uso a partir de los préstamos sembrados
+        with connection.cursor() as cursor:
+            # Estadísticas como las tendría una base de datos con historia
+            cursor.execute('ANALYZE')
+
+        fallos = []
+        for nombre, queryset in consultas_criticas(ids_usuarios[0], ids_materiales[0]):
+            sql, parametros = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, parametros)
+                plan = [fila[-1] for fila in cursor.fetchall()]
+
+            recorridos = [paso for paso in plan if RECORRIDO_COMPLETO.match(paso)]
+            requerido = PASOS_REQUERIDOS.get(nombre)
+            if requerido and not any(requerido.search(paso) for paso in plan):
+                recorridos.append(requerido.pattern)
+            if recorridos:
+                fallos.append(nombre)
+                self.stdout.write(self.style.ERROR(f'FALLA  {nombre}'))
+            else:
+                self.stdout.write(f'OK     {nombre}')
+            for paso in plan:
+                self.stdout.write(f'         {paso}')
+        return fallos
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from audiovisuals_stock import movimientos
+from audiovisuals_stock.models import MovimientoStock
+
+
+class Command(BaseCommand):
+    help = 'Compara (por defecto) o cuadra Material.cantidad con el stock según el libro de movimientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corregir', action='store_true',
+            help='Anota un ajuste por la diferencia en cada material que no cuadre (Material.cantidad manda)',
+        )
+        parser.add_argument('--lote', type=int, default=1000, help='Materiales por consulta')
+
+    def handle(self, *args, **opciones):
+        with transaction.atomic():
+            distintos = list(movimientos.descuadres(opciones['lote']))
+
+            for material_id, libro, cantidad in distintos:
+                self.stdout.write(f'Material {material_id}: libro {libro}, cantidad {cantidad}')
+
+            if opciones['corregir'] and distintos:
+                movimientos.registrar(
+                    {material_id: cantidad - libro for material_id, libro, cantidad in distintos}, MovimientoStock.AJUSTE,
+                )
+                self.stdout.write(self.style.SUCCESS(f'{len(distintos)} materiales cuadrados con un ajuste'))
+            elif distintos:
+                raise CommandError(f'{len(distintos)} materiales no cuadran con el libro (usa --corregir)')
+            else:
+                self.stdout.write(self.style.SUCCESS('Todo el stock cuadra con el libro de movimientos'))
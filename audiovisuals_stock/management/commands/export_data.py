@@ -0,0 +1,31 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from audiovisuals_stock import exports
+
+
+class Command(BaseCommand):
+    help = 'Vuelca materiales, deudas o logs en CSV/JSONL sin cargarlos en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('conjunto', choices=sorted(exports.CONJUNTOS))
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--desde', type=date.fromisoformat, help='AAAA-MM-DD, inclusivo')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='AAAA-MM-DD, inclusivo')
+        parser.add_argument('--salida', help='Archivo de salida (por defecto, la salida estándar)')
+
+    def handle(self, *args, **opciones):
+        contenido = exports.bloques(
+            opciones['conjunto'], opciones['formato'], opciones['desde'], opciones['hasta'], opciones['gzip'],
+        )
+        if opciones['salida']:
+            with open(opciones['salida'], 'wb') as salida:
+                for bloque in contenido:
+                    salida.write(bloque)
+        else:
+            for bloque in contenido:
+                sys.stdout.buffer.write(bloque)
+            sys.stdout.buffer.flush()
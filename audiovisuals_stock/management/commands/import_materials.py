@@ -0,0 +1,161 @@
+import csv
+import json
+import os
+import time
+from contextlib import ExitStack
+from datetime import date
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from audiovisuals_stock import busqueda, catalogos, movimientos, versiones
+from audiovisuals_stock.models import CustomUser, ImportacionMaterial, Material, MovimientoStock, Proveedor, TipoMaterial
+
+CAMPOS_TEXTO = ['referencia', 'nombre', 'numero_serie']
+
+
+class FilaInvalida(Exception):
+    pass
+
+
+def leer_filas(ruta, formato):
+    """Genera (número de línea, dict) sin cargar el archivo en memoria."""
+    with open(ruta, newline='', encoding='utf-8') as archivo:
+        if formato == 'csv':
+            lector = csv.DictReader(archivo)
+            for fila in lector:
+                yield lector.line_num, fila
+        else:
+            for numero, linea in enumerate(archivo, start=1):
+                if not linea.strip():
+                    continue
+                try:
+                    yield numero, json.loads(linea)
+                except ValueError:
+                    yield numero, None
+
+
+def validar_fila(fila):
+    if not isinstance(fila, dict):
+        raise FilaInvalida('línea mal formada')
+    limpia = {}
+    for campo in CAMPOS_TEXTO + ['tipo', 'proveedor']:
+        valor = str(fila.get(campo) or '').strip()
+        if not valor:
+            raise FilaInvalida(f'falta {campo}')
+        if len(valor) > 100:
+            raise FilaInvalida(f'{campo} supera los 100 caracteres')
+        limpia[campo] = valor
+    try:
+        limpia['cantidad'] = int(fila.get('cantidad'))
+    except (TypeError, ValueError):
+        raise FilaInvalida('cantidad no es un número')
+    if limpia['cantidad'] < 0:
+        raise FilaInvalida('cantidad negativa')
+    try:
+        limpia['fecha_compra'] = date.fromisoformat(str(fila.get('fecha_compra')).strip())
+    except ValueError:
+        raise FilaInvalida('fecha_compra no es AAAA-MM-DD')
+    return limpia
+
+
+class Command(BaseCommand):
+    help = 'Importa materiales desde un CSV o JSONL por lotes, con reanudación'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--usuario', required=True, help='Email del usuario que figura como creador')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto se deduce de la extensión')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por transacción')
+        parser.add_argument('--clave', help='Identificador del punto de reanudación (por defecto, la ruta del archivo)')
+        parser.add_argument('--rechazos', help='CSV donde escribir las filas rechazadas')
+        parser.add_argument('--desde-cero', action='store_true', help='Ignora el punto de reanudación guardado')
+
+    def handle(self, *args, **opciones):
+        ruta = opciones['archivo']
+        if not os.path.exists(ruta):
+            raise CommandError(f'No existe {ruta}')
+        formato = opciones['formato'] or ('jsonl' if ruta.endswith(('.jsonl', '.ndjson')) else 'csv')
+        try:
+            creador = CustomUser.objects.get(email=opciones['usuario'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No existe el usuario {opciones['usuario']}")
+
+        progreso, _ = ImportacionMaterial.objects.get_or_create(clave=opciones['clave'] or os.path.abspath(ruta))
+        if opciones['desde_cero']:
+            progreso.linea = progreso.importadas = progreso.rechazadas = 0
+            progreso.save()
+        if progreso.linea:
+            self.stdout.write(f'Reanudando después de la línea {progreso.linea}')
+
+        # Mapas nombre -> id precargados una sola vez
+        tipos = dict(TipoMaterial.objects.values_list('nombre', 'id'))
+        proveedores = dict(Proveedor.objects.values_list('nombre', 'id'))
+
+        with ExitStack() as pila:
+            rechazos = None
+            if opciones['rechazos']:
+                rechazos = csv.writer(pila.enter_context(open(opciones['rechazos'], 'a', newline='', encoding='utf-8')))
+            self._importar(ruta, formato, opciones['lote'], creador, progreso, tipos, proveedores, rechazos)
+
+    def _importar(self, ruta, formato, tamano_lote, creador, progreso, tipos, proveedores, rechazos):
+        filas = ((numero, fila) for numero, fila in leer_filas(ruta, formato) if numero > progreso.linea)
+        importadas = rechazadas = 0
+        inicio = time.perf_counter()
+
+        while True:
+            bloque = list(islice(filas, tamano_lote))
+            if not bloque:
+                break
+
+            validas = []
+            errores = []
+            for numero, fila in bloque:
+                try:
+                    validas.append(validar_fila(fila))
+                except FilaInvalida as e:
+                    errores.append((numero, str(e), fila))
+
+            with transaction.atomic():
+                self._crear_que_falten(TipoMaterial, tipos, {fila['tipo'] for fila in validas})
+                self._crear_que_falten(Proveedor, proveedores, {fila['proveedor'] for fila in validas})
+                creados = Material.objects.bulk_create([
+                    Material(
+                        referencia=fila['referencia'], nombre=fila['nombre'], cantidad=fila['cantidad'],
+                        tipo_id=tipos[fila['tipo']], proveedor_id=proveedores[fila['proveedor']],
+                        fecha_compra=fila['fecha_compra'], numero_serie=fila['numero_serie'], creadopor=creador,
+                    )
+                    for fila in validas
+                ], batch_size=1000)
+                # bulk_create no envía post_save: se indexa el lote a mano
+                busqueda.indexar([material.pk for material in creados])
+                movimientos.registrar({material.pk: material.cantidad for material in creados}, MovimientoStock.COMPRA, creador)
+                versiones.subir('catalogo')
+                progreso.linea = bloque[-1][0]
+                progreso.importadas += len(validas)
+                progreso.rechazadas += len(errores)
+                progreso.save()
+
+            importadas += len(validas)
+            rechazadas += len(errores)
+            for numero, error, fila in errores:
+                self.stderr.write(f'Línea {numero}: {error}')
+                if rechazos:
+                    rechazos.writerow([numero, error, json.dumps(fila, default=str, ensure_ascii=False)])
+
+            duracion = time.perf_counter() - inicio
+            self.stdout.write(f'Línea {progreso.linea}: {importadas} importadas, {rechazadas} rechazadas ({importadas / duracion:.0f} filas/s)')
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{importadas} materiales importados y {rechazadas} rechazados en {duracion:.2f}s '
+            f'({importadas / duracion if duracion else 0:.0f} filas/s). Reanudación en la línea {progreso.linea}'
+        ))
+
+    def _crear_que_falten(self, modelo, mapa, nombres):
+        nuevos = nombres - mapa.keys()
+        if nuevos:
+            modelo.objects.bulk_create([modelo(nombre=nombre) for nombre in nuevos], ignore_conflicts=True)
+            catalogos.invalidar(modelo)  # bulk_create no envía post_save
+            mapa.update(modelo.objects.filter(nombre__in=nuevos).values_list('nombre', 'id'))
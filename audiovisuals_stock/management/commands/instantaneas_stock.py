@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from audiovisuals_stock import movimientos
+
+
+class Command(BaseCommand):
+    help = (
+        'Guarda una instantánea del stock según el libro de movimientos de cada material '
+        'con movimientos desde la anterior (programar periódicamente, p. ej. cada noche)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corte', help='Fecha y hora de la instantánea (por defecto, hace unos minutos); ISO 8601',
+        )
+        parser.add_argument('--lote', type=int, default=1000, help='Materiales por consulta')
+
+    def handle(self, *args, **opciones):
+        corte = None
+        if opciones['corte']:
+            corte = parse_datetime(opciones['corte'])
+            if corte is None:
+                raise CommandError(f"Fecha no válida: {opciones['corte']}")
+            if timezone.is_naive(corte):
+                corte = timezone.make_aware(corte)
+        creadas = movimientos.tomar_instantaneas(corte, opciones['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{creadas} instantáneas creadas'))
@@ -0,0 +1,27 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from audiovisuals_stock import archivo
+
+
+class Command(BaseCommand):
+    help = 'Vuelca en JSONL las filas de un rango de días, archivadas y vivas, ordenadas por fecha'
+
+    def add_arguments(self, parser):
+        parser.add_argument('conjunto', choices=sorted(archivo.ARCHIVABLES))
+        parser.add_argument('--desde', type=date.fromisoformat, help='AAAA-MM-DD, inclusivo')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='AAAA-MM-DD, inclusivo')
+        parser.add_argument(
+            '--filtro', action='append', default=[], metavar='COLUMNA=VALOR', help='Igualdad sobre una columna (repetible)',
+        )
+
+    def handle(self, *args, **opciones):
+        try:
+            filtros = dict(filtro.split('=', 1) for filtro in opciones['filtro'])
+        except ValueError:
+            raise CommandError('Los filtros son COLUMNA=VALOR')
+        for fila in archivo.filas(opciones['conjunto'], opciones['desde'], opciones['hasta'], **filtros):
+            sys.stdout.write(archivo.linea_jsonl(fila))
+        sys.stdout.flush()
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from audiovisuals_stock import busqueda
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de materiales (FTS5)'
+
+    def handle(self, *args, **opciones):
+        if not busqueda.disponible():
+            self.stdout.write('El motor de base de datos no usa índice FTS5; no hay nada que reconstruir')
+            return
+        inicio = time.perf_counter()
+        total = busqueda.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'{total} materiales indexados en {time.perf_counter() - inicio:.2f}s'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from audiovisuals_stock import services
+from audiovisuals_stock.models import ResumenDeuda
+
+
+class Command(BaseCommand):
+    help = 'Verifica (por defecto) o reconstruye ResumenDeuda a partir de DeudaMaterial'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconstruir', action='store_true', help='Reescribe los resúmenes que no coincidan')
+
+    def handle(self, *args, **opciones):
+        vacio = (0, 0, None)
+        with transaction.atomic():
+            esperados = services.calcular_resumenes()
+            guardados = {
+                resumen.usuario_id: (resumen.items, resumen.unidades, resumen.proximo_vencimiento)
+                for resumen in ResumenDeuda.objects.all()
+            }
+            distintos = sorted(
+                usuario_id for usuario_id in esperados.keys() | guardados.keys()
+                if esperados.get(usuario_id, vacio) != guardados.get(usuario_id, vacio)
+            )
+
+            for usuario_id in distintos:
+                self.stdout.write(
+                    f'Usuario {usuario_id}: guardado {guardados.get(usuario_id, vacio)}, esperado {esperados.get(usuario_id, vacio)}'
+                )
+
+            if opciones['reconstruir'] and distintos:
+                ResumenDeuda.objects.filter(usuario_id__in=distintos).delete()
+                ResumenDeuda.objects.bulk_create([
+                    ResumenDeuda(usuario_id=usuario_id, items=items, unidades=unidades, proximo_vencimiento=proximo)
+                    for usuario_id, (items, unidades, proximo) in esperados.items() if usuario_id in distintos
+                ])
+                self.stdout.write(self.style.SUCCESS(f'{len(distintos)} resúmenes reconstruidos'))
+            elif distintos:
+                raise CommandError(f'{len(distintos)} resúmenes no coinciden (usa --reconstruir)')
+            else:
+                self.stdout.write(self.style.SUCCESS('Todos los resúmenes coinciden'))
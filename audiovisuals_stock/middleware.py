@@ -0,0 +1,134 @@
+# audiovisuals_stock/middleware.py
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger('audiovisuals_stock.instrumentacion')
+
+# Medidas de la petición en curso (ContextVar: vale para WSGI y ASGI)
+_medidas = ContextVar('instrumentacion_medidas', default=None)
+
+
+# ================ RESUMEN POR RUTA ================ #
+class ResumenRutas:
+    """Últimas N duraciones por nombre de URL, para calcular p50/p95/p99."""
+
+    def __init__(self, muestras):
+        self._datos = defaultdict(lambda: {clave: deque(maxlen=muestras) for clave in ('total', 'sql', 'consultas')})
+        self._cerrojo = threading.Lock()
+
+    def registrar(self, ruta, total_ms, sql_ms, consultas):
+        with self._cerrojo:
+            datos = self._datos[ruta]
+            datos['total'].append(total_ms)
+            datos['sql'].append(sql_ms)
+            datos['consultas'].append(consultas)
+
+    def resumen(self):
+        with self._cerrojo:
+            copia = {ruta: {clave: sorted(valores) for clave, valores in datos.items()} for ruta, datos in self._datos.items()}
+        return {
+            ruta: {
+                'peticiones': len(datos['total']),
+                **{f'{clave}_p{p}': _percentil(valores, p) for clave, valores in datos.items() for p in (50, 95, 99)},
+            }
+            for ruta, datos in copia.items()
+        }
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return None
+    return round(ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)], 2)
+
+
+resumen_rutas = ResumenRutas(getattr(settings, 'INSTRUMENTACION_MUESTRAS', 1000))
+
+
+# ================ MEDICIÓN DE PLANTILLAS ================ #
+_render_original = Template.render
+
+
+def _render_medido(self, context=None, request=None):
+    medidas = _medidas.get()
+    if medidas is None or medidas['renderizando']:
+        # Fuera de una petición medida, o plantilla anidada (ya se cuenta la externa)
+        return _render_original(self, context, request)
+    medidas['renderizando'] = True
+    inicio = time.perf_counter()
+    try:
+        return _render_original(self, context, request)
+    finally:
+        medidas['plantillas_ms'] += (time.perf_counter() - inicio) * 1000
+        medidas['renderizando'] = False
+
+
+# ================ MIDDLEWARE ================ #
+class InstrumentacionMiddleware:
+    """
+    Mide por petición el número de consultas, el tiempo en SQL, las consultas
+    repetidas (patrones N+1) y el tiempo de render de plantillas. Publica las
+    cifras en la cabecera Server-Timing y en una línea de log JSON.
+
+    Solo se activa con INSTRUMENTACION = True; si no, Django lo descarta al
+    arrancar (MiddlewareNotUsed) y no añade ningún coste.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        Template.render = _render_medido
+
+    def __call__(self, request):
+        medidas = {'consultas': [], 'plantillas_ms': 0.0, 'renderizando': False}
+        token = _medidas.set(medidas)
+        inicio = time.perf_counter()
+
+        def registrar_consulta(execute, sql, params, many, context):
+            comienzo = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                medidas['consultas'].append((sql, (time.perf_counter() - comienzo) * 1000))
+
+        try:
+            with ExitStack() as pila:
+                for alias in connections:
+                    pila.enter_context(connections[alias].execute_wrapper(registrar_consulta))
+                response = self.get_response(request)
+        finally:
+            _medidas.reset(token)
+
+        total_ms = (time.perf_counter() - inicio) * 1000
+        sql_ms = sum(duracion for _, duracion in medidas['consultas'])
+        repetidas = {sql: veces for sql, veces in Counter(sql for sql, _ in medidas['consultas']).items() if veces > 1}
+        ruta = request.resolver_match.url_name if request.resolver_match else None
+
+        response['Server-Timing'] = (
+            f'sql;dur={sql_ms:.1f};desc="{len(medidas["consultas"])} consultas", '
+            f'tpl;dur={medidas["plantillas_ms"]:.1f}, total;dur={total_ms:.1f}'
+        )
+        logger.info(json.dumps({
+            'ruta': ruta,
+            'metodo': request.method,
+            'estado': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'sql_ms': round(sql_ms, 2),
+            'consultas': len(medidas['consultas']),
+            'plantillas_ms': round(medidas['plantillas_ms'], 2),
+            'repetidas': [{'sql': sql[:200], 'veces': veces} for sql, veces in repetidas.items()],
+        }, ensure_ascii=False))
+        if ruta:
+            resumen_rutas.registrar(ruta, total_ms, sql_ms, len(medidas['consultas']))
+        return response
+
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0008_alter_extraccionmaterial_cantidad_extraida'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['referencia', 'id'], name='material_referencia_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['nombre', 'id'], name='material_nombre_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['cantidad', 'id'], name='material_cantidad_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['fecha_compra', 'id'], name='material_fecha_compra_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['numero_serie', 'id'], name='material_numero_serie_id_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+def fusionar_deudas_duplicadas(apps, schema_editor):
+    # Antes de la restricción, junta en una sola las deudas abiertas repetidas
+    # de un mismo usuario y material (sumando las cantidades)
+    DeudaMaterial = apps.get_model('audiovisuals_stock', 'DeudaMaterial')
+    duplicadas = (
+        DeudaMaterial.objects.filter(devuelta=False)
+        .values('usuario_id', 'material_id')
+        .annotate(total=models.Count('id'))
+        .filter(total__gt=1)
+    )
+    for grupo in duplicadas:
+        deudas = list(
+            DeudaMaterial.objects.filter(
+                usuario_id=grupo['usuario_id'], material_id=grupo['material_id'], devuelta=False
+            ).order_by('id')
+        )
+        principal = deudas[0]
+        principal.cantidad_adeudada = sum(deuda.cantidad_adeudada for deuda in deudas)
+        principal.save(update_fields=['cantidad_adeudada'])
+        DeudaMaterial.objects.filter(id__in=[deuda.id for deuda in deudas[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0009_material_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_deudas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='deudamaterial',
+            constraint=models.UniqueConstraint(condition=models.Q(('devuelta', False)), fields=('usuario', 'material'), name='deuda_abierta_unica'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:15
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0010_deuda_abierta_unica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitMaterial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('creadopor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='KitMaterialItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('kit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='audiovisuals_stock.kitmaterial')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='audiovisuals_stock.material')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='kitmaterialitem',
+            constraint=models.UniqueConstraint(fields=('kit', 'material'), name='kit_material_unico'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0011_kitmaterial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacionMaterial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=255, unique=True)),
+                ('linea', models.PositiveIntegerField(default=0)),
+                ('importadas', models.PositiveIntegerField(default=0)),
+                ('rechazadas', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
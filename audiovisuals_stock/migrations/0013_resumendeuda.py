@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def rellenar_resumenes(apps, schema_editor):
+    DeudaMaterial = apps.get_model('audiovisuals_stock', 'DeudaMaterial')
+    ResumenDeuda = apps.get_model('audiovisuals_stock', 'ResumenDeuda')
+    totales = (
+        DeudaMaterial.objects.filter(devuelta=False).values('usuario_id')
+        .annotate(items=models.Count('id'), unidades=models.Sum('cantidad_adeudada'), proximo=models.Min('fecha_vencimiento'))
+        .order_by()
+    )
+    ResumenDeuda.objects.bulk_create([
+        ResumenDeuda(usuario_id=fila['usuario_id'], items=fila['items'], unidades=fila['unidades'], proximo_vencimiento=fila['proximo'])
+        for fila in totales
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0012_importacionmaterial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDeuda',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen_deuda', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('proximo_vencimiento', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(rellenar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0013_resumendeuda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deudamaterial',
+            index=models.Index(condition=models.Q(('devuelta', False)), fields=['usuario', 'fecha_vencimiento'], name='deuda_abierta_usuario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materiallog',
+            index=models.Index(fields=['material', '-fecha_accion', '-id'], name='materiallog_material_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+COLUMNAS = 'referencia, nombre, numero_serie'
+
+
+def crear_indice(apps, schema_editor):
+    # Tablas FTS5 de busqueda.py; solo existen en SQLite (otros motores usan el ORM)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE material_fts USING fts5({COLUMNAS}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(f"CREATE VIRTUAL TABLE material_fts_trigram USING fts5({COLUMNAS}, tokenize='trigram')")
+    for tabla in ('material_fts', 'material_fts_trigram'):
+        schema_editor.execute(
+            f'INSERT INTO {tabla} (rowid, {COLUMNAS}) SELECT id, {COLUMNAS} FROM audiovisuals_stock_material'
+        )
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS material_fts')
+    schema_editor.execute('DROP TABLE IF EXISTS material_fts_trigram')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0014_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0015_material_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deudamaterial',
+            index=models.Index(condition=models.Q(('devuelta', False)), fields=['fecha_vencimiento'], name='deuda_abierta_vencimiento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deudamaterial',
+            index=models.Index(fields=['fecha_generacion'], name='deuda_generacion_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0016_calendario_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvisoVencimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.CharField(max_length=254)),
+                ('deudas', models.PositiveIntegerField()),
+                ('unidades', models.PositiveIntegerField()),
+                ('fecha_envio', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='deudamaterial',
+            name='fecha_aviso',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='deudamaterial',
+            index=models.Index(condition=models.Q(('devuelta', False), ('fecha_aviso__isnull', True)), fields=['usuario', 'fecha_vencimiento'], name='deuda_sin_aviso_idx'),
+        ),
+        migrations.AddField(
+            model_name='avisovencimiento',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def abrir_libro(apps, schema_editor):
+    # Saldo inicial: un ajuste por material con el stock actual, para que el libro cuadre desde el principio
+    Material = apps.get_model('audiovisuals_stock', 'Material')
+    MovimientoStock = apps.get_model('audiovisuals_stock', 'MovimientoStock')
+    ahora = django.utils.timezone.now()
+    MovimientoStock.objects.bulk_create((
+        MovimientoStock(material_id=material_id, tipo='ajuste', cantidad=cantidad, fecha=ahora)
+        for material_id, cantidad in Material.objects.exclude(cantidad=0).values_list('id', 'cantidad').iterator()
+    ), batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0017_avisos_vencimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('cantidad', models.IntegerField()),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='audiovisuals_stock.material')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('extraccion', 'Extracción'), ('devolucion', 'Devolución'), ('ajuste', 'Ajuste'), ('compra', 'Compra')], max_length=10)),
+                ('cantidad', models.IntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='audiovisuals_stock.material')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['material', 'fecha'], name='movimiento_material_fecha_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='instantaneastock',
+            constraint=models.UniqueConstraint(fields=('material', 'fecha'), name='instantanea_material_fecha_unica'),
+        ),
+        migrations.RunPython(abrir_libro, migrations.RunPython.noop),
+    ]
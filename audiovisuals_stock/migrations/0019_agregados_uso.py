@@ -0,0 +1,80 @@
+# Generated by Django 4.2.5 on 2026-10-18 08:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0018_libro_movimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaAgregacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=50, unique=True)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UsoDiarioMaterial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('unidades_extraidas', models.PositiveIntegerField(default=0)),
+                ('unidades_devueltas', models.PositiveIntegerField(default=0)),
+                ('extracciones', models.PositiveIntegerField(default=0)),
+                ('pico_prestado', models.IntegerField(default=0)),
+                ('prestado_final', models.IntegerField(default=0)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='audiovisuals_stock.material')),
+                ('tipo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='audiovisuals_stock.tipomaterial')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PrestatarioDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='audiovisuals_stock.material')),
+                ('tipo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='audiovisuals_stock.tipomaterial')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UsoDiarioTipo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('unidades_extraidas', models.PositiveIntegerField(default=0)),
+                ('unidades_devueltas', models.PositiveIntegerField(default=0)),
+                ('extracciones', models.PositiveIntegerField(default=0)),
+                ('pico_prestado', models.IntegerField(default=0)),
+                ('prestado_final', models.IntegerField(default=0)),
+                ('tipo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='audiovisuals_stock.tipomaterial')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dia'], name='uso_tipo_dia_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usodiariotipo',
+            constraint=models.UniqueConstraint(fields=('tipo', 'dia'), name='uso_tipo_dia_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='usodiariomaterial',
+            index=models.Index(fields=['dia'], name='uso_material_dia_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='usodiariomaterial',
+            constraint=models.UniqueConstraint(fields=('material', 'dia'), name='uso_material_dia_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='prestatariodiario',
+            constraint=models.UniqueConstraint(fields=('dia', 'material', 'usuario'), name='prestatario_dia_unico'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.5 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audiovisuals_stock', '0019_agregados_uso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteRegistro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=150, unique=True)),
+                ('registros', models.PositiveIntegerField()),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
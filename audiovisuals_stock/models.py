@@ -52,7 +52,10 @@ class UserProfile(models.Model):
         return self.user.email
 
     def obtener_deudas_pendientes(self):
-        return DeudaMaterial.objects.filter(usuario=self.user, devuelta=False)
+        return DeudaMaterial.objects.filter(usuario=self.user, devuelta=False).select_related('material')
+
+    def obtener_resumen_deuda(self):
+        return ResumenDeuda.objects.filter(usuario=self.user).first()
 
 
 
@@ -81,6 +84,25 @@ class Material(models.Model):
     proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)
     numero_serie = models.CharField(max_length=100)
 
+    class Meta:
+        # Índices (columna, id) para ordenar y paginar por keyset el catálogo
+        indexes = [
+            models.Index(fields=['referencia', 'id'], name='material_referencia_id_idx'),
+            models.Index(fields=['nombre', 'id'], name='material_nombre_id_idx'),
+            models.Index(fields=['cantidad', 'id'], name='material_cantidad_id_idx'),
+            models.Index(fields=['fecha_compra', 'id'], name='material_fecha_compra_id_idx'),
+            models.Index(fields=['numero_serie', 'id'], name='material_numero_serie_id_idx'),
+        ]
+
+DIAS_PRESTAMO = 7
+
+
+def calcular_fecha_vencimiento():
+    # Por ejemplo, 7 días desde la generación. Se usa también en los bulk_create,
+    # que no pasan por DeudaMaterial.save()
+    return (timezone.now() + timezone.timedelta(days=DIAS_PRESTAMO)).date()
+
+
 class DeudaMaterial(models.Model):
     usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     material = models.ForeignKey(Material, on_delete=models.CASCADE)
@@ -88,13 +110,58 @@ class DeudaMaterial(models.Model):
     fecha_generacion = models.DateTimeField(auto_now_add=True)
     fecha_vencimiento = models.DateField()  # Define cómo calcular la fecha de vencimiento
     devuelta = models.BooleanField(default=False)
+    fecha_aviso = models.DateTimeField(null=True, blank=True)  # Aviso de vencimiento enviado (avisos.py)
+
+    class Meta:
+        indexes = [
+            # Deudas abiertas de un usuario ordenadas por vencimiento (perfil y ResumenDeuda)
+            models.Index(
+                fields=['usuario', 'fecha_vencimiento'],
+                condition=models.Q(devuelta=False),
+                name='deuda_abierta_usuario_idx',
+            ),
+            # Rangos de fechas del calendario (calendario.py)
+            models.Index(
+                fields=['fecha_vencimiento'],
+                condition=models.Q(devuelta=False),
+                name='deuda_abierta_vencimiento_idx',
+            ),
+            models.Index(fields=['fecha_generacion'], name='deuda_generacion_idx'),
+            # Deudas abiertas aún sin aviso, por usuario (manage.py avisar_vencidas)
+            models.Index(
+                fields=['usuario', 'fecha_vencimiento'],
+                condition=models.Q(devuelta=False, fecha_aviso__isnull=True),
+                name='deuda_sin_aviso_idx',
+            ),
+        ]
+        constraints = [
+            # Como mucho una deuda abierta por usuario y material (ver services._sumar_deuda).
+            # Su índice parcial también sirve las búsquedas por (usuario, material, devuelta=False)
+            models.UniqueConstraint(
+                fields=['usuario', 'material'],
+                condition=models.Q(devuelta=False),
+                name='deuda_abierta_unica',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         # Calcula la fecha de vencimiento al momento de guardar la deuda
         if not self.fecha_vencimiento:
-            self.fecha_vencimiento = timezone.now() + timezone.timedelta(days=7)  # Por ejemplo, 7 días desde la generación
+            self.fecha_vencimiento = calcular_fecha_vencimiento()
         super(DeudaMaterial, self).save(*args, **kwargs)
 
+class ResumenDeuda(models.Model):
+    # Totales de las deudas abiertas de cada usuario. Se mantiene en la misma
+    # transacción que cada extracción y devolución (ver services.py) y se puede
+    # reconstruir con manage.py resumen_deudas.
+    usuario = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='resumen_deuda')
+    items = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    proximo_vencimiento = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.usuario}: {self.items} deudas, {self.unidades} unidades'
+
 class ExtraccionMaterial(models.Model):
     material = models.ForeignKey(Material, on_delete=models.CASCADE)
     usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
@@ -137,6 +204,58 @@ class DevolucionMaterial(models.Model):
             deuda.devuelta = True
             deuda.save()
 
+#================ IMPORTACIONES ================#
+class ImportacionMaterial(models.Model):
+    # Punto de reanudación de manage.py import_materials: la línea se guarda en
+    # la misma transacción que el lote, así que reanudar nunca duplica filas
+    clave = models.CharField(max_length=255, unique=True)
+    linea = models.PositiveIntegerField(default=0)
+    importadas = models.PositiveIntegerField(default=0)
+    rechazadas = models.PositiveIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.clave} (línea {self.linea})'
+
+#================ AVISOS DE VENCIMIENTO ================#
+class AvisoVencimiento(models.Model):
+    # Un aviso agrupado enviado a un usuario por sus deudas vencidas; las deudas
+    # incluidas quedan marcadas con DeudaMaterial.fecha_aviso
+    usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    destinatario = models.CharField(max_length=254)
+    deudas = models.PositiveIntegerField()
+    unidades = models.PositiveIntegerField()
+    fecha_envio = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.destinatario} ({self.deudas} deudas, {self.fecha_envio:%Y-%m-%d})'
+
+#================ KITS DE MATERIAL ================#
+class KitMaterial(models.Model):
+    # Lista con nombre de materiales que se extraen juntos (p. ej. "Rodaje exterior")
+    nombre = models.CharField(max_length=100, unique=True)
+    creadopor = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.nombre
+
+    def lineas(self):
+        return [(item.material_id, item.cantidad) for item in self.items.all()]
+
+class KitMaterialItem(models.Model):
+    kit = models.ForeignKey(KitMaterial, on_delete=models.CASCADE, related_name='items')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE)
+    cantidad = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kit', 'material'], name='kit_material_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.cantidad} x {self.material_id}'
+
 #================ LOGS DE MATERIALES ================#
 class MaterialLog(models.Model):
     material = models.ForeignKey(Material, on_delete=models.CASCADE)
@@ -144,9 +263,127 @@ class MaterialLog(models.Model):
     cantidad_extraida = models.PositiveIntegerField()
     fecha_accion = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Log de un material del más reciente al más antiguo (log_material)
+            models.Index(fields=['material', '-fecha_accion', '-id'], name='materiallog_material_fecha_idx'),
+        ]
+
     def __str__(self):
         return f'{self.usuario} extrajo {self.cantidad_extraida} de {self.material.nombre}'
-    
+
+
+#================ LIBRO DE MOVIMIENTOS DE STOCK ================#
+class MovimientoStock(models.Model):
+    # Libro de solo inserción: cada cambio de Material.cantidad deja aquí su
+    # diferencia (negativa al extraer), en la misma transacción (movimientos.py)
+    EXTRACCION = 'extraccion'
+    DEVOLUCION = 'devolucion'
+    AJUSTE = 'ajuste'
+    COMPRA = 'compra'
+    TIPOS = (
+        (EXTRACCION, 'Extracción'),
+        (DEVOLUCION, 'Devolución'),
+        (AJUSTE, 'Ajuste'),
+        (COMPRA, 'Compra'),
+    )
+    material = models.ForeignKey(Material, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    cantidad = models.IntegerField()
+    usuario = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Movimientos de un material en un rango de fechas (diferencia desde la instantánea)
+            models.Index(fields=['material', 'fecha'], name='movimiento_material_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_tipo_display()} {self.cantidad:+d} de {self.material_id} ({self.fecha:%Y-%m-%d %H:%M})'
+
+
+class InstantaneaStock(models.Model):
+    # Stock de un material según el libro en `fecha` (incluidos los movimientos
+    # de esa misma fecha); la escribe manage.py instantaneas_stock
+    material = models.ForeignKey(Material, on_delete=models.CASCADE)
+    fecha = models.DateTimeField()
+    cantidad = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # Su índice sirve "la última instantánea del material antes de una fecha"
+            models.UniqueConstraint(fields=['material', 'fecha'], name='instantanea_material_fecha_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.material_id}: {self.cantidad} ({self.fecha:%Y-%m-%d %H:%M})'
+
+
+#================ AGREGADOS DE USO (INFORMES) ================#
+# Uso por día calculado a partir de MovimientoStock por manage.py agregar_uso
+# (uso.py). Los informes solo leen estas tablas.
+class UsoDiarioMaterial(models.Model):
+    dia = models.DateField()
+    material = models.ForeignKey(Material, on_delete=models.CASCADE)
+    tipo = models.ForeignKey(TipoMaterial, on_delete=models.CASCADE)  # Tipo del material al agregar
+    unidades_extraidas = models.PositiveIntegerField(default=0)
+    unidades_devueltas = models.PositiveIntegerField(default=0)
+    extracciones = models.PositiveIntegerField(default=0)
+    pico_prestado = models.IntegerField(default=0)  # Máximo de unidades prestadas a la vez
+    prestado_final = models.IntegerField(default=0)  # Prestadas al acabar el día: punto de partida del siguiente
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dia'], name='uso_material_dia_idx'),
+        ]
+        constraints = [
+            # Su índice sirve también "el último día con uso del material"
+            models.UniqueConstraint(fields=['material', 'dia'], name='uso_material_dia_unico'),
+        ]
+
+
+class UsoDiarioTipo(models.Model):
+    dia = models.DateField()
+    tipo = models.ForeignKey(TipoMaterial, on_delete=models.CASCADE)
+    unidades_extraidas = models.PositiveIntegerField(default=0)
+    unidades_devueltas = models.PositiveIntegerField(default=0)
+    extracciones = models.PositiveIntegerField(default=0)
+    pico_prestado = models.IntegerField(default=0)
+    prestado_final = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dia'], name='uso_tipo_dia_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'dia'], name='uso_tipo_dia_unico'),
+        ]
+
+
+class PrestatarioDiario(models.Model):
+    # Quién extrajo cada material cada día: los prestatarios distintos de una
+    # semana o un mes no se pueden sumar desde los totales diarios
+    dia = models.DateField()
+    material = models.ForeignKey(Material, on_delete=models.CASCADE)
+    tipo = models.ForeignKey(TipoMaterial, on_delete=models.CASCADE)
+    usuario = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'material', 'usuario'], name='prestatario_dia_unico'),
+        ]
+
+
+class MarcaAgregacion(models.Model):
+    # Último movimiento ya agregado; se guarda en la misma transacción que el lote
+    clave = models.CharField(max_length=50, unique=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.clave} (movimiento {self.ultimo_id})'
+
 
 #================ REGISTRO DE ACTIVIDAD ================#
 class UserActivity(models.Model):
@@ -161,4 +398,16 @@ class UserActivity(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f'{self.user} - {self.action} - {self.material} - {self.timestamp}'
\ No newline at end of file
+        return f'{self.user} - {self.action} - {self.material} - {self.timestamp}'
+
+
+class LoteRegistro(models.Model):
+    # Segmento del spool de registro.py ya insertado: se guarda en la misma
+    # transacción que sus registros y evita insertarlos dos veces si el proceso
+    # muere antes de borrar el fichero
+    clave = models.CharField(max_length=150, unique=True)
+    registros = models.PositiveIntegerField()
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.clave} ({self.registros} registros)'
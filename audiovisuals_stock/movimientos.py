@@ -0,0 +1,100 @@
+# audiovisuals_stock/movimientos.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import DateTimeField, Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InstantaneaStock, Material, MovimientoStock
+
+
+# ================ LIBRO DE MOVIMIENTOS DE STOCK ================ #
+# Material.cantidad sigue siendo el stock actual que leen las páginas. Cada
+# cambio deja además su diferencia en MovimientoStock, en la misma transacción
+# (services.py), y el libro sirve para:
+#   - el stock en cualquier fecha: la última InstantaneaStock hasta esa fecha
+#     (una búsqueda en su índice) más los pocos movimientos posteriores, sin
+#     recorrer todo el historial;
+#   - conciliar: el stock según el libro debe coincidir con Material.cantidad
+#     (manage.py conciliar_stock).
+# manage.py instantaneas_stock (periódico, p. ej. cada noche) añade una
+# instantánea de cada material con movimientos desde la anterior.
+
+# Las instantáneas se cortan unos minutos atrás: un movimiento lleva la hora de
+# su INSERT, y una transacción aún abierta podría confirmar uno anterior al corte
+MARGEN_INSTANTANEA = timedelta(minutes=5)
+
+_ORIGEN = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def registrar(diferencias, tipo, usuario=None):
+    """Anota en el libro {material_id: diferencia}; las diferencias nulas se omiten. Devuelve los movimientos."""
+    fecha = timezone.now()
+    return MovimientoStock.objects.bulk_create([
+        MovimientoStock(material_id=material_id, tipo=tipo, cantidad=cantidad, usuario=usuario, fecha=fecha)
+        for material_id, cantidad in diferencias.items() if cantidad
+    ])
+
+
+def anotar_stock(materiales, momento=None):
+    """
+    Anota `stock_libro` en cada material: su stock según el libro en `momento`
+    (ahora si es None). Dos subconsultas por material, ambas sobre índices
+    (material, fecha): la última instantánea y la suma de lo posterior.
+    """
+    instantaneas = InstantaneaStock.objects.filter(material=OuterRef('pk')).order_by('-fecha')
+    posteriores = MovimientoStock.objects.filter(material=OuterRef('pk'), fecha__gt=OuterRef('base_fecha'))
+    if momento is not None:
+        instantaneas = instantaneas.filter(fecha__lte=momento)
+        posteriores = posteriores.filter(fecha__lte=momento)
+    return materiales.annotate(
+        base_fecha=Coalesce(Subquery(instantaneas.values('fecha')[:1]), Value(_ORIGEN), output_field=DateTimeField()),
+    ).annotate(
+        stock_libro=Coalesce(Subquery(instantaneas.values('cantidad')[:1]), 0) + Coalesce(
+            Subquery(posteriores.values('material').annotate(total=Sum('cantidad')).values('total')), 0,
+        ),
+    )
+
+
+def stock_en(material_id, momento=None):
+    """Stock del material según el libro en `momento` (ahora si es None)."""
+    return anotar_stock(Material.objects.filter(id=material_id), momento).values_list('stock_libro', flat=True).get()
+
+
+def tomar_instantaneas(corte=None, lote=1000):
+    """
+    Guarda el stock en `corte` de los materiales con movimientos desde su
+    última instantánea. Recorre los materiales por lotes de id; repetir el
+    mismo corte no duplica nada. Devuelve el número de instantáneas creadas.
+    """
+    corte = corte or timezone.now() - MARGEN_INSTANTANEA
+    con_cambios = Exists(MovimientoStock.objects.filter(
+        material=OuterRef('pk'), fecha__gt=OuterRef('base_fecha'), fecha__lte=corte,
+    ))
+    ultimo_id = creadas = 0
+    while True:
+        bloque = list(
+            anotar_stock(Material.objects.filter(id__gt=ultimo_id), corte).filter(con_cambios)
+            .order_by('id').values_list('id', 'stock_libro')[:lote]
+        )
+        if not bloque:
+            return creadas
+        ultimo_id = bloque[-1][0]
+        creadas += len(InstantaneaStock.objects.bulk_create([
+            InstantaneaStock(material_id=material_id, fecha=corte, cantidad=cantidad) for material_id, cantidad in bloque
+        ], ignore_conflicts=True))
+
+
+def descuadres(lote=1000):
+    """(material_id, stock según el libro, Material.cantidad) de los materiales que no coinciden."""
+    ultimo_id = 0
+    while True:
+        # Cada lote es una sola consulta: libro y cantidad se leen en el mismo instante
+        bloque = list(
+            anotar_stock(Material.objects.filter(id__gt=ultimo_id)).order_by('id')
+            .values_list('id', 'stock_libro', 'cantidad')[:lote]
+        )
+        if not bloque:
+            return
+        ultimo_id = bloque[-1][0]
+        yield from (fila for fila in bloque if fila[1] != fila[2])
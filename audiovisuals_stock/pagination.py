@@ -0,0 +1,103 @@
+# audiovisuals_stock/pagination.py
+import base64
+import json
+from datetime import date, datetime
+
+from django.db.models import Q
+
+
+# ================ CURSORES (KEYSET) ================ #
+# Un cursor guarda los valores de la última fila servida para las columnas de
+# orden. La página siguiente se pide con WHERE (col, id) > (valor, id) sobre un
+# índice compuesto, así que su coste no depende de lo lejos que esté la página.
+
+def _codificar_valor(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'d': valor.isoformat()}
+    return valor
+
+
+def _decodificar_valor(valor):
+    if isinstance(valor, dict):
+        if 'dt' in valor:
+            return datetime.fromisoformat(valor['dt'])
+        if 'd' in valor:
+            return date.fromisoformat(valor['d'])
+    return valor
+
+
+def codificar_cursor(valores):
+    datos = json.dumps([_codificar_valor(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve la lista de valores del cursor o None si no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return [_decodificar_valor(v) for v in valores]
+    except (ValueError, TypeError):
+        return None
+
+
+def filtro_keyset(campos, valores, descendente=False):
+    """Construye el Q equivalente a (campos) > (valores) (o < si descendente)."""
+    lookup = 'lt' if descendente else 'gt'
+    condicion = Q()
+    for i, campo in enumerate(campos):
+        igualdades = {campos[j]: valores[j] for j in range(i)}
+        condicion |= Q(**igualdades, **{f'{campo}__{lookup}': valores[i]})
+    # La cota redundante sobre la primera columna permite al planificador
+    # empezar por un SEARCH en el índice en lugar de recorrerlo desde el inicio
+    return Q(**{f'{campos[0]}__{lookup}e': valores[0]}) & condicion
+
+
+def consulta_pagina(queryset, campos, cursor=None, limite=25, descendente=False, desplazamiento=0):
+    """La consulta de una página (con una fila de más), sin ejecutar; la recorre paginar_keyset."""
+    prefijo = '-' if descendente else ''
+    queryset = queryset.order_by(*[prefijo + campo for campo in campos])
+
+    valores = decodificar_cursor(cursor)
+    if valores is not None and len(valores) == len(campos):
+        queryset = queryset.filter(filtro_keyset(campos, valores, descendente))
+
+    # Se pide una fila de más para saber si existe una página siguiente
+    return queryset[desplazamiento:desplazamiento + limite + 1]
+
+
+def _cortar_pagina(filas, campos, limite):
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = codificar_cursor([_valor_campo(ultima, campo) for campo in campos])
+    return filas, siguiente
+
+
+def paginar_keyset(queryset, campos, cursor=None, limite=25, descendente=False, desplazamiento=0):
+    """
+    Devuelve (filas, siguiente_cursor) ordenando por `campos`. El último campo
+    debe ser único (normalmente 'id') para que el orden sea total. Sin cursor
+    se puede saltar a una página arbitraria con `desplazamiento` (OFFSET).
+    """
+    filas = list(consulta_pagina(queryset, campos, cursor, limite, descendente, desplazamiento))
+    return _cortar_pagina(filas, campos, limite)
+
+
+async def apaginar_keyset(queryset, campos, cursor=None, limite=25, descendente=False, desplazamiento=0):
+    """Versión async de paginar_keyset (vistas ASGI, views_async.py)."""
+    filas = [fila async for fila in consulta_pagina(queryset, campos, cursor, limite, descendente, desplazamiento)]
+    return _cortar_pagina(filas, campos, limite)
+
+
+def _valor_campo(fila, campo):
+    if isinstance(fila, dict):
+        return fila[campo]
+    for parte in campo.split('__'):
+        fila = getattr(fila, parte)
+    return fila
@@ -0,0 +1,355 @@
+# audiovisuals_stock/registro.py
+import atexit
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+import weakref
+from collections import defaultdict
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from auditlog.diff import get_field_value
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core import serializers
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.encoding import smart_str
+
+from .models import LoteRegistro, MovimientoStock
+
+logger = logging.getLogger('audiovisuals_stock.registro')
+
+
+# ================ REGISTRO DIFERIDO ================ #
+# Los registros que no cambian el stock (MaterialLog, UserActivity, entradas
+# de auditlog) no necesitan insertarse dentro de la petición. Con
+# settings.REGISTRO_DIFERIDO:
+#   - anotar() los apunta en el segmento del spool de su proceso ANTES del
+#     COMMIT: una línea JSON por llamada, escrita y volcada a disco (fsync si
+#     REGISTRO_FSYNC) junto con su testigo, el movimiento de stock que inserta
+#     la misma transacción (id y fecha: SQLite reutiliza el id de una
+#     inserción deshecha, la fecha con microsegundos no coincide). La línea queda
+#     confirmada en el on_commit o descartada si Django suelta ese on_commit
+#     sin llamarlo (rollback);
+#   - un hilo de fondo cierra el segmento cada REGISTRO_INTERVALO segundos (o
+#     antes si se acumulan REGISTRO_LOTE) y, cuando todas sus líneas están
+#     resueltas, inserta las confirmadas con un bulk_create por modelo, en una
+#     transacción junto con un LoteRegistro con el nombre del segmento;
+#     después borra el fichero y el LoteRegistro;
+#   - cada segmento está bloqueado (flock) mientras su proceso vive: los que
+#     quedan sin bloquear son de un proceso muerto, cuyas transacciones ya han
+#     terminado, y el hilo de cualquier otro inserta las líneas cuyo testigo
+#     existe (la transacción se confirmó) y salta el resto. Si el LoteRegistro
+#     ya existe, el proceso murió tras insertarlos y el fichero solo se borra.
+# Así ningún registro confirmado se pierde si muere el proceso; con
+# REGISTRO_FSYNC (por defecto) tampoco si se cae la máquina.
+# Sin testigo (p. ej. una edición sin cambio de stock) se insertan en la
+# transacción, igual que sin REGISTRO_DIFERIDO. El libro de movimientos
+# (MovimientoStock) no pasa por aquí: conciliar exige que se confirme con el
+# stock.
+
+_instancia = None
+_creacion = threading.Lock()
+
+
+def anotar(*objetos, testigo=None):
+    """
+    Guarda instancias nuevas (sin guardar aún) de los modelos de registro:
+    diferidas según settings.REGISTRO_DIFERIDO si hay `testigo` (un
+    MovimientoStock ya insertado en la transacción en curso) o, si no, con un
+    bulk_create por modelo dentro de esa transacción.
+    """
+    if not settings.REGISTRO_DIFERIDO or testigo is None or testigo.pk is None:
+        _insertar(objetos)
+        return
+    ahora = timezone.now()
+    for objeto in objetos:
+        # Hora de la acción, no la de la inserción (ver _insertar)
+        for campo in _automaticos(type(objeto)):
+            if getattr(objeto, campo) is None:
+                setattr(objeto, campo, ahora)
+    linea = json.dumps({
+        'testigo': [testigo.pk, testigo.fecha.isoformat()],
+        'registros': serializers.serialize('python', objetos),
+    }, cls=DjangoJSONEncoder)
+    try:
+        segmento, numero = _cola().apuntar(linea)
+    except OSError:
+        # Sin spool (disco lleno, permisos): mejor una inserción en la petición que perderlos
+        logger.exception('No se pudo escribir en el spool; los registros se insertan directamente')
+        _insertar(objetos)
+        return
+    confirmacion = _Confirmacion(segmento, numero)
+    # Django suelta el on_commit sin llamarlo si la transacción se deshace
+    descarte = weakref.finalize(confirmacion, segmento.resolver, numero, False)
+    descarte.atexit = False  # Al salir, lo no resuelto queda para la recuperación por testigo
+    transaction.on_commit(confirmacion)
+
+
+def vaciar():
+    """Inserta ya lo confirmado por este proceso. Devuelve el número de registros insertados."""
+    if _instancia is None or _instancia.pid != os.getpid():
+        return 0
+    return _instancia.vaciar()
+
+
+def entrada_auditoria(instancia, accion, actor, anterior=None, campos=None):
+    """
+    LogEntry sin guardar para anotar(), con los mismos campos que rellena
+    auditlog al registrar un modelo. `anterior` es la instancia antes del
+    cambio (None al crear); `campos` limita la comparación.
+    """
+    # Los modelos no se registran en auditlog (sus señales insertarían en la
+    # petición): el diff es el de auditlog.diff.model_instance_diff
+    cambios = {}
+    for campo in instancia._meta.fields:
+        if campos is None or campo.name in campos:
+            antes, despues = get_field_value(anterior, campo), get_field_value(instancia, campo)
+            if antes != despues:
+                cambios[campo.name] = (smart_str(antes), smart_str(despues))
+    return LogEntry(
+        content_type=ContentType.objects.get_for_model(instancia),
+        object_pk=smart_str(instancia.pk),
+        object_id=instancia.pk,
+        object_repr=smart_str(instancia),
+        action=accion,
+        changes=json.dumps(cambios),
+        actor=actor,
+    )
+
+
+def _cola():
+    global _instancia
+    with _creacion:
+        # Tras un fork el hijo necesita su propio segmento y su propio hilo
+        if _instancia is None or _instancia.pid != os.getpid():
+            _instancia = Cola()
+    return _instancia
+
+
+def _automaticos(modelo):
+    return [campo.attname for campo in modelo._meta.concrete_fields if getattr(campo, 'auto_now_add', False)]
+
+
+def _insertar(objetos):
+    por_modelo = defaultdict(list)
+    for objeto in objetos:
+        por_modelo[type(objeto)].append(objeto)
+    for modelo, grupo in por_modelo.items():
+        # bulk_create pone la hora actual en los campos auto_now_add
+        # (UserActivity.timestamp, LogEntry.timestamp): se vuelve a poner la
+        # de la acción con un bulk_update en la misma transacción
+        automaticos = _automaticos(modelo)
+        horas = [[getattr(objeto, campo) for campo in automaticos] for objeto in grupo]
+        modelo.objects.bulk_create(grupo)
+        if any(hora is not None for fila in horas for hora in fila):
+            for objeto, fila in zip(grupo, horas):
+                for campo, hora in zip(automaticos, fila):
+                    if hora is not None:
+                        setattr(objeto, campo, hora)
+            modelo.objects.bulk_update(grupo, automaticos)
+
+
+class _Confirmacion:
+    # El on_commit de una línea; lo que la sostiene es la lista de on_commit de la conexión
+
+    def __init__(self, segmento, numero):
+        self.segmento = segmento
+        self.numero = numero
+
+    def __call__(self):
+        self.segmento.resolver(self.numero, True)
+
+
+class _Segmento:
+    """Fichero del spool de este proceso y el estado de cada una de sus líneas."""
+
+    def __init__(self, ruta):
+        self.fichero = _abrir(ruta, bloquear=True)
+        self.lineas = 0
+        self.confirmadas = set()
+        self._resueltas = set()
+        self._cerrojo = threading.Lock()
+
+    def resolver(self, numero, confirmada):
+        # Tras la confirmación (on_commit) llega también el descarte, cuando
+        # Django suelta el on_commit ya llamado: solo cuenta la primera
+        with self._cerrojo:
+            if numero in self._resueltas:
+                return
+            self._resueltas.add(numero)
+            if confirmada:
+                self.confirmadas.add(numero)
+
+    def resuelto(self):
+        with self._cerrojo:
+            return len(self._resueltas) >= self.lineas
+
+
+class Cola:
+    """Segmento del spool de este proceso y el hilo que lo inserta."""
+
+    def __init__(self):
+        if fcntl is None:
+            raise ImproperlyConfigured('REGISTRO_DIFERIDO necesita fcntl (Linux o macOS); usa REGISTRO_DIFERIDO=0')
+        self.pid = os.getpid()
+        self.directorio = settings.REGISTRO_SPOOL
+        os.makedirs(self.directorio, exist_ok=True)
+        # Las claves de LoteRegistro llevan la máquina: el spool es local y la base de datos no
+        self.prefijo = f'registro-{socket.gethostname()}-'
+        self._cerrojo = threading.Lock()  # Segmento abierto
+        self._vaciando = threading.Lock()  # Un solo vaciado a la vez (hilo, atexit, comandos)
+        self._segmento = None
+        self._pendientes = []  # Segmentos cerrados aún sin insertar (siguen bloqueados)
+        self._despertar = threading.Event()
+        threading.Thread(target=self._bucle, name='registro', daemon=True).start()
+        atexit.register(self._salir)
+
+    def apuntar(self, linea):
+        """Escribe la línea en el segmento abierto y devuelve (segmento, número de línea)."""
+        with self._cerrojo:
+            if self._segmento is None:
+                self._segmento = _Segmento(
+                    os.path.join(self.directorio, f'{self.prefijo}{self.pid}-{uuid.uuid4().hex[:12]}.jsonl')
+                )
+            segmento = self._segmento
+            segmento.fichero.write(linea + '\n')
+            segmento.fichero.flush()
+            if settings.REGISTRO_FSYNC:
+                os.fsync(segmento.fichero.fileno())
+            numero = segmento.lineas
+            segmento.lineas += 1
+            if segmento.lineas >= settings.REGISTRO_LOTE:
+                self._despertar.set()
+        return segmento, numero
+
+    def vaciar(self):
+        with self._cerrojo:
+            if self._segmento is not None:
+                self._pendientes.append(self._segmento)
+                self._segmento = None
+        insertados = 0
+        with self._vaciando:
+            # Un segmento con transacciones aún abiertas espera a la siguiente pasada
+            for segmento in [segmento for segmento in self._pendientes if segmento.resuelto()]:
+                # Si falla, el segmento sigue pendiente y bloqueado hasta la siguiente pasada
+                insertados += _insertar_segmento(segmento.fichero, segmento.confirmadas.__contains__)
+                _descartar(segmento.fichero)
+                self._pendientes.remove(segmento)
+        return insertados
+
+    def recuperar(self):
+        """Inserta los segmentos de procesos muertos de esta máquina y limpia sus LoteRegistro."""
+        for ruta in glob.glob(os.path.join(self.directorio, f'{self.prefijo}*.jsonl')):
+            fichero = _abrir(ruta)
+            if fichero is None:
+                continue
+            try:
+                insertados = _insertar_segmento(fichero)
+            except Exception:
+                fichero.close()
+                raise
+            _descartar(fichero)
+            logger.warning('Recuperados %s registros del segmento huérfano %s', insertados, ruta)
+        # Un proceso que muere entre borrar el fichero y su LoteRegistro lo deja huérfano
+        claves = LoteRegistro.objects.filter(clave__startswith=self.prefijo).values_list('clave', flat=True)
+        huerfanos = [clave for clave in claves if not os.path.exists(os.path.join(self.directorio, clave))]
+        LoteRegistro.objects.filter(clave__in=huerfanos).delete()
+
+    def _bucle(self):
+        while True:
+            try:
+                close_old_connections()
+                self.recuperar()
+                self.vaciar()
+            except Exception:
+                logger.exception('No se pudieron insertar los registros del spool; se reintenta en la siguiente pasada')
+            self._despertar.wait(settings.REGISTRO_INTERVALO)
+            self._despertar.clear()
+
+    def _salir(self):
+        if self.pid != os.getpid():
+            return
+        try:
+            self.vaciar()
+        except Exception:
+            logger.exception('Registros sin insertar al salir; quedan en el spool para el siguiente proceso')
+
+
+def _abrir(ruta, bloquear=False):
+    # Con bloquear=False devuelve None si el segmento es de un proceso vivo o ya se ha borrado
+    try:
+        fichero = open(ruta, 'a+', encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fichero, fcntl.LOCK_EX | (0 if bloquear else fcntl.LOCK_NB))
+    except BlockingIOError:
+        fichero.close()
+        return None
+    if os.fstat(fichero.fileno()).st_nlink == 0:
+        # Su proceso lo borró (ya insertado) entre el glob y el bloqueo
+        fichero.close()
+        return None
+    return fichero
+
+
+def _insertar_segmento(fichero, confirmada=None):
+    # `confirmada(número de línea)` dice qué líneas insertar; sin él (segmento
+    # de un proceso muerto) se insertan las que tienen su testigo en la tabla
+    clave = os.path.basename(fichero.name)
+    fichero.seek(0)
+    lineas = []
+    for numero, linea in enumerate(fichero):
+        try:
+            lineas.append((numero, json.loads(linea)))
+        except ValueError:
+            # Una línea a medias es de un proceso que murió escribiéndola, antes de su COMMIT
+            logger.warning('Línea %s incompleta en el segmento %s: %r', numero, clave, linea)
+    if confirmada is None:
+        confirmada = _con_testigo(lineas)
+    objetos = [
+        deserializado.object
+        for numero, datos in lineas if confirmada(numero)
+        for deserializado in serializers.deserialize('python', datos['registros'])
+    ]
+    with transaction.atomic():
+        # El INSERT va primero para tomar el bloqueo de escritura antes de leer;
+        # si el segmento ya estaba insertado, la restricción única lo detecta
+        try:
+            with transaction.atomic():
+                LoteRegistro.objects.create(clave=clave, registros=len(objetos))
+        except IntegrityError:
+            return 0
+        _insertar(objetos)
+    return len(objetos)
+
+
+def _con_testigo(lineas):
+    # {número de línea} cuyo movimiento testigo está en el libro, en una consulta
+    testigos = {
+        numero: (datos['testigo'][0], datetime.fromisoformat(datos['testigo'][1])) for numero, datos in lineas
+    }
+    existentes = set(MovimientoStock.objects.filter(pk__in={pk for pk, _ in testigos.values()}).values_list('pk', 'fecha'))
+    return {numero for numero, testigo in testigos.items() if testigo in existentes}.__contains__
+
+
+def _descartar(fichero):
+    # Primero el fichero y después su LoteRegistro: con el fichero aún presente,
+    # el LoteRegistro es lo que evita insertarlo dos veces
+    clave = os.path.basename(fichero.name)
+    os.unlink(fichero.name)
+    fichero.close()
+    LoteRegistro.objects.filter(clave=clave).delete()
@@ -0,0 +1,371 @@
+# audiovisuals_stock/services.py
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from auditlog.models import LogEntry
+
+from . import difusion, movimientos, registro, versiones
+from .models import (
+    Material, MaterialLog, DeudaMaterial, MovimientoStock, ResumenDeuda, UserActivity, calcular_fecha_vencimiento,
+)
+
+
+class StockInsuficiente(Exception):
+    """La cantidad pedida es mayor que la disponible en el momento de extraer."""
+
+
+class CantidadInvalida(Exception):
+    """La cantidad pedida no es un número positivo de unidades."""
+
+
+class DeudaYaSaldada(Exception):
+    """La deuda ya estaba marcada como devuelta (doble envío o devolución concurrente)."""
+
+
+class LoteInvalido(Exception):
+    """Alguna línea del lote no se puede servir; `materiales` son los ids afectados."""
+
+    def __init__(self, mensaje, materiales=()):
+        super().__init__(mensaje)
+        self.materiales = list(materiales)
+
+
+# ================ EXTRACCIÓN DE MATERIAL ================ #
+def extraer_material(material_id, usuario, cantidad):
+    """
+    Extrae `cantidad` unidades del material para `usuario` en una sola
+    transacción: descuenta el stock, registra el movimiento y suma la deuda.
+    El log se anota en registro.py, con el movimiento como testigo.
+
+    El descuento es un UPDATE condicional (cantidad >= n), así que dos
+    extracciones simultáneas nunca dejan el stock en negativo ni pierden
+    unidades. Lanza CantidadInvalida si `cantidad` < 1 y StockInsuficiente
+    si no hay unidades suficientes.
+    """
+    if cantidad < 1:
+        raise CantidadInvalida('La cantidad a extraer debe ser mayor que cero')
+    with transaction.atomic():
+        actualizados = Material.objects.filter(id=material_id, cantidad__gte=cantidad).update(
+            cantidad=F('cantidad') - cantidad
+        )
+        if not actualizados:
+            raise StockInsuficiente('La cantidad a extraer es mayor que la cantidad disponible')
+
+        extraccion = movimientos.registrar({material_id: -cantidad}, MovimientoStock.EXTRACCION, usuario)
+        log = MaterialLog(material_id=material_id, usuario=usuario, cantidad_extraida=cantidad)
+        registro.anotar(log, testigo=extraccion[0] if extraccion else None)
+        nueva = _sumar_deuda(material_id, usuario, cantidad)
+        _sumar_al_resumen(usuario.id, 1 if nueva else 0, cantidad, nueva.fecha_vencimiento if nueva else None)
+        versiones.stock_cambiado([material_id], usuario.id)
+        difusion.stock_cambiado([material_id])
+    return log
+
+
+def consulta_deuda_abierta(usuario, material_id):
+    """La deuda abierta del usuario con el material (a lo sumo una, por la restricción única parcial)."""
+    return DeudaMaterial.objects.filter(usuario=usuario, material_id=material_id, devuelta=False)
+
+
+def _sumar_deuda(material_id, usuario, cantidad):
+    # Upsert de la deuda abierta: primero UPDATE; si no hay ninguna, INSERT. La
+    # restricción única parcial (usuario, material) WHERE devuelta = false hace
+    # que una inserción concurrente falle y se reintente como UPDATE.
+    # Devuelve la deuda si se ha creado una nueva, None si se ha sumado a una existente.
+    pendientes = consulta_deuda_abierta(usuario, material_id)
+    if pendientes.update(cantidad_adeudada=F('cantidad_adeudada') + cantidad):
+        return None
+    try:
+        with transaction.atomic():
+            return DeudaMaterial.objects.create(usuario=usuario, material_id=material_id, cantidad_adeudada=cantidad)
+    except IntegrityError:
+        pendientes.update(cantidad_adeudada=F('cantidad_adeudada') + cantidad)
+        return None
+
+
+# ================ DEVOLUCIÓN DE MATERIAL ================ #
+def saldar_deuda(deuda_id, usuario):
+    """
+    Marca la deuda como devuelta y repone el stock en la misma transacción.
+    Solo la primera devolución de una deuda repone unidades; las siguientes
+    lanzan DeudaYaSaldada.
+    """
+    with transaction.atomic():
+        # El UPDATE va primero para tomar el bloqueo de escritura antes de leer
+        if not DeudaMaterial.objects.filter(id=deuda_id, usuario=usuario, devuelta=False).update(devuelta=True):
+            raise DeudaYaSaldada('La deuda ya está saldada')
+
+        deuda = DeudaMaterial.objects.values('material_id', 'cantidad_adeudada').get(id=deuda_id)
+        Material.objects.filter(id=deuda['material_id']).update(cantidad=F('cantidad') + deuda['cantidad_adeudada'])
+        movimientos.registrar({deuda['material_id']: deuda['cantidad_adeudada']}, MovimientoStock.DEVOLUCION, usuario)
+        _restar_del_resumen(usuario.id, deuda['cantidad_adeudada'], items=1)
+        versiones.stock_cambiado([deuda['material_id']], usuario.id)
+        difusion.stock_cambiado([deuda['material_id']])
+    return deuda
+
+
+def saldar_todas(usuario):
+    """
+    Salda todas las deudas abiertas del usuario con tres UPDATE y ninguna
+    lectura previa: repone el stock de cada material con una subconsulta
+    sobre su deuda abierta, marca las deudas como devueltas y vacía el
+    resumen. Las deudas solo se leen, ya con el stock bloqueado, para anotar
+    los movimientos. Devuelve el número de deudas saldadas.
+    """
+    abiertas = DeudaMaterial.objects.filter(usuario=usuario, devuelta=False)
+    with transaction.atomic():
+        versiones.stock_cambiado(abiertas.values_list('material_id', flat=True), usuario.id)
+        Material.objects.filter(id__in=abiertas.values('material_id')).update(
+            cantidad=F('cantidad') + Subquery(abiertas.filter(material=OuterRef('pk')).values('cantidad_adeudada')[:1])
+        )
+        movimientos.registrar(
+            dict(abiertas.select_for_update().values_list('material_id', 'cantidad_adeudada')),
+            MovimientoStock.DEVOLUCION, usuario,
+        )
+        difusion.stock_cambiado(abiertas.values('material_id'))
+        saldadas = abiertas.update(devuelta=True)
+        ResumenDeuda.objects.filter(usuario=usuario).update(items=0, unidades=0, proximo_vencimiento=None)
+    return saldadas
+
+
+# ================ ALTAS Y EDICIONES DE MATERIAL ================ #
+def crear_material(material, usuario):
+    """Guarda un material nuevo, anota sus unidades iniciales como compra y registra el alta."""
+    with transaction.atomic():
+        material.save()
+        compra = movimientos.registrar({material.id: material.cantidad}, MovimientoStock.COMPRA, usuario)
+        registro.anotar(
+            UserActivity(user=usuario, action='create', material=material),
+            registro.entrada_auditoria(material, LogEntry.Action.CREATE, usuario),
+            testigo=compra[0] if compra else None,  # Sin unidades no hay movimiento
+        )
+    return material
+
+
+def editar_material(form, usuario):
+    """
+    Guarda la edición de un material. El cambio de cantidad respecto a la que
+    mostraba el formulario se aplica como ajuste con un UPDATE relativo y
+    condicional, igual que una extracción: no pisa las extracciones y
+    devoluciones hechas mientras se editaba y queda anotado en el libro.
+    Lanza StockInsuficiente si el ajuste dejaría el stock en negativo. La
+    actividad y la entrada de auditoría se anotan en registro.py.
+    """
+    material = form.save(commit=False)
+    ajuste = material.cantidad - form.initial['cantidad']
+    campos = [campo for campo in form.changed_data if campo != 'cantidad']
+    # El material tal como lo mostraba el formulario, para la entrada de auditoría
+    anterior = Material(id=material.id, **{
+        Material._meta.get_field(campo).attname: form.initial[campo] for campo in form.changed_data
+    })
+    testigo = None  # Sin ajuste no hay fila nueva: el registro va en la transacción
+    with transaction.atomic():
+        if ajuste:
+            if not Material.objects.filter(id=material.id, cantidad__gte=-ajuste).update(cantidad=F('cantidad') + ajuste):
+                raise StockInsuficiente('El ajuste dejaría el stock en negativo')
+            testigo, = movimientos.registrar({material.id: ajuste}, MovimientoStock.AJUSTE, usuario)
+            versiones.stock_cambiado([material.id])
+            difusion.stock_cambiado([material.id])
+        if campos:
+            material.save(update_fields=campos)
+        if form.changed_data:
+            registro.anotar(
+                UserActivity(user=usuario, action='update', material=material),
+                registro.entrada_auditoria(material, LogEntry.Action.UPDATE, usuario, anterior, form.changed_data),
+                testigo=testigo,
+            )
+    return material
+
+
+# ================ LOTES (KITS) ================ #
+def agrupar_lineas(lineas):
+    """Suma las cantidades de un mismo material: [(id, n), ...] -> {id: total}."""
+    totales = defaultdict(int)
+    for material_id, cantidad in lineas:
+        material_id, cantidad = int(material_id), int(cantidad)
+        if cantidad < 1:
+            raise LoteInvalido('Las cantidades deben ser mayores que cero', [material_id])
+        totales[material_id] += cantidad
+    if not totales:
+        raise LoteInvalido('El lote está vacío')
+    return dict(totales)
+
+
+def extraer_lote(usuario, lineas):
+    """
+    Extrae todas las líneas [(material_id, cantidad), ...] o ninguna.
+
+    El stock de todo el lote se comprueba y descuenta con un único UPDATE
+    condicional; si alguna fila no tiene unidades suficientes la transacción
+    se deshace entera. Los movimientos se insertan con bulk_create, los logs
+    se anotan en registro.py y las deudas se actualizan con un bulk_update más
+    un bulk_create para las nuevas.
+    """
+    totales = agrupar_lineas(lineas)
+    ids = list(totales)
+
+    try:
+        with transaction.atomic():
+            suficiente = Q()
+            for material_id, cantidad in totales.items():
+                suficiente |= Q(id=material_id, cantidad__gte=cantidad)
+            descuento = Case(*[When(id=material_id, then=Value(cantidad)) for material_id, cantidad in totales.items()])
+            actualizados = Material.objects.filter(suficiente).update(cantidad=F('cantidad') - descuento)
+            if actualizados != len(ids):
+                raise LoteInvalido('No hay stock suficiente para todo el lote')
+
+            logs = [
+                MaterialLog(material_id=material_id, usuario=usuario, cantidad_extraida=cantidad)
+                for material_id, cantidad in totales.items()
+            ]
+            extracciones = movimientos.registrar(
+                {material_id: -cantidad for material_id, cantidad in totales.items()}, MovimientoStock.EXTRACCION, usuario,
+            )
+            registro.anotar(*logs, testigo=extracciones[0])
+
+            abiertas = {
+                deuda.material_id: deuda
+                for deuda in DeudaMaterial.objects.filter(usuario=usuario, material_id__in=ids, devuelta=False)
+            }
+            for material_id, deuda in abiertas.items():
+                deuda.cantidad_adeudada += totales[material_id]
+            DeudaMaterial.objects.bulk_update(abiertas.values(), ['cantidad_adeudada'])
+            vencimiento = calcular_fecha_vencimiento()
+            nuevas = DeudaMaterial.objects.bulk_create([
+                DeudaMaterial(usuario=usuario, material_id=material_id, cantidad_adeudada=cantidad, fecha_vencimiento=vencimiento)
+                for material_id, cantidad in totales.items() if material_id not in abiertas
+            ])
+            _sumar_al_resumen(usuario.id, len(nuevas), sum(totales.values()), vencimiento if nuevas else None)
+            versiones.stock_cambiado(ids, usuario.id)
+            difusion.stock_cambiado(ids)
+    except LoteInvalido as error:
+        # Fuera del atomic el UPDATE parcial ya está deshecho y se ve el stock real
+        error.materiales = _lineas_sin_stock(totales)
+        raise
+    return logs
+
+
+def _lineas_sin_stock(totales):
+    disponibles = dict(Material.objects.filter(id__in=list(totales)).values_list('id', 'cantidad'))
+    return [material_id for material_id, cantidad in totales.items() if disponibles.get(material_id, 0) < cantidad]
+
+
+def devolver_lote(usuario, lineas):
+    """
+    Devuelve todas las líneas [(material_id, cantidad), ...] o ninguna.
+
+    Un único UPDATE descuenta lo devuelto de las deudas abiertas del usuario
+    (marcándolas como devueltas cuando se devuelve todo lo adeudado) y otro
+    repone el stock. Cada línea debe tener una deuda abierta que la cubra.
+    """
+    totales = agrupar_lineas(lineas)
+    ids = list(totales)
+
+    try:
+        with transaction.atomic():
+            cubierta = Q()
+            completa = Q()
+            for material_id, cantidad in totales.items():
+                cubierta |= Q(material_id=material_id, cantidad_adeudada__gte=cantidad)
+                completa |= Q(material_id=material_id, cantidad_adeudada=cantidad)
+            # Las deudas devueltas del todo conservan la cantidad original como histórico
+            resto = Case(
+                When(completa, then=F('cantidad_adeudada')),
+                *[When(material_id=material_id, then=F('cantidad_adeudada') - cantidad) for material_id, cantidad in totales.items()],
+            )
+            actualizadas = DeudaMaterial.objects.filter(cubierta, usuario=usuario, devuelta=False).update(
+                cantidad_adeudada=resto,
+                devuelta=Case(When(completa, then=Value(True)), default=Value(False)),
+            )
+            if actualizadas != len(ids):
+                raise LoteInvalido('Alguna línea no corresponde a una deuda pendiente')
+
+            Material.objects.filter(id__in=ids).update(
+                cantidad=F('cantidad') + Case(*[When(id=material_id, then=Value(cantidad)) for material_id, cantidad in totales.items()])
+            )
+            movimientos.registrar(totales, MovimientoStock.DEVOLUCION, usuario)
+            _restar_del_resumen(usuario.id, sum(totales.values()))
+            versiones.stock_cambiado(ids, usuario.id)
+            difusion.stock_cambiado(ids)
+    except LoteInvalido as error:
+        error.materiales = _lineas_sin_deuda(usuario, totales)
+        raise
+    return totales
+
+
+def _lineas_sin_deuda(usuario, totales):
+    adeudado = dict(
+        DeudaMaterial.objects.filter(usuario=usuario, material_id__in=list(totales), devuelta=False)
+        .values_list('material_id', 'cantidad_adeudada')
+    )
+    return [material_id for material_id, cantidad in totales.items() if adeudado.get(material_id, 0) < cantidad]
+
+
+# ================ RESUMEN DE DEUDAS ================ #
+def _abiertas_del_usuario(usuario=None):
+    # Sin usuario, las de la fila del resumen que se actualiza (subconsulta)
+    return DeudaMaterial.objects.filter(usuario=OuterRef('usuario') if usuario is None else usuario, devuelta=False)
+
+
+def consulta_proximo_vencimiento(usuario=None):
+    """Vencimiento más próximo de las deudas abiertas del usuario (sin usuario, como subconsulta del resumen)."""
+    return _abiertas_del_usuario(usuario).order_by('fecha_vencimiento').values('fecha_vencimiento')[:1]
+
+
+def _sumar_al_resumen(usuario_id, items, unidades, vencimiento=None):
+    # Suma una extracción al resumen con un único UPDATE (o INSERT si es la
+    # primera deuda del usuario). `vencimiento` es el de las deudas nuevas.
+    cambios = {'items': F('items') + items, 'unidades': F('unidades') + unidades}
+    if vencimiento:
+        cambios['proximo_vencimiento'] = Case(
+            When(Q(proximo_vencimiento__isnull=True) | Q(proximo_vencimiento__gt=vencimiento), then=Value(vencimiento)),
+            default=F('proximo_vencimiento'),
+        )
+    if ResumenDeuda.objects.filter(usuario_id=usuario_id).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            ResumenDeuda.objects.create(usuario_id=usuario_id, items=items, unidades=unidades, proximo_vencimiento=vencimiento)
+    except IntegrityError:
+        ResumenDeuda.objects.filter(usuario_id=usuario_id).update(**cambios)
+
+
+def _restar_del_resumen(usuario_id, unidades, items=None):
+    # Resta una devolución. El próximo vencimiento (y el número de deudas, si
+    # no se conoce) se recalcula en el mismo UPDATE con una subconsulta sobre
+    # las deudas abiertas del usuario, que usa el índice (usuario, devuelta).
+    cambios = {
+        'unidades': F('unidades') - unidades,
+        'proximo_vencimiento': Subquery(consulta_proximo_vencimiento()),
+    }
+    if items is None:
+        cambios['items'] = Coalesce(
+            Subquery(_abiertas_del_usuario().values('usuario').annotate(total=Count('id')).values('total')), 0,
+        )
+    else:
+        cambios['items'] = F('items') - items
+    if not ResumenDeuda.objects.filter(usuario_id=usuario_id).update(**cambios):
+        recalcular_resumen(usuario_id)
+
+
+def calcular_resumenes(usuarios=None):
+    """Resumen calculado desde DeudaMaterial: {usuario_id: (items, unidades, próximo vencimiento)}."""
+    abiertas = DeudaMaterial.objects.filter(devuelta=False)
+    if usuarios is not None:
+        abiertas = abiertas.filter(usuario_id__in=usuarios)
+    return {
+        fila['usuario_id']: (fila['items'], fila['unidades'], fila['proximo'])
+        for fila in abiertas.values('usuario_id').annotate(
+            items=Count('id'), unidades=Sum('cantidad_adeudada'), proximo=Min('fecha_vencimiento'),
+        ).order_by()
+    }
+
+
+def recalcular_resumen(usuario_id):
+    items, unidades, proximo = calcular_resumenes([usuario_id]).get(usuario_id, (0, 0, None))
+    ResumenDeuda.objects.update_or_create(
+        usuario_id=usuario_id, defaults={'items': items, 'unidades': unidades, 'proximo_vencimiento': proximo},
+    )
+    versiones.subir('usuario', [usuario_id])
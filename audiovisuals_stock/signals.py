@@ -0,0 +1,83 @@
+# audiovisuals_stock/signals.py
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import busqueda, catalogos, difusion, kiosco, versiones
+from .models import CustomUser, DeudaMaterial, Material, MaterialLog, Proveedor, TipoMaterial, UserProfile
+
+
+# ================ ÍNDICE DE BÚSQUEDA ================ #
+@receiver(post_save, sender=Material)
+def indexar_material(sender, instance, **kwargs):
+    busqueda.indexar([instance.pk])
+
+
+@receiver(post_delete, sender=Material)
+def desindexar_material(sender, instance, **kwargs):
+    busqueda.eliminar([instance.pk])
+
+
+# ================ CACHÉ DEL KIOSCO ================ #
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+def invalidar_codigos(sender, instance, **kwargs):
+    # Los códigos anteriores a la edición no se conocen aquí: se vacía entera
+    kiosco.cache.olvidar()
+
+
+# ================ STOCK EN VIVO ================ #
+@receiver(post_save, sender=Material)
+def difundir_stock(sender, instance, **kwargs):
+    # Altas y ediciones (formularios, admin); los servicios publican sus UPDATE
+    difusion.stock_cambiado([instance.pk])
+
+
+# ================ TABLAS DE REFERENCIA ================ #
+@receiver(post_save, sender=TipoMaterial)
+@receiver(post_delete, sender=TipoMaterial)
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def invalidar_catalogo(sender, **kwargs):
+    catalogos.invalidar(sender)
+    versiones.subir('catalogo')  # El catálogo muestra los nombres de tipo y proveedor
+
+
+# ================ VERSIONES DE LA CACHÉ DE PÁGINAS ================ #
+# Las escrituras por QuerySet.update() o bulk_create no envían señales: los
+# servicios de stock suben las versiones ellos mismos (versiones.stock_cambiado)
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+def version_material(sender, instance, **kwargs):
+    versiones.stock_cambiado([instance.pk])
+
+
+# Sin post_delete en logs y deudas: obligaría a Django a leer cada fila antes
+# de los borrados en masa (purgas, borrados en cascada)
+@receiver(post_save, sender=MaterialLog)
+@receiver(post_save, sender=DeudaMaterial)
+def version_movimiento(sender, instance, **kwargs):
+    versiones.stock_cambiado([instance.material_id], instance.usuario_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def version_usuario(sender, instance, **kwargs):
+    versiones.subir('usuario', [instance.pk])
+
+
+@receiver(post_save, sender=UserProfile)
+def version_perfil(sender, instance, **kwargs):
+    versiones.subir('usuario', [instance.user_id])
+
+
+# ================ CONEXIONES SQLITE ================ #
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    # WAL: las lecturas no esperan a las escrituras. Son ajustes por conexión
+    # (journal_mode queda además guardado en el fichero)
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, valor in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {valor}')
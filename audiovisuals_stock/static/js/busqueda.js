@@ -0,0 +1,67 @@
+/*
+Template Name: Tandem Stock
+File: Búsqueda de materiales (typeahead del buscador de la cabecera)
+*/
+
+
+$(document).ready(function() {
+    var $entrada = $('#search-wrap .search-input');
+    var $resultados = $('#search-wrap .search-resultados');
+    if (!$entrada.length || !$entrada.data('url')) {
+        return;
+    }
+
+    var temporizador = null;
+    var peticion = null;
+
+    function mostrar(resultados) {
+        $resultados.empty();
+        if (!resultados.length) {
+            $resultados.append($('<span class="dropdown-item-text text-muted">').text('Sin resultados'));
+        }
+        $.each(resultados, function(_, material) {
+            $resultados.append(
+                $('<a class="dropdown-item">').attr('href', material.url)
+                    .append($('<strong>').text(material.referencia))
+                    .append(document.createTextNode(' ' + material.nombre + ' '))
+                    .append($('<small class="text-muted">').text(material.numero_serie))
+            );
+        });
+        $resultados.addClass('show');
+    }
+
+    $entrada.on('input', function() {
+        var texto = $.trim($entrada.val());
+        clearTimeout(temporizador);
+        if (texto.length < 2) {
+            $resultados.removeClass('show').empty();
+            return;
+        }
+        // Se espera a que el usuario deje de escribir y se cancela la petición anterior
+        temporizador = setTimeout(function() {
+            if (peticion) {
+                peticion.abort();
+            }
+            peticion = $.getJSON($entrada.data('url'), {q: texto}, function(datos) {
+                mostrar(datos.resultados);
+            });
+        }, 150);
+    });
+
+    $entrada.on('keydown', function(evento) {
+        if (evento.key === 'Enter') {
+            var $primero = $resultados.find('a').first();
+            if ($primero.length) {
+                window.location = $primero.attr('href');
+            }
+        } else if (evento.key === 'Escape') {
+            $resultados.removeClass('show').empty();
+        }
+    });
+
+    $(document).on('click', function(evento) {
+        if (!$(evento.target).closest('#search-wrap').length) {
+            $resultados.removeClass('show');
+        }
+    });
+});
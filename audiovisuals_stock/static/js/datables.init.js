@@ -9,16 +9,84 @@ File: Datatable
 $(document).ready(function() {
     $('#datatable').DataTable();
 
-    //Buttons examples
-    var table = $('#datatable-buttons').DataTable({
-        lengthChange: false,
-        buttons: ['copy', 'excel', 'pdf', 'colvis']
-    });
+    //Buttons examples (el paquete exportacion.js solo se carga donde hay botones)
+    if ($('#datatable-buttons').length) {
+        var table = $('#datatable-buttons').DataTable({
+            lengthChange: false,
+            buttons: ['copy', 'excel', 'pdf', 'colvis']
+        });
 
-    table.buttons().container()
-        .appendTo('#datatable-buttons_wrapper .col-md-6:eq(0)');
+        table.buttons().container()
+            .appendTo('#datatable-buttons_wrapper .col-md-6:eq(0)');
+    }
 
     $(".dataTables_length select").addClass('form-select form-select-sm');
 
+    // Catálogo de materiales: búsqueda, orden y paginación en el servidor.
+    // Si se pide la página siguiente a la última servida se envía el cursor
+    // (keyset); cualquier otro salto usa el desplazamiento normal.
+    var $materiales = $('#datatable-materiales');
+    if ($materiales.length) {
+        var ultimaPeticion = null;
+        var siguienteCursor = null;
+
+        var tablaMateriales = $materiales.DataTable({
+            serverSide: true,
+            processing: true,
+            searchDelay: 300,
+            pageLength: 25,
+            ajax: function (data, callback) {
+                var params = {
+                    draw: data.draw,
+                    start: data.start,
+                    length: data.length,
+                    'search[value]': data.search.value,
+                    'order[0][column]': data.order.length ? data.order[0].column : 0,
+                    'order[0][dir]': data.order.length ? data.order[0].dir : 'asc'
+                };
+                if (ultimaPeticion && siguienteCursor &&
+                    data.start === ultimaPeticion.start + ultimaPeticion.length &&
+                    params['search[value]'] === ultimaPeticion['search[value]'] &&
+                    params['order[0][column]'] === ultimaPeticion['order[0][column]'] &&
+                    params['order[0][dir]'] === ultimaPeticion['order[0][dir]']) {
+                    params.cursor = siguienteCursor;
+                }
+                $.getJSON($materiales.data('url'), params, function (json) {
+                    ultimaPeticion = params;
+                    siguienteCursor = json.next_cursor;
+                    callback(json);
+                });
+            },
+            // Los textos los escriben los usuarios: se insertan escapados, nunca como HTML
+            columns: [
+                { data: 'referencia', render: $.fn.dataTable.render.text() },
+                { data: 'nombre', render: $.fn.dataTable.render.text() },
+                {
+                    data: 'cantidad',
+                    render: function (cantidad, tipo, fila) {
+                        // stock_vivo.js actualiza la cifra cuando cambia el stock
+                        return '<span data-stock-material="' + fila.id + '">' + cantidad + '</span>';
+                    }
+                },
+                { data: 'tipo', orderable: false, render: $.fn.dataTable.render.text() },
+                { data: 'fecha_compra' },
+                { data: 'proveedor', orderable: false, render: $.fn.dataTable.render.text() },
+                { data: 'numero_serie', render: $.fn.dataTable.render.text() },
+                {
+                    data: 'url',
+                    orderable: false,
+                    render: function (url) {
+                        return '<a href="' + url + '"><i class="fas fa-edit"></i> </a>';
+                    }
+                }
+            ]
+        });
+
+        // Se han perdido cambios de stock en vivo: se vuelve a pedir la página actual
+        $(document).on('stock:recargar', function () {
+            tablaMateriales.ajax.reload(null, false);
+        });
+    }
+
 
 } );
\ No newline at end of file
@@ -0,0 +1,33 @@
+/*
+Template Name: Tandem Stock
+File: Stock en vivo (Server-Sent Events, solo cuando la aplicación se sirve por ASGI)
+*/
+
+
+$(document).ready(function() {
+    var $origen = $('[data-stock-eventos]').filter(function() {
+        return !!$(this).attr('data-stock-eventos');
+    }).first();
+    if (!$origen.length || !window.EventSource) {
+        return;
+    }
+
+    // Instante del último cambio aplicado por material: los eventos llegan
+    // de varias transacciones y uno más antiguo no debe pisar a otro más nuevo
+    var aplicados = {};
+    var fuente = new EventSource($origen.attr('data-stock-eventos'));
+
+    fuente.addEventListener('stock', function(evento) {
+        $.each(JSON.parse(evento.data), function(_, cambio) {
+            if (aplicados[cambio.id] && aplicados[cambio.id] >= cambio.ts) {
+                return;
+            }
+            aplicados[cambio.id] = cambio.ts;
+            $('[data-stock-material="' + cambio.id + '"]').text(cambio.cantidad);
+        });
+    });
+
+    fuente.addEventListener('recargar', function() {
+        $(document).trigger('stock:recargar');
+    });
+});
@@ -0,0 +1,19 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from audiovisuals_stock import estaticos
+
+register = template.Library()
+
+
+@register.simple_tag
+def paquete_css(nombre):
+    return format_html_join(
+        '\n', '<link rel="stylesheet" type="text/css" href="{}">', ((static(ruta),) for ruta in estaticos.rutas(nombre))
+    )
+
+
+@register.simple_tag
+def paquete_js(nombre):
+    return format_html_join('\n', '<script src="{}"></script>', ((static(ruta),) for ruta in estaticos.rutas(nombre)))
@@ -0,0 +1,141 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import kiosco, services
+from .datos_prueba import crear_usuarios
+from .models import DeudaMaterial, Material, MaterialLog, MovimientoStock, Proveedor, TipoMaterial
+
+
+class ExtraccionCantidadTests(TestCase):
+    """Extraer 0 unidades se rechaza antes de tocar el stock (antes daba un 500)."""
+
+    def setUp(self):
+        self.usuario, = crear_usuarios(1, prefijo='test')
+        self.material = services.crear_material(Material(
+            referencia='T1', nombre='Test', cantidad=5, tipo=TipoMaterial.objects.create(nombre='test'),
+            creadopor=self.usuario, fecha_compra=date.today(),
+            proveedor=Proveedor.objects.create(nombre='test'), numero_serie='TSN1',
+        ), self.usuario)
+
+    def test_servicio_rechaza_cantidad_cero(self):
+        with self.assertRaises(services.CantidadInvalida):
+            services.extraer_material(self.material.id, self.usuario, 0)
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.cantidad, 5)
+        self.assertFalse(MovimientoStock.objects.filter(tipo=MovimientoStock.EXTRACCION).exists())
+
+    def test_vista_muestra_error_con_cantidad_cero(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.post(
+            reverse('extraer_material', kwargs={'material_id': self.material.id}), {'cantidad_extraida': 0},
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.context['form'].errors)
+        self.assertFalse(MaterialLog.objects.exists())
+
+    def test_extraccion_valida(self):
+        services.extraer_material(self.material.id, self.usuario, 2)
+        self.material.refresh_from_db()
+        self.assertEqual(self.material.cantidad, 3)
+        self.assertEqual(MaterialLog.objects.get().cantidad_extraida, 2)
+
+
+class BusquedaCatalogoTests(TestCase):
+    """El buscador del catálogo encuentra palabras por prefijo usando el índice FTS5."""
+
+    def setUp(self):
+        self.usuario, = crear_usuarios(1, prefijo='test')
+        tipo, proveedor = TipoMaterial.objects.create(nombre='test'), Proveedor.objects.create(nombre='test')
+        for referencia, nombre in (('CAM-01', 'Cámara réflex'), ('TRI-01', 'Trípode de cámara'), ('MIC-01', 'Micrófono')):
+            services.crear_material(Material(
+                referencia=referencia, nombre=nombre, cantidad=1, tipo=tipo, creadopor=self.usuario,
+                fecha_compra=date.today(), proveedor=proveedor, numero_serie=referencia,
+            ), self.usuario)
+        self.client.force_login(self.usuario)
+
+    def _buscar(self, termino):
+        respuesta = self.client.get(reverse('list_material_json'), {'search[value]': termino})
+        self.assertEqual(respuesta.status_code, 200)
+        return sorted(fila['referencia'] for fila in respuesta.json()['data'])
+
+    def test_prefijo_sin_acentos(self):
+        self.assertEqual(self._buscar('camar'), ['CAM-01', 'TRI-01'])
+
+    def test_todas_las_palabras(self):
+        self.assertEqual(self._buscar('tripode cam'), ['TRI-01'])
+
+    def test_sin_coincidencias(self):
+        self.assertEqual(self._buscar('zzz'), [])
+
+
+class KioscoCodigoTests(TestCase):
+    """El kiosco no elige al azar entre números de serie repetidos ni busca códigos vacíos."""
+
+    def setUp(self):
+        kiosco.cache.olvidar()
+        self.usuario, = crear_usuarios(1, prefijo='test')
+        tipo, proveedor = TipoMaterial.objects.create(nombre='test'), Proveedor.objects.create(nombre='test')
+        self.materiales = [
+            services.crear_material(Material(
+                referencia=f'K{i}', nombre='Kiosco', cantidad=1, tipo=tipo, creadopor=self.usuario,
+                fecha_compra=date.today(), proveedor=proveedor, numero_serie='KSN-REPETIDO',
+            ), self.usuario)
+            for i in range(2)
+        ]
+        self.client.force_login(self.usuario)
+
+    def _escanear(self, codigo):
+        return self.client.post(reverse('kiosco_escanear'), {'codigo': codigo, 'accion': 'extraer'})
+
+    def test_numero_serie_repetido_es_ambiguo(self):
+        respuesta = self._escanear('KSN-REPETIDO')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta.json()['materiales'], sorted(m.id for m in self.materiales))
+        self.assertFalse(MaterialLog.objects.exists())
+
+    def test_codigo_vacio(self):
+        for codigo in ('', '   '):
+            self.assertEqual(self._escanear(codigo).status_code, 400)
+
+    def test_referencia_unica(self):
+        respuesta = self._escanear('K1')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['resultado'], 'extraido')
+
+
+class CalendarioCambioDeDiaTests(TestCase):
+    """Una deuda pasa a vencida a medianoche aunque no cambie ningún dato: no vale el 304 de ayer."""
+
+    def setUp(self):
+        self.usuario, = crear_usuarios(1, prefijo='test')
+        material = services.crear_material(Material(
+            referencia='C1', nombre='Calendario', cantidad=1, tipo=TipoMaterial.objects.create(nombre='test'),
+            creadopor=self.usuario, fecha_compra=date.today(), proveedor=Proveedor.objects.create(nombre='test'),
+            numero_serie='CSN1',
+        ), self.usuario)
+        self.hoy = timezone.localdate()
+        DeudaMaterial.objects.create(usuario=self.usuario, material=material, cantidad_adeudada=1, fecha_vencimiento=self.hoy)
+        self.client.force_login(self.usuario)
+
+    def _eventos(self, dia, **cabeceras):
+        inicio = self.hoy - timedelta(days=7)
+        with mock.patch('django.utils.timezone.localdate', return_value=dia):
+            return self.client.get(reverse('calendario_eventos'), {
+                'start': inicio.isoformat(), 'end': (inicio + timedelta(days=14)).isoformat(),
+            }, **cabeceras)
+
+    def test_revalidacion_al_dia_siguiente(self):
+        respuesta = self._eventos(self.hoy)
+        vencimiento, = [evento for evento in respuesta.json() if evento['id'].startswith('v')]
+        self.assertEqual(vencimiento['className'], 'bg-warning')
+        cabeceras = {'HTTP_IF_NONE_MATCH': respuesta['ETag'], 'HTTP_IF_MODIFIED_SINCE': respuesta['Last-Modified']}
+        self.assertEqual(self._eventos(self.hoy, **cabeceras).status_code, 304)
+
+        manana = self._eventos(self.hoy + timedelta(days=1), **cabeceras)
+        self.assertEqual(manana.status_code, 200)
+        vencimiento, = [evento for evento in manana.json() if evento['id'].startswith('v')]
+        self.assertEqual(vencimiento['className'], 'bg-danger')
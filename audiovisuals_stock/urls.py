@@ -12,14 +12,28 @@ urlpatterns = [
     path('perfil/editar/', views.edit_profile, name='edit_profile'),
     path('crear-material/', views.subir_material, name='crear_material'),
     path('list-material/', views.lista_materiales, name='list_material'),
+    path('list-material/json/', views.lista_materiales_json, name='list_material_json'),
+    path('buscar/', views.buscar_materiales, name='buscar_materiales'),
     path('material/<int:material_id>/', views.detalle_material, name='detalle_material'),
     path('editar-material/<int:material_id>/', views.editar_material, name='editar_material'),
     path('extraer/<int:material_id>/', views.extraer_material, name='extraer_material'),
     path('material/<int:material_id>/log/', views.log_material, name='log_material'),
+    path('material/<int:material_id>/log/json/', views.log_material_json, name='log_material_json'),
+    path('lote/extraer/', views.extraer_lote, name='extraer_lote'),
+    path('lote/devolver/', views.devolver_lote, name='devolver_lote'),
+    path('kiosco/', views.escaner, name='kiosco'),
+    path('kiosco/escanear/', views.escanear, name='kiosco_escanear'),
+    path('kits/', views.lista_kits, name='lista_kits'),
+    path('kits/<int:kit_id>/extraer/', views.extraer_kit, name='extraer_kit'),
+    path('exportar/<str:conjunto>/', views.exportar, name='exportar'),
     path('agregar-tipo-material/', views.agregar_tipo_material, name='agregar_tipo_material'),
     path('agregar-proveedor/', views.agregar_proveedor, name='agregar_proveedor'),
     path('saldar-deuda/<int:deuda_id>/', views.saldar_deuda, name='saldar_deuda'),
     path('calendar/', views.calendar, name='calendar'),
+    path('calendar/eventos/', views.calendario_eventos, name='calendario_eventos'),
+    path('instrumentacion/', views.instrumentacion, name='instrumentacion'),
+    path('informes/uso/', views.informe_uso, name='informe_uso'),
+    path('informes/uso/json/', views.informe_uso_json, name='informe_uso_json'),
     path('', views.home, name='home'),  # Ruta para la página de inicio
 ]
 handler404 = 'audiovisuals_stock.views.error_404'  # Ajusta esto a tu vista personalizada
\ No newline at end of file
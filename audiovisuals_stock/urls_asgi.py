@@ -0,0 +1,24 @@
+from django.urls import path
+
+from . import urls, views_async
+
+# URLconf para asgi.py: las mismas rutas que urls.py, con las vistas de lectura
+# asíncronas de views_async.py en lugar de las síncronas (y la exportación, que
+# así se envía por bloques en vez de leerse entera en memoria)
+VISTAS_ASYNC = {
+    'view_profile': views_async.view_profile,
+    'list_material_json': views_async.lista_materiales_json,
+    'detalle_material': views_async.detalle_material,
+    'log_material': views_async.log_material,
+    'log_material_json': views_async.log_material_json,
+    'exportar': views_async.exportar,
+}
+
+urlpatterns = [
+    # Solo bajo ASGI: conexiones largas de Server-Sent Events
+    path('stock/eventos/', views_async.eventos_stock, name='stock_eventos'),
+] + [
+    path(str(patron.pattern), VISTAS_ASYNC[patron.name], name=patron.name) if getattr(patron, 'name', None) in VISTAS_ASYNC else patron
+    for patron in urls.urlpatterns
+]
+handler404 = urls.handler404
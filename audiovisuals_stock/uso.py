@@ -0,0 +1,217 @@
+# audiovisuals_stock/uso.py
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .movimientos import MARGEN_INSTANTANEA
+from .models import (
+    DeudaMaterial, MarcaAgregacion, Material, MovimientoStock, PrestatarioDiario, TipoMaterial,
+    UsoDiarioMaterial, UsoDiarioTipo,
+)
+
+
+# ================ AGREGADOS DE USO ================ #
+# Uso diario por material y por tipo (unidades extraídas y devueltas,
+# extracciones, pico de unidades prestadas a la vez) y quién extrajo cada
+# material cada día. manage.py agregar_uso (cada pocos minutos) los rellena a
+# partir del libro de movimientos desde la última marca (MarcaAgregacion), así
+# que el coste de cada pasada depende de lo nuevo, no del historial.
+#
+# Lo prestado de un material sube con cada extracción y baja con cada
+# devolución. Se arrastra de un día al siguiente con prestado_final; la
+# primera vez que aparece un material (o un tipo) se calcula con sus deudas
+# abiertas menos lo que aún queda por agregar.
+#
+# Los informes (semana, mes) se agrupan desde las filas diarias del rango
+# pedido: el pico de un periodo es el mayor de sus picos diarios.
+
+CLAVE_MARCA = 'uso'
+PRESTAMOS = (MovimientoStock.EXTRACCION, MovimientoStock.DEVOLUCION)
+LOTE = 1000
+
+PERIODOS = {'dia': None, 'semana': TruncWeek, 'mes': TruncMonth}
+AGRUPACIONES = {
+    'material': (UsoDiarioMaterial, 'material', {'referencia': 'material__referencia', 'nombre': 'material__nombre'}),
+    'tipo': (UsoDiarioTipo, 'tipo', {'nombre': 'tipo__nombre'}),
+}
+MAX_DIAS = 366
+LIMITE_FILAS = 1000
+
+_CONTADORES = ('unidades_extraidas', 'unidades_devueltas', 'extracciones')
+
+
+def agregar(lote=LOTE, corte=None):
+    """
+    Agrega los movimientos de préstamo posteriores a la marca, por lotes de
+    id, cada lote en su transacción junto con la marca. Solo llega hasta los
+    movimientos de hace unos minutos (ver movimientos.MARGEN_INSTANTANEA).
+    Devuelve el número de movimientos agregados.
+    """
+    corte = corte or timezone.now() - MARGEN_INSTANTANEA
+    tope = MovimientoStock.objects.filter(fecha__lte=corte).order_by('-id').values_list('id', flat=True).first()
+    MarcaAgregacion.objects.get_or_create(clave=CLAVE_MARCA)
+    agregados = 0
+    while tope:
+        with transaction.atomic():
+            # El UPDATE va primero para tomar el bloqueo de escritura antes de leer
+            MarcaAgregacion.objects.filter(clave=CLAVE_MARCA).update(fecha_actualizacion=timezone.now())
+            marca = MarcaAgregacion.objects.get(clave=CLAVE_MARCA)
+            filas = list(
+                MovimientoStock.objects.filter(id__gt=marca.ultimo_id, id__lte=tope, tipo__in=PRESTAMOS)
+                .order_by('id').values_list('id', 'material_id', 'material__tipo_id', 'usuario_id', 'cantidad', 'fecha')[:lote]
+            )
+            if not filas:
+                marca.ultimo_id = max(marca.ultimo_id, tope)
+                marca.save(update_fields=['ultimo_id'])
+                return agregados
+            _agregar_lote(filas, marca.ultimo_id)
+            marca.ultimo_id = filas[-1][0]
+            marca.save(update_fields=['ultimo_id'])
+        agregados += len(filas)
+    return agregados
+
+
+def reconstruir():
+    """Borra los agregados y la marca; la siguiente pasada recorre el libro desde el principio."""
+    with transaction.atomic():
+        MarcaAgregacion.objects.filter(clave=CLAVE_MARCA).update(ultimo_id=0)
+        UsoDiarioMaterial.objects.all().delete()
+        UsoDiarioTipo.objects.all().delete()
+        PrestatarioDiario.objects.all().delete()
+
+
+def _agregar_lote(filas, desde_id):
+    tipos_material = {material_id: tipo_id for _, material_id, tipo_id, _, _, _ in filas}
+    prestado_material = _prestado(UsoDiarioMaterial, Material, 'material', set(tipos_material), desde_id)
+    prestado_tipo = _prestado(UsoDiarioTipo, TipoMaterial, 'material__tipo', set(tipos_material.values()), desde_id)
+
+    por_material, por_tipo, prestatarios = {}, {}, set()
+    for _, material_id, tipo_id, usuario_id, cantidad, fecha in filas:
+        dia = timezone.localdate(fecha)
+        _acumular(por_material, prestado_material, material_id, dia, cantidad)
+        _acumular(por_tipo, prestado_tipo, tipo_id, dia, cantidad)
+        if cantidad < 0 and usuario_id is not None:
+            prestatarios.add((dia, material_id, tipo_id, usuario_id))
+
+    _guardar(UsoDiarioMaterial, 'material', por_material, tipos_material)
+    _guardar(UsoDiarioTipo, 'tipo', por_tipo)
+    PrestatarioDiario.objects.bulk_create([
+        PrestatarioDiario(dia=dia, material_id=material_id, tipo_id=tipo_id, usuario_id=usuario_id)
+        for dia, material_id, tipo_id, usuario_id in prestatarios
+    ], ignore_conflicts=True)
+
+
+def consulta_prestado_final(modelo, campo, valor):
+    """prestado_final del último día agregado en `modelo` para `campo` = `valor`."""
+    return modelo.objects.filter(**{campo: valor}).order_by('-dia').values('prestado_final')[:1]
+
+
+def _prestado(modelo, entidad, ruta_material, ids, desde_id):
+    # {id: unidades prestadas tras el movimiento desde_id}: el prestado_final
+    # del último día agregado o, si no hay ninguno, deudas abiertas de ahora más
+    # los movimientos aún sin agregar (una sola consulta: el mismo instante)
+    campo = ruta_material.split('__')[-1]
+    ultimo = consulta_prestado_final(modelo, campo, OuterRef('pk'))
+    prestado = dict(entidad.objects.filter(id__in=ids).annotate(nivel=Subquery(ultimo)).values_list('id', 'nivel'))
+    faltan = [entidad_id for entidad_id, nivel in prestado.items() if nivel is None]
+    if faltan:
+        abiertas = DeudaMaterial.objects.filter(**{ruta_material: OuterRef('pk')}, devuelta=False)
+        pendientes = MovimientoStock.objects.filter(**{ruta_material: OuterRef('pk')}, id__gt=desde_id, tipo__in=PRESTAMOS)
+        prestado.update(
+            entidad.objects.filter(id__in=faltan).annotate(
+                abiertas=Coalesce(Subquery(_suma(abiertas, ruta_material, 'cantidad_adeudada')), 0),
+                pendientes=Coalesce(Subquery(_suma(pendientes, ruta_material, 'cantidad')), 0),
+            ).values_list('id', F('abiertas') + F('pendientes'))
+        )
+    return prestado
+
+
+def _suma(queryset, agrupacion, campo):
+    return queryset.values(agrupacion).annotate(total=Sum(campo)).values('total')
+
+
+def _acumular(acumulados, prestado, clave, dia, cantidad):
+    fila = acumulados.get((clave, dia))
+    if fila is None:
+        fila = acumulados[(clave, dia)] = {**dict.fromkeys(_CONTADORES, 0), 'pico_prestado': prestado[clave]}
+    prestado[clave] -= cantidad  # Extraer (cantidad negativa) sube lo prestado
+    if cantidad < 0:
+        fila['unidades_extraidas'] -= cantidad
+        fila['extracciones'] += 1
+    else:
+        fila['unidades_devueltas'] += cantidad
+    fila['pico_prestado'] = max(fila['pico_prestado'], prestado[clave])
+    fila['prestado_final'] = prestado[clave]
+
+
+def _guardar(modelo, campo, acumulados, tipos_material=None):
+    # Las filas ya existentes se suman en memoria y se reescriben: un DELETE y
+    # un INSERT por lote en lugar de un bulk_update (un CASE por fila y campo)
+    existentes = {
+        (getattr(fila, f'{campo}_id'), fila.dia): fila
+        for fila in modelo.objects.filter(
+            **{f'{campo}_id__in': {clave for clave, _ in acumulados}}, dia__in={dia for _, dia in acumulados},
+        )
+        if (getattr(fila, f'{campo}_id'), fila.dia) in acumulados
+    }
+    filas = []
+    for (clave, dia), valores in acumulados.items():
+        fila = existentes.get((clave, dia))
+        if fila is None:
+            extra = {'tipo_id': tipos_material[clave]} if tipos_material else {}
+            filas.append(modelo(dia=dia, **{f'{campo}_id': clave}, **extra, **valores))
+            continue
+        for contador in _CONTADORES:
+            setattr(fila, contador, getattr(fila, contador) + valores[contador])
+        fila.pico_prestado = max(fila.pico_prestado, valores['pico_prestado'])
+        fila.prestado_final = valores['prestado_final']
+        filas.append(fila)
+    modelo.objects.filter(id__in=[fila.id for fila in existentes.values()]).delete()
+    modelo.objects.bulk_create(filas)
+
+
+# ================ INFORME ================ #
+def consultas_informe(agrupacion, periodo, desde, hasta):
+    """(totales, prestatarios): las dos consultas del informe, sobre los índices por día."""
+    modelo, campo, nombres = AGRUPACIONES[agrupacion]
+    truncar = PERIODOS[periodo]
+    inicio = truncar('dia') if truncar else F('dia')
+    totales = (
+        modelo.objects.filter(dia__gte=desde, dia__lte=hasta)
+        .annotate(inicio=inicio).values('inicio', campo, **{nombre: F(ruta) for nombre, ruta in nombres.items()})
+        .annotate(
+            extraidas=Sum('unidades_extraidas'), devueltas=Sum('unidades_devueltas'),
+            prestamos=Sum('extracciones'), pico=Max('pico_prestado'),
+        )
+        .order_by('inicio', '-extraidas', campo)
+    )
+    prestatarios = (
+        PrestatarioDiario.objects.filter(dia__gte=desde, dia__lte=hasta)
+        .annotate(inicio=inicio).values('inicio', campo)
+        .annotate(prestatarios=Count('usuario', distinct=True)).order_by()
+    )
+    return totales, prestatarios
+
+
+def informe(agrupacion, periodo, desde, hasta):
+    """
+    Filas de uso por material o tipo y día, semana o mes entre dos fechas,
+    leídas solo de los agregados. Devuelve (filas, truncado).
+    """
+    campo = AGRUPACIONES[agrupacion][1]
+    totales, prestatarios = consultas_informe(agrupacion, periodo, desde, hasta)
+    filas = list(totales[:LIMITE_FILAS + 1])
+    truncado = len(filas) > LIMITE_FILAS
+    filas = filas[:LIMITE_FILAS]
+
+    distintos = {(fila['inicio'], fila[campo]): fila['prestatarios'] for fila in prestatarios}
+    for fila in filas:
+        fila['id'] = fila.pop(campo)
+        fila['prestatarios'] = distintos.get((fila['inicio'], fila['id']), 0)
+    return filas, truncado
+
+
+def actualizado():
+    """Fecha de la última pasada de manage.py agregar_uso (None si nunca se ha ejecutado)."""
+    return MarcaAgregacion.objects.filter(clave=CLAVE_MARCA).values_list('fecha_actualizacion', flat=True).first()
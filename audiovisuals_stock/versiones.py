@@ -0,0 +1,70 @@
+# audiovisuals_stock/versiones.py
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+# ================ VERSIONES PARA CACHÉ Y PETICIONES CONDICIONALES ================ #
+# Una versión es el instante (ns) del último cambio de un ámbito:
+#   - ('catalogo', None): cualquier material (altas, bajas, stock).
+#   - ('material', id): un material, su stock, sus logs y sus deudas.
+#   - ('usuario', id): lo que la cabecera muestra del usuario (nombre, deudas).
+# Las claves de los fragmentos en caché y los ETag incluyen la versión, así que
+# subirla basta para invalidarlos. Se sube al confirmar la transacción para que
+# nadie guarde en caché, con la versión nueva, datos anteriores al cambio.
+
+DURACION_FRAGMENTO = 60 * 60
+
+
+def _clave(ambito, id=None):
+    return f'version:{ambito}' if id is None else f'version:{ambito}:{id}'
+
+
+def leer(*ambitos):
+    """Versiones de los ámbitos [(ambito, id), ...], en el mismo orden."""
+    claves = [_clave(*ambito) for ambito in ambitos]
+    encontradas = cache.get_many(claves)
+    faltan = {clave: time.time_ns() for clave in claves if clave not in encontradas}
+    if faltan:
+        # Ámbito sin versión (nunca cambiado o expulsado de la caché): empieza ahora
+        for clave, version in faltan.items():
+            if not cache.add(clave, version, None):
+                faltan[clave] = cache.get(clave, version)
+        encontradas.update(faltan)
+    return [encontradas[clave] for clave in claves]
+
+
+async def aleer(*ambitos):
+    """Versión async de leer() (vistas ASGI)."""
+    claves = [_clave(*ambito) for ambito in ambitos]
+    encontradas = await cache.aget_many(claves)
+    faltan = {clave: time.time_ns() for clave in claves if clave not in encontradas}
+    if faltan:
+        for clave, version in faltan.items():
+            if not await cache.aadd(clave, version, None):
+                faltan[clave] = await cache.aget(clave, version)
+        encontradas.update(faltan)
+    return [encontradas[clave] for clave in claves]
+
+
+def subir(ambito, ids=(None,)):
+    claves = [_clave(ambito, id) for id in ids]
+    transaction.on_commit(lambda: cache.set_many({clave: time.time_ns() for clave in claves}, None))
+
+
+def stock_cambiado(material_ids, usuario_id=None):
+    subir('catalogo')
+    subir('material', list(material_ids))
+    if usuario_id is not None:
+        subir('usuario', [usuario_id])
+
+
+def fecha(*versiones):
+    """Last-Modified correspondiente a la versión más reciente."""
+    return datetime.fromtimestamp(max(versiones) / 1e9, tz=dt_timezone.utc)
+
+
+def etag(*partes):
+    return '"' + '-'.join(str(parte) for parte in partes) + '"'
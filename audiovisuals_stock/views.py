@@ -2,15 +2,38 @@ from .models import UserProfile, CustomUser
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import login
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
 from django.urls import reverse
 from django.shortcuts import get_object_or_404, redirect
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.cache import cache_control
+from django.core.cache import cache
+from django.contrib.auth import SESSION_KEY
+from urllib.parse import urlencode
+import hashlib
+import json
 from django.dispatch import receiver
 from django.db.models.signals import post_save
 from django.db import IntegrityError
 from .models import Material
-from .models import Material, MaterialLog, Proveedor, TipoMaterial, DeudaMaterial
+from .models import Material, MaterialLog, Proveedor, TipoMaterial, DeudaMaterial, KitMaterial, ResumenDeuda
 from .forms import UserProfileForm, CustomUserCreationForm, MaterialForm, MaterialEditForm, ExtraccionMaterialForm, TipoMaterialForm, ProveedorForm
+from .pagination import codificar_cursor, decodificar_cursor, paginar_keyset
+from . import services
+from . import archivo
+from . import exports
+from . import busqueda
+from . import calendario
+from . import catalogos
+from . import kiosco
+from . import uso
+from . import versiones
+from .middleware import resumen_rutas
+from django.conf import settings
+from datetime import date, timedelta
+from django.db.models import BooleanField, Case, Value, When
+from django.utils import timezone
 
 # ================ VISTA DEL REGISTRO ================
 def signup(request):
@@ -60,26 +83,41 @@ def home(request):
 
 
 # ================ VISTA DEL PERFIL ================
+DIAS_AVISO_VENCIMIENTO = 2
+
+
 def view_profile(request):
     if request.user.is_authenticated:
         user = request.user
 
         if request.method == 'POST':
-            deuda_id = request.POST.get('deuda_id')
-            deuda = DeudaMaterial.objects.get(id=deuda_id)
-            deuda.devuelta = True
-            deuda.save()
-            # Obtén el material asociado a esta deuda
-            material = deuda.material
-            # Suma la cantidad adeudada devuelta a la cantidad del material
-            material.cantidad += deuda.cantidad_adeudada
-            material.save()
+            if 'saldar_todas' in request.POST:
+                # Todas las deudas de una vez, en una sola transacción
+                services.saldar_todas(user)
+                return redirect('view_profile')
+            deuda_id = _entero(request.POST.get('deuda_id'), None)
+            if deuda_id is None:
+                raise Http404
+            try:
+                # Marca la deuda como devuelta y repone el stock en una sola transacción
+                services.saldar_deuda(deuda_id, user)
+            except services.DeudaYaSaldada:
+                # Doble envío del formulario: la deuda ya se había saldado. Si no
+                # existe o es de otro usuario, para este usuario no existe
+                if not DeudaMaterial.objects.filter(id=deuda_id, usuario=user).exists():
+                    raise Http404
             return redirect('view_profile')
 
-        deudas_pendientes = DeudaMaterial.objects.filter(usuario=user, devuelta=False)
+        # El resumen (una fila) dice si hace falta consultar las deudas
+        resumen = ResumenDeuda.objects.filter(usuario=user).first()
+        deudas_pendientes = []
+        if resumen and resumen.items:
+            deudas_pendientes = _deudas_perfil(user)
 
         context = {
             'user': user,
+            'resumen': resumen,
+            'resumen_deuda': resumen,  # La cabecera reutiliza esta fila en lugar de volver a leerla
             'deudas_pendientes': deudas_pendientes
         }
         return render(request, 'audiovisuals_stock/perfil.html', context)
@@ -87,6 +125,23 @@ def view_profile(request):
         return redirect(reverse('login'))
     
 
+def _deudas_perfil(user):
+    # Una sola consulta: deuda + material, con los indicadores de vencimiento
+    hoy = timezone.localdate()
+    return (
+        DeudaMaterial.objects.filter(usuario=user, devuelta=False)
+        .select_related('material')
+        .annotate(
+            vencida=Case(When(fecha_vencimiento__lt=hoy, then=Value(True)), default=Value(False), output_field=BooleanField()),
+            vence_pronto=Case(
+                When(fecha_vencimiento__gte=hoy, fecha_vencimiento__lte=hoy + timedelta(days=DIAS_AVISO_VENCIMIENTO), then=Value(True)),
+                default=Value(False), output_field=BooleanField(),
+            ),
+        )
+        .order_by('fecha_vencimiento', 'id')
+    )
+
+
 # ================ VISTA EDITAR PERFIL ================ #
 def edit_profile(request):
     if request.user.is_authenticated:
@@ -110,10 +165,48 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 
+# ================ CACHÉ DE PÁGINAS ================ #
+def _usuario_sesion(request):
+    # Id del usuario desde la sesión, sin cargar el usuario de la base de datos
+    return request.session.get(SESSION_KEY)
+
+
+def _versiones_pagina(request, ambito, id=None):
+    # Versión del contenido y de la cabecera del usuario, leídas una vez por petición
+    if not hasattr(request, '_versiones_pagina'):
+        request._versiones_pagina = versiones.leer((ambito, id), ('usuario', _usuario_sesion(request)))
+    return request._versiones_pagina
+
+
+def _etag_detalle(request, material_id):
+    return versiones.etag('material', material_id, _usuario_sesion(request), *_versiones_pagina(request, 'material', material_id))
+
+
+def _modificado_detalle(request, material_id):
+    return versiones.fecha(*_versiones_pagina(request, 'material', material_id))
+
+
+def _etag_lista(request):
+    return versiones.etag('lista', _usuario_sesion(request), *_versiones_pagina(request, 'usuario', _usuario_sesion(request)))
+
+
+def _modificado_lista(request):
+    return versiones.fecha(*_versiones_pagina(request, 'usuario', _usuario_sesion(request)))
+
+
 # ================ VISTA VER MATERIAL ================ #
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_detalle, last_modified_func=_modificado_detalle)
 def detalle_material(request, material_id):
-    material = get_object_or_404(Material, id=material_id)
-    return render(request, 'audiovisuals_stock/detalle_material.html', {'material': material})
+    # El cuerpo de la página se guarda renderizado con la versión del material
+    version = _versiones_pagina(request, 'material', material_id)[0]
+    clave = f'fragmento:material:{material_id}:{version}'
+    contenido = cache.get(clave)
+    if contenido is None:
+        material = get_object_or_404(Material, id=material_id)
+        contenido = render_to_string('audiovisuals_stock/detalle_material_contenido.html', {'material': material})
+        cache.set(clave, contenido, versiones.DURACION_FRAGMENTO)
+    return render(request, 'audiovisuals_stock/detalle_material.html', {'contenido': contenido})
 
 # ================ VISTA CREAR MATERIAL ================ #
 def subir_material(request):
@@ -125,7 +218,8 @@ def subir_material(request):
                 material = form.save(commit=False)
                 # Establece el usuario creador del material
                 material.creadopor = request.user
-                material.save()
+                # Guarda el material y anota sus unidades como compra en el libro de movimientos
+                services.crear_material(material, request.user)
                 # Redirige al usuario a la página de lista de materiales
                 return redirect('list_material')
         else:
@@ -138,15 +232,124 @@ def subir_material(request):
 
 
 # ================ VISTA LISTA MATERIALES ================ #
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_lista, last_modified_func=_modificado_lista)
 def lista_materiales(request):
     if request.user.is_authenticated:
-        materiales = Material.objects.all()
-        return render(request, 'audiovisuals_stock/list_material.html', {'materiales': materiales})
+        # La tabla se rellena desde lista_materiales_json (modo server-side de DataTables)
+        return render(request, 'audiovisuals_stock/list_material.html')
     else:
         # Usuario no autenticado, manejarlo según tus requerimientos
         return redirect(reverse('login'))
 
 
+# Columnas de la tabla en el orden de list_material.html. Solo las que tienen
+# índice (columna, id) en Material se pueden ordenar.
+COLUMNAS_MATERIAL = ['referencia', 'nombre', 'cantidad', 'tipo', 'fecha_compra', 'proveedor', 'numero_serie']
+COLUMNAS_ORDENABLES = {'referencia', 'nombre', 'cantidad', 'fecha_compra', 'numero_serie'}
+MAX_FILAS_PAGINA = 100
+
+
+def _entero(valor, defecto):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def lista_materiales_json(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+
+    # La respuesta, salvo el contador draw de DataTables, se guarda en caché con
+    # la versión del catálogo y los parámetros de la petición
+    clave_cache = _clave_catalogo(request, versiones.leer(('catalogo', None))[0])
+    respuesta = cache.get(clave_cache)
+    if respuesta is None:
+        respuesta = _pagina_catalogo(request)
+        cache.set(clave_cache, respuesta, versiones.DURACION_FRAGMENTO)
+    return JsonResponse({'draw': _entero(request.GET.get('draw'), 0), **respuesta})
+
+
+def _clave_catalogo(request, version):
+    parametros = sorted((clave, valor) for clave, valor in request.GET.items() if clave not in ('draw', '_'))
+    return 'fragmento:catalogo:{}:{}'.format(version, hashlib.md5(urlencode(parametros).encode()).hexdigest())
+
+
+def _consulta_catalogo(request):
+    # (queryset, término de búsqueda, argumentos de paginar_keyset); compartido con views_async
+    inicio = max(_entero(request.GET.get('start'), 0), 0)
+    limite = min(max(_entero(request.GET.get('length'), 25), 1), MAX_FILAS_PAGINA)
+    termino = request.GET.get('search[value]', '').strip()
+    cursor = request.GET.get('cursor')
+
+    columna = COLUMNAS_MATERIAL[_entero(request.GET.get('order[0][column]'), 0) % len(COLUMNAS_MATERIAL)]
+    if columna not in COLUMNAS_ORDENABLES:
+        columna = 'referencia'
+    descendente = request.GET.get('order[0][dir]') == 'desc'
+
+    materiales = Material.objects.select_related('tipo', 'proveedor').only(
+        'referencia', 'nombre', 'cantidad', 'fecha_compra', 'numero_serie', 'tipo__nombre', 'proveedor__nombre',
+    )
+    if termino:
+        # Palabras por prefijo en el índice FTS5 (busqueda.py), no LIKE '%...%' sobre la tabla entera
+        coincidencias = busqueda.filtro(termino)
+        materiales = materiales.filter(coincidencias) if coincidencias is not None else materiales.none()
+
+    # Con cursor (página siguiente en secuencia) se pagina por keyset sobre el
+    # índice (columna, id); sin él (salto directo del paginador) se usa OFFSET
+    pagina = {
+        'campos': [columna, 'id'], 'cursor': cursor, 'limite': limite,
+        'descendente': descendente, 'desplazamiento': 0 if cursor else inicio,
+    }
+    return materiales, termino, pagina
+
+
+def _fila_catalogo(material):
+    return {
+        'id': material.id,
+        'referencia': material.referencia,
+        'nombre': material.nombre,
+        'cantidad': material.cantidad,
+        'tipo': material.tipo.nombre,
+        'fecha_compra': material.fecha_compra.isoformat(),
+        'proveedor': material.proveedor.nombre,
+        'numero_serie': material.numero_serie,
+        'url': reverse('detalle_material', kwargs={'material_id': material.id}),
+    }
+
+
+def _pagina_catalogo(request):
+    materiales, termino, pagina = _consulta_catalogo(request)
+    total = Material.objects.count()
+    filtrados = materiales.count() if termino else total
+    filas, siguiente = paginar_keyset(materiales, **pagina)
+    return {
+        'recordsTotal': total,
+        'recordsFiltered': filtrados,
+        'data': [_fila_catalogo(material) for material in filas],
+        'next_cursor': siguiente,
+    }
+
+
+# ================ BÚSQUEDA DE MATERIALES ================ #
+def buscar_materiales(request):
+    # Typeahead: ids por relevancia desde el índice FTS y una consulta por clave primaria
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    limite = min(max(_entero(request.GET.get('limite'), 10), 1), 50)
+    ids = busqueda.buscar(request.GET.get('q', ''), limite)
+    materiales = Material.objects.only('referencia', 'nombre', 'numero_serie', 'cantidad').in_bulk(ids)
+    return JsonResponse({'resultados': [{
+        'id': materiales[material_id].id,
+        'referencia': materiales[material_id].referencia,
+        'nombre': materiales[material_id].nombre,
+        'numero_serie': materiales[material_id].numero_serie,
+        'cantidad': materiales[material_id].cantidad,
+        'url': reverse('detalle_material', kwargs={'material_id': material_id}),
+    } for material_id in ids if material_id in materiales]})
+
+
 # ================ VISTA EDITAR MATERIAL ================ #
 def editar_material(request, material_id):
     if request.user.is_authenticated:
@@ -154,8 +357,12 @@ def editar_material(request, material_id):
         if request.method == 'POST':
             form = MaterialEditForm(request.POST, instance=material)
             if form.is_valid():
-                form.save()
-                return redirect('list_material')  # Puedes redirigir a donde desees después de editar
+                try:
+                    # El cambio de cantidad se aplica como ajuste sobre el stock actual
+                    services.editar_material(form, request.user)
+                    return redirect('list_material')  # Puedes redirigir a donde desees después de editar
+                except services.StockInsuficiente as e:
+                    form.add_error('cantidad', str(e))
         else:
             form = MaterialEditForm(instance=material)
 
@@ -176,48 +383,25 @@ def extraer_material(request, material_id):
         if form.is_valid():
             cantidad_extraida = form.cleaned_data['cantidad_extraida']
 
-            # Verificar si la cantidad a extraer es menor o igual a la cantidad disponible
-            if cantidad_extraida <= material.cantidad:
-                try:
-                    # Realizar la extracción y guardar el registro en el log
-                    material.cantidad -= cantidad_extraida
-                    material.save()
-
-                    log = MaterialLog(material=material, usuario=request.user, cantidad_extraida=cantidad_extraida)
-                    log.save()
-
-                    # Verificar si ya existe una deuda para este usuario y material
-                    deuda_existente = DeudaMaterial.objects.filter(usuario=request.user, material=material, devuelta=False).first()
-
-                    # Si no existe una deuda, crear una nueva
-                    if not deuda_existente:
-                        deuda_existente = DeudaMaterial.objects.create(
-                            usuario=request.user,
-                            material=material,
-                            cantidad_adeudada=cantidad_extraida,
-                        )
-                    else:
-                        # Si la deuda existe, actualizar la cantidad adeudada
-                        deuda_existente.cantidad_adeudada += cantidad_extraida
-                        deuda_existente.save()
-
-                    # Redirigir al perfil del usuario
-                    return redirect('view_profile')
-                except IntegrityError as e:
-                    # Manejar errores de integridad (por ejemplo, si se produce una extracción duplicada)
-                    form.add_error(None, 'Error de extracción: ' + str(e))
-            else:
-                # Mostrar error si la cantidad a extraer es mayor que la cantidad disponible
-                form.add_error(None, 'La cantidad a extraer es mayor que la cantidad disponible')
+            try:
+                # Descuenta el stock, registra el log y suma la deuda en una sola transacción
+                services.extraer_material(material.id, request.user, cantidad_extraida)
+
+                # Redirigir al perfil del usuario
+                return redirect('view_profile')
+            except (services.CantidadInvalida, services.StockInsuficiente) as e:
+                # Mostrar error si la cantidad no es válida o es mayor que la disponible
+                form.add_error(None, str(e))
+            except IntegrityError as e:
+                # Manejar errores de integridad (por ejemplo, si se produce una extracción duplicada)
+                form.add_error(None, 'Error de extracción: ' + str(e))
     else:
         # Si la solicitud no es un POST, mostrar el formulario vacío
         form = ExtraccionMaterialForm()
 
-    # Obtener las deudas pendientes del usuario
-    deudas_pendientes = DeudaMaterial.objects.filter(usuario=request.user, devuelta=False)
-
-    # Renderizar la plantilla con el formulario, el material y las deudas pendientes
-    return render(request, 'audiovisuals_stock/extraer_material.html', {'form': form, 'material': material, 'deudas_pendientes': deudas_pendientes})
+    # Renderizar la plantilla con el formulario y el material (las deudas pendientes
+    # se leen del resumen en la cabecera)
+    return render(request, 'audiovisuals_stock/extraer_material.html', {'form': form, 'material': material})
 
 
     
@@ -248,16 +432,283 @@ def saldar_deuda(request, deuda_id):
     return redirect('view_profile')
 
 
+# ================ EXTRACCIÓN Y DEVOLUCIÓN POR LOTES ================ #
+def _leer_lineas(request):
+    # Cuerpo JSON: {"items": [{"material_id": 1, "cantidad": 2}, ...], "kit": 3}
+    # Las líneas del kit (si se indica) se suman a las de "items". Un cuerpo con
+    # otra forma lanza ValueError, KeyError o TypeError: _procesar_lote responde 400.
+    datos = json.loads(request.body or b'{}')
+    if not isinstance(datos, dict):
+        raise ValueError('El lote debe ser un objeto JSON')
+    items = datos.get('items', [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError('"items" debe ser una lista de objetos')
+    lineas = [(item['material_id'], item['cantidad']) for item in items]
+    if datos.get('kit'):
+        kit = get_object_or_404(KitMaterial.objects.prefetch_related('items'), id=datos['kit'])
+        lineas.extend(kit.lineas())
+    return lineas
+
+
+def _procesar_lote(request, operacion):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    try:
+        totales = services.agrupar_lineas(_leer_lineas(request))
+        operacion(request.user, totales.items())
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Formato de lote no válido'}, status=400)
+    except services.LoteInvalido as e:
+        return JsonResponse({'error': str(e), 'materiales': e.materiales}, status=409)
+    return JsonResponse({'items': [{'material_id': m, 'cantidad': n} for m, n in totales.items()]})
+
+
+@require_POST
+def extraer_lote(request):
+    return _procesar_lote(request, services.extraer_lote)
+
+
+@require_POST
+def devolver_lote(request):
+    return _procesar_lote(request, services.devolver_lote)
+
+
+# ================ KITS DE MATERIAL ================ #
+def lista_kits(request):
+    if request.user.is_authenticated:
+        kits = KitMaterial.objects.prefetch_related('items__material').order_by('nombre')
+        return render(request, 'audiovisuals_stock/kits.html', {'kits': kits})
+    else:
+        return redirect(reverse('login'))
+
+
+@require_POST
+def extraer_kit(request, kit_id):
+    if not request.user.is_authenticated:
+        return redirect(reverse('login'))
+    kit = get_object_or_404(KitMaterial.objects.prefetch_related('items'), id=kit_id)
+    try:
+        services.extraer_lote(request.user, kit.lineas())
+    except services.LoteInvalido as e:
+        kits = KitMaterial.objects.prefetch_related('items__material').order_by('nombre')
+        return render(request, 'audiovisuals_stock/kits.html', {'kits': kits, 'error': str(e), 'kit_error': kit.id}, status=409)
+    return redirect('view_profile')
+
+
+# ================ KIOSCO DE ESCANEO ================ #
+def escaner(request):
+    if request.user.is_authenticated:
+        return render(request, 'audiovisuals_stock/kiosco.html')
+    else:
+        return redirect(reverse('login'))
+
+
+def _material_escaneado(codigo):
+    # La caché del kiosco solo da el id: se lee la fila y se comprueba el código
+    campos = ('referencia', 'nombre', 'numero_serie', 'cantidad')
+    material = Material.objects.only(*campos).filter(id=kiosco.resolver(codigo)).first()
+    if material is None or not kiosco.coincide(material, kiosco.normalizar(codigo)):
+        kiosco.cache.olvidar(kiosco.normalizar(codigo))
+        material = Material.objects.only(*campos).filter(id=kiosco.resolver(codigo)).first()
+        if material is None:  # Borrado entre la búsqueda y la lectura
+            raise kiosco.CodigoDesconocido(f'No hay ningún material con el código {kiosco.normalizar(codigo)}')
+    return material
+
+
+@require_POST
+def escanear(request):
+    """
+    Un escaneo, una petición: resuelve el código (serie o referencia) y extrae
+    o devuelve el material. Con accion=auto devuelve si el usuario ya lo tiene
+    prestado y, si no, lo extrae. El personal puede atender a otro usuario
+    indicando su email.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+
+    accion = request.POST.get('accion', 'auto')
+    cantidad = _entero(request.POST.get('cantidad'), 1)
+    codigo = kiosco.normalizar(request.POST.get('codigo'))
+    if accion not in ('auto', 'extraer', 'devolver') or cantidad < 1 or not codigo:
+        return JsonResponse({'error': 'Petición no válida'}, status=400)
+
+    usuario = request.user
+    if request.POST.get('usuario') and request.user.is_staff:
+        usuario = CustomUser.objects.filter(email=request.POST['usuario'].strip()).first()
+        if usuario is None:
+            return JsonResponse({'error': 'Usuario desconocido'}, status=404)
+
+    try:
+        material = _material_escaneado(codigo)
+    except kiosco.CodigoDesconocido as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    except kiosco.CodigoAmbiguo as e:
+        return JsonResponse({'error': str(e), 'materiales': e.materiales}, status=409)
+
+    deuda_id = None
+    if accion != 'extraer':
+        deuda_id = DeudaMaterial.objects.filter(
+            usuario=usuario, material=material, devuelta=False,
+        ).values_list('id', flat=True).first()
+        if deuda_id is None and accion == 'devolver':
+            return JsonResponse({'error': f'{usuario.email} no tiene {material.nombre} en préstamo'}, status=409)
+
+    try:
+        if deuda_id is not None:
+            services.saldar_deuda(deuda_id, usuario)
+            resultado = 'devuelto'
+        else:
+            services.extraer_material(material.id, usuario, cantidad)
+            resultado = 'extraido'
+    except services.StockInsuficiente as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except services.DeudaYaSaldada as e:
+        return JsonResponse({'error': str(e)}, status=409)
+
+    material.refresh_from_db(fields=['cantidad'])
+    return JsonResponse({
+        'resultado': resultado,
+        'usuario': usuario.email,
+        'material': {
+            'id': material.id,
+            'referencia': material.referencia,
+            'nombre': material.nombre,
+            'numero_serie': material.numero_serie,
+            'cantidad': material.cantidad,
+        },
+    })
+
+
+# ================ EXPORTACIONES ================ #
+def _fecha_parametro(request, nombre):
+    try:
+        return date.fromisoformat(request.GET[nombre]) if request.GET.get(nombre) else None
+    except ValueError:
+        return None
+
+
+def _exportacion(request, conjunto):
+    # (generador de bloques, tipo, nombre del fichero); compartido con views_async.
+    # El generador no consulta nada hasta que se recorre
+    if conjunto not in exports.CONJUNTOS:
+        raise Http404
+    formato = 'jsonl' if request.GET.get('formato') == 'jsonl' else 'csv'
+    comprimir = request.GET.get('gzip') == '1'
+    contenido = exports.bloques(
+        conjunto, formato, _fecha_parametro(request, 'desde'), _fecha_parametro(request, 'hasta'), comprimir,
+    )
+    tipo = 'application/gzip' if comprimir else ('text/csv' if formato == 'csv' else 'application/x-ndjson')
+    return contenido, tipo, exports.nombre_archivo(conjunto, formato, comprimir)
+
+
+def _descarga(contenido, tipo, nombre):
+    response = StreamingHttpResponse(contenido, content_type=tipo)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+
+def exportar(request, conjunto):
+    if not request.user.is_authenticated:
+        return redirect(reverse('login'))
+    if not request.user.is_staff:
+        return HttpResponse(status=403)
+    return _descarga(*_exportacion(request, conjunto))
+
+
 # ================ VISTA PARA EL LOG DEL MATERIAL ================ #
+ENTRADAS_LOG_PAGINA = 50
+
+
+def _consulta_log(request, material):
+    # (queryset, desde, hasta, argumentos de paginar_keyset); compartido con views_async.
+    # Página por cursor sobre (fecha_accion, id), del más reciente al más
+    # antiguo; usa el índice (material, -fecha_accion, -id)
+    desde = _fecha_parametro(request, 'desde')
+    hasta = _fecha_parametro(request, 'hasta')
+    log = exports.filtrar_por_fechas(
+        MaterialLog.objects.filter(material=material).select_related('usuario'), 'fecha_accion', desde, hasta,
+    )
+    pagina = {
+        'campos': ['fecha_accion', 'id'], 'cursor': request.GET.get('cursor'),
+        'limite': ENTRADAS_LOG_PAGINA, 'descendente': True,
+    }
+    return log, desde, hasta, pagina
+
+
+def _pagina_log(request, material):
+    log, desde, hasta, pagina = _consulta_log(request, material)
+    entradas, siguiente = paginar_keyset(log, **pagina)
+    entradas, siguiente = _completar_con_archivo(material.id, entradas, siguiente, pagina, desde, hasta)
+    return entradas, siguiente, desde, hasta
+
+
+def _completar_con_archivo(material_id, entradas, siguiente, pagina, desde, hasta):
+    # Cuando las filas vivas se acaban en esta página, la completa con las que
+    # archivar_registros ha sacado de la tabla (archivo.py), que son todas
+    # anteriores. El cursor (fecha_accion, id) sirve para las dos partes: en las
+    # páginas de historia la consulta viva no devuelve nada y solo se lee el archivo.
+    if siguiente is not None:
+        return entradas, siguiente
+    entradas = list(entradas)
+    if entradas:
+        antes = (entradas[-1].fecha_accion, entradas[-1].id)
+    else:
+        antes = decodificar_cursor(pagina['cursor'])
+        antes = antes if antes and len(antes) == 2 else None
+    faltan = pagina['limite'] - len(entradas)
+    # Una fila de más para saber si hay página siguiente
+    filas = archivo.anteriores('logs', antes, faltan + 1, desde, hasta, material_id=material_id)
+    entradas += _entradas_archivadas(filas[:faltan])
+    if len(filas) > faltan:
+        siguiente = codificar_cursor([entradas[-1].fecha_accion, entradas[-1].id])
+    return entradas, siguiente
+
+
+def _entradas_archivadas(filas):
+    # Las filas archivadas como MaterialLog, con su usuario (una consulta)
+    usuarios = CustomUser.objects.only('nombre').in_bulk({fila['usuario_id'] for fila in filas})
+    entradas = []
+    for fila in filas:
+        entrada = MaterialLog(**fila)
+        # El archivo conserva el log de usuarios ya borrados
+        entrada.usuario = usuarios.get(fila['usuario_id']) or CustomUser(id=fila['usuario_id'], nombre='Usuario eliminado')
+        entradas.append(entrada)
+    return entradas
+
+
 def log_material(request, material_id):
     if request.user.is_authenticated:
-        material = Material.objects.get(id=material_id)
-        log = MaterialLog.objects.filter(material=material).order_by('-fecha_accion')
-        return render(request, 'audiovisuals_stock/log_material.html', {'material': material, 'log': log})
+        material = get_object_or_404(Material, id=material_id)
+        log, siguiente, desde, hasta = _pagina_log(request, material)
+        return render(request, 'audiovisuals_stock/log_material.html', {
+            'material': material, 'log': log, 'siguiente': siguiente, 'desde': desde, 'hasta': hasta,
+        })
     else:
         # Usuario no autenticado, manejarlo según tus requerimientos
         return redirect(reverse('login'))
 
+
+def log_material_json(request, material_id):
+    # "Cargar más": devuelve la página siguiente ya renderizada con la misma plantilla
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    material = get_object_or_404(Material.objects.only('id'), id=material_id)
+    log, siguiente, _, _ = _pagina_log(request, material)
+    return JsonResponse(_respuesta_log(request, log, siguiente))
+
+
+def _respuesta_log(request, log, siguiente):
+    return {
+        'html': render_to_string('audiovisuals_stock/log_entradas.html', {'log': log}, request=request),
+        'entries': [{
+            'id': entrada.id,
+            'usuario': entrada.usuario.nombre,
+            'cantidad_extraida': entrada.cantidad_extraida,
+            'fecha_accion': entrada.fecha_accion.isoformat(),
+        } for entrada in log],
+        'next_cursor': siguiente,
+    }
+
 # ================ AGREGAR TIPOS PARA MATERIAL ================ #
 def agregar_tipo_material(request):
     if request.user.is_authenticated:
@@ -270,7 +721,7 @@ def agregar_tipo_material(request):
             form = TipoMaterialForm()
         
         # Obtén la lista de proveedores existentes
-        tiposmaterial = TipoMaterial.objects.all()
+        tiposmaterial = catalogos.filas(TipoMaterial)
 
         # Lógica para eliminar proveedores
         if 'eliminar_tipomaterial' in request.POST:
@@ -296,7 +747,7 @@ def agregar_proveedor(request):
             form = ProveedorForm()
 
         # Obtén la lista de proveedores existentes
-        proveedores = Proveedor.objects.all()
+        proveedores = catalogos.filas(Proveedor)
 
         # Lógica para eliminar proveedores
         if 'eliminar_proveedor' in request.POST:
@@ -322,6 +773,59 @@ def obtener_deudas_pendientes(self):
     
     return deudas_pendientes
 
+# ================ INSTRUMENTACIÓN ================ #
+def instrumentacion(request):
+    # Percentiles por ruta del proceso actual (solo con INSTRUMENTACION activada)
+    if not request.user.is_authenticated:
+        return redirect(reverse('login'))
+    if not request.user.is_staff:
+        return HttpResponse(status=403)
+    return JsonResponse({
+        'activa': settings.INSTRUMENTACION,
+        'rutas': resumen_rutas.resumen(),
+        'catalogos': catalogos.estadisticas(),
+    })
+
+# ================ INFORMES DE USO ================ #
+DIAS_INFORME = 90
+
+
+def _consulta_informe(request):
+    # (agrupación, periodo, desde, hasta); el rango se limita a uso.MAX_DIAS
+    agrupacion = request.GET.get('agrupacion') if request.GET.get('agrupacion') in uso.AGRUPACIONES else 'tipo'
+    periodo = request.GET.get('periodo') if request.GET.get('periodo') in uso.PERIODOS else 'semana'
+    hasta = _fecha_parametro(request, 'hasta') or timezone.localdate()
+    desde = _fecha_parametro(request, 'desde') or hasta - timedelta(days=DIAS_INFORME)
+    return agrupacion, periodo, max(desde, hasta - timedelta(days=uso.MAX_DIAS)), hasta
+
+
+def informe_uso(request):
+    # Solo lee los agregados de uso.py: el coste depende del rango, no del historial
+    if not request.user.is_authenticated:
+        return redirect(reverse('login'))
+    if not request.user.is_staff:
+        return HttpResponse(status=403)
+    agrupacion, periodo, desde, hasta = _consulta_informe(request)
+    filas, truncado = uso.informe(agrupacion, periodo, desde, hasta)
+    return render(request, 'audiovisuals_stock/informe_uso.html', {
+        'filas': filas, 'truncado': truncado, 'actualizado': uso.actualizado(),
+        'agrupacion': agrupacion, 'periodo': periodo, 'desde': desde, 'hasta': hasta,
+        'agrupaciones': list(uso.AGRUPACIONES), 'periodos': list(uso.PERIODOS),
+    })
+
+
+def informe_uso_json(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Solo personal'}, status=403)
+    agrupacion, periodo, desde, hasta = _consulta_informe(request)
+    filas, truncado = uso.informe(agrupacion, periodo, desde, hasta)
+    return JsonResponse({
+        'agrupacion': agrupacion, 'periodo': periodo, 'desde': desde, 'hasta': hasta,
+        'actualizado': uso.actualizado(), 'truncado': truncado, 'filas': filas,
+    })
+
 # ================  404 ================ #
 def error_404(request, exception):
     return render(request, '404.html', status=404)
@@ -333,4 +837,35 @@ def calendar(request):
         return redirect(reverse('login'))  # Ajusta 'login' al nombre de la URL de tu página de inicio de sesión
     else:
         # Renderiza el archivo HTML o crea el contenido HTML aquí
-        return render(request, 'audiovisuals_stock/calendar.html')
\ No newline at end of file
+        return render(request, 'audiovisuals_stock/calendar.html')
+
+
+# El color de los vencimientos (vencido o no) depende del día, no solo de los
+# datos: el ETag y Last-Modified cambian a medianoche aunque no cambie nada
+def _etag_calendario(request):
+    return versiones.etag(
+        'calendario', _usuario_sesion(request), request.GET.get('start', ''), request.GET.get('end', ''),
+        timezone.localdate().isoformat(), *_versiones_pagina(request, 'catalogo'),
+    )
+
+
+def _modificado_calendario(request):
+    return max(versiones.fecha(*_versiones_pagina(request, 'catalogo')), exports.inicio_dia(timezone.localdate()))
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_calendario, last_modified_func=_modificado_calendario)
+def calendario_eventos(request):
+    # Fuente de eventos de FullCalendar: ?start=...&end=... (end no incluido).
+    # El personal ve las deudas de todos; el resto, las suyas.
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    try:
+        # Solo la parte de fecha: es el día que se ve en el calendario del navegador
+        desde = date.fromisoformat(request.GET['start'][:10])
+        hasta = date.fromisoformat(request.GET['end'][:10]) - timedelta(days=1)
+        eventos = calendario.eventos(None if request.user.is_staff else request.user, desde, hasta)
+    except (KeyError, ValueError) as e:
+        return JsonResponse({'error': str(e) or 'Parámetros start y end obligatorios'}, status=400)
+    return JsonResponse(eventos, safe=False)
+
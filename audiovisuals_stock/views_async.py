@@ -0,0 +1,224 @@
+# audiovisuals_stock/views_async.py
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import difusion
+from . import versiones
+from . import views
+from .models import Material, ResumenDeuda
+from .pagination import apaginar_keyset
+
+
+# ================ VISTAS DE LECTURA ASÍNCRONAS (ASGI) ================ #
+# Las mismas páginas de lectura que views.py (catálogo, detalle, log y perfil)
+# con el ORM asíncrono. urls_asgi.py las monta en lugar de las síncronas cuando
+# la aplicación se sirve con asgi.py; bajo WSGI se siguen usando las de views.py.
+#
+# Sesión, usuario y plantillas son síncronos en Django 4.2: el usuario se carga
+# una vez por petición en el hilo síncrono y se deja en request.user, y la
+# cabecera recibe su resumen de deuda ya leído, así que el render no consulta.
+
+async def _usuario(request):
+    usuario = await sync_to_async(get_user)(request)
+    request.user = usuario
+    return usuario
+
+
+async def _contexto_cabecera(usuario):
+    return {'resumen_deuda': await ResumenDeuda.objects.filter(usuario_id=usuario.id).afirst()}
+
+
+async def _material_o_404(queryset, material_id):
+    try:
+        return await queryset.aget(id=material_id)
+    except Material.DoesNotExist:
+        raise Http404
+
+
+async def _condicional(request, etag, version, generar):
+    # Equivalente a @condition + @cache_control(private, no_cache) de views.py,
+    # que en Django 4.2 no envuelven vistas asíncronas
+    modificado = versiones.fecha(*version)
+    respuesta = get_conditional_response(request, etag=etag, last_modified=int(modificado.timestamp()))
+    if respuesta is None:
+        respuesta = await generar()
+        if request.method in ('GET', 'HEAD'):
+            respuesta.headers.setdefault('ETag', etag)
+            respuesta.headers.setdefault('Last-Modified', http_date(modificado.timestamp()))
+    patch_cache_control(respuesta, private=True, no_cache=True)
+    return respuesta
+
+
+# ================ VISTA DEL PERFIL ================ #
+async def view_profile(request):
+    if request.method == 'POST':
+        # Saldar deudas escribe en varias tablas en una transacción: se usa la vista síncrona
+        return await sync_to_async(views.view_profile)(request)
+
+    usuario = await _usuario(request)
+    if not usuario.is_authenticated:
+        return redirect(reverse('login'))
+    resumen = await ResumenDeuda.objects.filter(usuario=usuario).afirst()
+    deudas_pendientes = []
+    if resumen and resumen.items:
+        deudas_pendientes = [deuda async for deuda in views._deudas_perfil(usuario)]
+    return render(request, 'audiovisuals_stock/perfil.html', {
+        'user': usuario,
+        'resumen': resumen,
+        'resumen_deuda': resumen,
+        'deudas_pendientes': deudas_pendientes,
+    })
+
+
+# ================ VISTA VER MATERIAL ================ #
+async def detalle_material(request, material_id):
+    usuario_id = await sync_to_async(views._usuario_sesion)(request)
+    version = await versiones.aleer(('material', material_id), ('usuario', usuario_id))
+
+    async def generar():
+        clave = f'fragmento:material:{material_id}:{version[0]}'
+        contenido = await cache.aget(clave)
+        if contenido is None:
+            material = await _material_o_404(Material.objects.all(), material_id)
+            contenido = render_to_string('audiovisuals_stock/detalle_material_contenido.html', {'material': material})
+            await cache.aset(clave, contenido, versiones.DURACION_FRAGMENTO)
+        usuario = await _usuario(request)
+        contexto = await _contexto_cabecera(usuario) if usuario.is_authenticated else {}
+        return render(request, 'audiovisuals_stock/detalle_material.html', {'contenido': contenido, **contexto})
+
+    return await _condicional(request, versiones.etag('material', material_id, usuario_id, *version), version, generar)
+
+
+# ================ VISTA LISTA MATERIALES ================ #
+async def lista_materiales_json(request):
+    usuario = await _usuario(request)
+    if not usuario.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+
+    clave_cache = views._clave_catalogo(request, (await versiones.aleer(('catalogo', None)))[0])
+    respuesta = await cache.aget(clave_cache)
+    if respuesta is None:
+        respuesta = await _pagina_catalogo(request)
+        await cache.aset(clave_cache, respuesta, versiones.DURACION_FRAGMENTO)
+    return JsonResponse({'draw': views._entero(request.GET.get('draw'), 0), **respuesta})
+
+
+async def _pagina_catalogo(request):
+    materiales, termino, pagina = views._consulta_catalogo(request)
+    total = await Material.objects.acount()
+    filtrados = await materiales.acount() if termino else total
+    filas, siguiente = await apaginar_keyset(materiales, **pagina)
+    return {
+        'recordsTotal': total,
+        'recordsFiltered': filtrados,
+        'data': [views._fila_catalogo(material) for material in filas],
+        'next_cursor': siguiente,
+    }
+
+
+# ================ VISTA PARA EL LOG DEL MATERIAL ================ #
+async def log_material(request, material_id):
+    usuario = await _usuario(request)
+    if not usuario.is_authenticated:
+        return redirect(reverse('login'))
+    material = await _material_o_404(Material.objects.all(), material_id)
+    log, desde, hasta, pagina = views._consulta_log(request, material)
+    entradas, siguiente = await apaginar_keyset(log, **pagina)
+    entradas, siguiente = await sync_to_async(views._completar_con_archivo)(
+        material.id, entradas, siguiente, pagina, desde, hasta,
+    )
+    return render(request, 'audiovisuals_stock/log_material.html', {
+        'material': material, 'log': entradas, 'siguiente': siguiente, 'desde': desde, 'hasta': hasta,
+        **await _contexto_cabecera(usuario),
+    })
+
+
+async def log_material_json(request, material_id):
+    usuario = await _usuario(request)
+    if not usuario.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    material = await _material_o_404(Material.objects.only('id'), material_id)
+    log, desde, hasta, pagina = views._consulta_log(request, material)
+    entradas, siguiente = await apaginar_keyset(log, **pagina)
+    entradas, siguiente = await sync_to_async(views._completar_con_archivo)(
+        material.id, entradas, siguiente, pagina, desde, hasta,
+    )
+    return JsonResponse(views._respuesta_log(request, entradas, siguiente))
+
+
+# ================ EXPORTACIONES ================ #
+# Bajo ASGI, Django 4.2 consume el iterador síncrono de un StreamingHttpResponse
+# con sync_to_async(list): todo el volcado quedaría en memoria antes de enviar
+# el primer byte. Aquí el mismo generador se recorre bloque a bloque.
+
+async def _bloques_en_hilo(bloques):
+    # Cada bloque se pide en el hilo síncrono de la petición (thread_sensitive):
+    # el cursor que recorre exports.bloques() no cambia de hilo ni de conexión
+    siguiente = sync_to_async(next)
+    fin = object()
+    try:
+        while (bloque := await siguiente(bloques, fin)) is not fin:
+            yield bloque
+    finally:
+        await sync_to_async(bloques.close)()  # Cliente desconectado: se cierra el cursor
+
+
+async def exportar(request, conjunto):
+    usuario = await _usuario(request)
+    if not usuario.is_authenticated:
+        return redirect(reverse('login'))
+    if not usuario.is_staff:
+        return HttpResponse(status=403)
+    contenido, tipo, nombre = views._exportacion(request, conjunto)
+    return views._descarga(_bloques_en_hilo(contenido), tipo, nombre)
+
+
+# ================ STOCK EN VIVO (SERVER-SENT EVENTS) ================ #
+LATIDO_SSE = 15  # Segundos entre comentarios de latido (proxies, clientes caídos)
+DURACION_SSE = 300  # El navegador se reconecta solo, con Last-Event-ID
+
+
+def _evento_sse(evento, datos, evento_id=None):
+    cabecera = f'id: {evento_id}\n' if evento_id is not None else ''
+    return f'{cabecera}event: {evento}\ndata: {json.dumps(datos, separators=(",", ":"))}\n\n'
+
+
+async def eventos_stock(request):
+    # Solo bajo ASGI (urls_asgi.py): cada conexión abierta es una corrutina en
+    # espera, no un hilo. Bajo WSGI la ruta no existe y las páginas no se conectan
+    usuario = await _usuario(request)
+    if not usuario.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    desde = views._entero(request.headers.get('Last-Event-ID'), None)
+
+    async def flujo():
+        fin = time.monotonic() + DURACION_SSE
+        suscripcion = difusion.canal().suscribir(desde)
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < fin:
+                evento = await suscripcion.siguiente(LATIDO_SSE)
+                if evento is None:
+                    yield ': latido\n\n'
+                elif evento[1] is None:
+                    # Se han perdido cambios: la página vuelve a pedir los datos
+                    yield _evento_sse(difusion.RECARGAR, {}, evento[0])
+                else:
+                    yield _evento_sse('stock', evento[1], evento[0])
+        finally:
+            suscripcion.cancelar()
+
+    respuesta = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'  # nginx: sin búfer, cada evento sale al momento
+    return respuesta